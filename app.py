@@ -1,171 +1,3120 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from collections import OrderedDict, deque
+from itertools import islice
+from contextlib import contextmanager
 from datetime import datetime
+import atexit
+import bisect
+import calendar
+import functools
+import heapq
+import math
 import random
+import re
 import string
+import select
+import sqlite3
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 import os
 import json
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; responses are gzip-compressed only
+    brotli = None
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # optional; /metrics is unavailable and nothing is recorded
+    prometheus_client = None
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
 
-# ---------------- Database connection ----------------
-def get_db_connection():
-    """Get database connection using environment variables."""
+# ---------------- Metrics ----------------
+# Exposed at /metrics in the Prometheus text format. Under gunicorn, set
+# PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py): every worker then records into
+# files there and a scrape answered by any worker reports all of them.
+METRICS_REFRESH_SECONDS = float(os.getenv('METRICS_REFRESH_SECONDS', '5'))
+PROCESS_STARTED = time.monotonic()
+
+
+class _NoMetric:
+    """Stands in for every metric when prometheus_client is not installed."""
+
+    def labels(self, *values):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+# prometheus_client writes into the directory as metrics are created. gunicorn.conf.py
+# prepares it for gunicorn; other entry points (flask migrate, uvicorn) need it too.
+if prometheus_client is not None and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+def _metric(kind, name, documentation, labels=(), **kwargs):
+    if prometheus_client is None:
+        return _NoMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labels, **kwargs)
+
+HTTP_REQUESTS = _metric('Counter', 'taskmanager_http_requests', 'HTTP requests by route and status',
+                        ('method', 'route', 'status'))
+HTTP_REQUEST_SECONDS = _metric('Histogram', 'taskmanager_http_request_duration_seconds',
+                               'Time to produce a response; streamed bodies are sent after it',
+                               ('method', 'route'))
+HTTP_REQUESTS_IN_PROGRESS = _metric('Gauge', 'taskmanager_http_requests_in_progress',
+                                    'Requests being handled', multiprocess_mode='livesum')
+DB_OPERATION_SECONDS = _metric('Histogram', 'taskmanager_db_operation_duration_seconds',
+                               'Storage engine calls, including waiting for a pooled connection',
+                               ('engine', 'operation'))
+DB_ERRORS = _metric('Counter', 'taskmanager_db_errors', 'Failed storage engine calls', ('engine', 'operation'))
+ROOM_CACHE_ROOMS = _metric('Gauge', 'taskmanager_room_cache_rooms', 'Rooms cached', multiprocess_mode='livesum')
+ROOM_CACHE_BYTES = _metric('Gauge', 'taskmanager_room_cache_bytes', 'Estimated JSON size of the cached rooms',
+                           multiprocess_mode='livesum')
+ROOM_CACHE_LOOKUPS = _metric('Counter', 'taskmanager_room_cache_lookups', 'Room cache lookups by result',
+                             ('result',))
+CHANGE_LOG_READS = _metric('Counter', 'taskmanager_change_log_reads',
+                           'Replays for ?since= and Last-Event-ID by where the changes came from', ('result',))
+PROCESS_MEMORY = _metric('Gauge', 'taskmanager_process_resident_memory_bytes', 'Resident memory per worker',
+                         multiprocess_mode='liveall')
+
+def timed_operation(method):
+    """Record a storage engine method's duration under the engine's name and the method's."""
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            DB_OPERATION_SECONDS.labels(self.name, method.__name__).observe(time.perf_counter() - start)
+    return timed
+
+def resident_memory_bytes():
+    """This process's resident set size, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+_metrics_lock = threading.Lock()
+_metrics_refreshed_at = 0.0
+_exported_lookups = {'hits': 0, 'misses': 0}
+
+def refresh_metrics():
+    """Copy this worker's room cache figures and memory use into the metrics."""
+    global _metrics_refreshed_at
+    with _metrics_lock:
+        _metrics_refreshed_at = time.monotonic()
+        stats = rooms.stats()
+        ROOM_CACHE_ROOMS.set(stats['entries'])
+        ROOM_CACHE_BYTES.set(stats['bytes'])
+        # The cache keeps its own totals; the counters advance by what is new since last time
+        for key, result in (('hits', 'hit'), ('misses', 'miss')):
+            ROOM_CACHE_LOOKUPS.labels(result).inc(stats[key] - _exported_lookups[key])
+            _exported_lookups[key] = stats[key]
+        memory = resident_memory_bytes()
+        if memory is not None:
+            PROCESS_MEMORY.set(memory)
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    HTTP_REQUESTS_IN_PROGRESS.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # Route templates rather than paths, so room codes and task ids do not become labels
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.labels(request.method, route, response.status_code).inc()
+    HTTP_REQUEST_SECONDS.labels(request.method, route).observe(time.perf_counter() - g.request_started)
+    if time.monotonic() - _metrics_refreshed_at >= METRICS_REFRESH_SECONDS:
+        refresh_metrics()
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if 'request_started' in g:
+        HTTP_REQUESTS_IN_PROGRESS.dec()
+
+# ---------------- Database connection ----------------
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within the wait timeout."""
+
+
+def _connect():
+    """Open a new database connection using environment variables."""
+    return psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        database=os.getenv('DB_NAME', 'taskmanager'),
+        user=os.getenv('DB_USER', 'taskmanager'),
+        password=os.getenv('DB_PASSWORD', 'password'),
+        port=os.getenv('DB_PORT', '5432'),
+        connect_timeout=DB_CONNECT_TIMEOUT
+    )
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections owned by a single process.
+
+    Connections are opened lazily up to `maxconn`; callers wait up to `timeout`
+    seconds for one to be returned before PoolTimeout is raised. Connections
+    idle for longer than `check_interval` are pinged before being handed out.
+    """
+
+    def __init__(self, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 check_interval=DB_POOL_HEALTHCHECK_INTERVAL, connect=_connect):
+        self.pid = os.getpid()
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._connect = connect
+        self._idle = deque()  # (conn, last_used) pairs, most recently used on the right
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "failed_health_checks": 0,
+        }
+
+    def warm(self):
+        """Open up to `minconn` idle connections; failures are left for acquire() to report."""
+        while True:
+            with self._cond:
+                if len(self._idle) + self._in_use >= self.minconn:
+                    return
+                self._in_use += 1
+            try:
+                conn = self._new_connection()
+            except psycopg2.Error:
+                with self._cond:
+                    self._in_use -= 1
+                    self._cond.notify()
+                return
+            self.release(conn)
+
+    def acquire(self):
+        """Borrow a healthy connection, waiting up to `timeout` seconds for one."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use < self.maxconn:
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeout(f"no database connection available after {self.timeout}s")
+                self._counters["waits"] += 1
+                self._cond.wait(remaining)
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._new_connection()
+        except BaseException:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection; borrowed ones are closed when released."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close(conn)
+
+    def stats(self):
+        """Snapshot of pool sizing and counters for monitoring."""
+        with self._cond:
+            return {
+                "pid": self.pid,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._counters,
+            }
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._counters["connections_created"] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._counters["connections_closed"] += 1
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._counters["failed_health_checks"] += 1
+            return False
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited from a parent process across fork(). Their sockets belong to the
+# parent, so they are kept referenced here and never closed or garbage collected
+# in the child (closing would terminate the parent's server sessions).
+_inherited_pools = []
+
+
+def get_pool():
+    """Return this process's connection pool, creating a fresh one after fork."""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid != os.getpid():
+            _inherited_pools.append(_pool)
+            _pool = None
+        if _pool is None:
+            _pool = ConnectionPool()
+            _pool.warm()
+        return _pool
+
+
+def pool_stats():
+    """Connection pool stats for this worker, or None before the pool is created."""
+    pool = _pool
+    if pool is None or pool.pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled database connection; yields None if the database is unreachable."""
+    try:
+        pool = get_pool()
+        conn = pool.acquire()
+    except (psycopg2.Error, PoolTimeout) as e:
+        print(f"Database connection error: {e}")
+        DB_ERRORS.labels('postgres', 'connect').inc()
+        yield None
+        return
+
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+INVALIDATION_CHANNEL = 'room_invalidation'
+# Identifies this worker in invalidation payloads so it can ignore its own writes
+INSTANCE_ID = uuid.uuid4().hex
+
+TASK_COLUMNS = ('id', 'title', 'description', 'priority', 'due_date',
+                'completed', 'completed_at', 'created_at')
+
+
+def migrate_room_tasks(cur):
+    """
+    One-shot move of tasks from the legacy rooms.tasks JSONB array into the tasks table.
+
+    Rooms are emptied as they are migrated, so re-running is a no-op. Ids that the
+    old `len(tasks) + 1` allocator handed out twice are renumbered past the room's
+    highest id so no task is dropped.
+    """
+    cur.execute("SELECT code, created_at, tasks FROM rooms WHERE tasks <> '[]'::jsonb FOR UPDATE")
+    legacy = cur.fetchall()
+    for code, room_created_at, tasks in legacy:
+        seen = set()
+        next_id = max((t.get('id') or 0 for t in tasks), default=0) + 1
+        rows = []
+        for t in tasks:
+            task_id = t.get('id')
+            if not task_id or task_id in seen:
+                task_id, next_id = next_id, next_id + 1
+            seen.add(task_id)
+            rows.append((
+                code, task_id, t.get('title') or '', t.get('description') or '',
+                t.get('priority') or 'medium', t.get('due_date'), bool(t.get('completed')),
+                t.get('completed_at'), t.get('created_at') or room_created_at
+            ))
+        psycopg2.extras.execute_values(cur, '''
+            INSERT INTO tasks (room_code, id, title, description, priority, due_date,
+                               completed, completed_at, created_at)
+            VALUES %s
+            ON CONFLICT (room_code, id) DO NOTHING
+        ''', rows)
+        cur.execute("UPDATE rooms SET tasks = '[]'::jsonb WHERE code = %s", (code,))
+    return len(legacy)
+
+def create_base_tables(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS rooms (
+            code VARCHAR(10) PRIMARY KEY,
+            owner VARCHAR(255) NOT NULL,
+            members JSONB NOT NULL DEFAULT '[]',
+            created_at TIMESTAMP NOT NULL,
+            tasks JSONB NOT NULL DEFAULT '[]'
+        )
+    ''')
+    # One row per task
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            room_code VARCHAR(10) NOT NULL REFERENCES rooms(code) ON DELETE CASCADE,
+            id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            priority VARCHAR(20) NOT NULL DEFAULT 'medium',
+            due_date TIMESTAMP,
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            completed_at TIMESTAMP,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (room_code, id)
+        )
+    ''')
+
+def create_task_indexes(cur):
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_completed
+        ON tasks (room_code, completed, id)
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_priority
+        ON tasks (room_code, lower(priority), id)
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_due_date
+        ON tasks (room_code, due_date) WHERE due_date IS NOT NULL
+    ''')
+
+def move_legacy_tasks(cur):
+    migrated = migrate_room_tasks(cur)
+    if migrated:
+        print(f"Migrated tasks of {migrated} room(s) into the tasks table")
+
+def add_next_task_id(cur):
+    # Monotonic per-room task id counter, seeded past existing ids
+    cur.execute('''
+        ALTER TABLE rooms ADD COLUMN IF NOT EXISTS next_task_id INTEGER NOT NULL DEFAULT 1
+    ''')
+    cur.execute('''
+        UPDATE rooms r SET next_task_id = m.max_id + 1
+        FROM (SELECT room_code, MAX(id) AS max_id FROM tasks GROUP BY room_code) m
+        WHERE r.code = m.room_code AND r.next_task_id <= m.max_id
+    ''')
+
+def add_room_version(cur):
+    # Per-room version, bumped by every mutation; backs ETags
+    cur.execute('''
+        ALTER TABLE rooms ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0
+    ''')
+
+def create_room_codes(cur):
+    # Room codes claimed by any worker; the single authority for code allocation
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS room_codes (
+            code VARCHAR(10) PRIMARY KEY,
+            claimed_by VARCHAR(32) NOT NULL,
+            claimed_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    ''')
+    cur.execute('''
+        INSERT INTO room_codes (code, claimed_by)
+        SELECT code, 'existing' FROM rooms
+        ON CONFLICT (code) DO NOTHING
+    ''')
+
+def add_task_search(cur):
+    # Full-text search over titles (weight A) and descriptions (weight B); the
+    # 'simple' configuration matches words as typed, like the in-memory index
+    cur.execute('''
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', title), 'A') ||
+            setweight(to_tsvector('simple', description), 'B')
+        ) STORED
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_search ON tasks USING GIN (search_vector)
+    ''')
+
+def lowercase_priorities(cur):
+    # Priorities are stored normalized (see normalize_priority)
+    cur.execute("UPDATE tasks SET priority = lower(priority) WHERE priority <> lower(priority)")
+
+def add_flushed_version(cur):
+    # Versions are reserved before a change is applied (see reserve_changes) and
+    # counted here once it is committed; the stored room is complete when both agree
+    cur.execute('''
+        ALTER TABLE rooms ADD COLUMN IF NOT EXISTS flushed_version BIGINT NOT NULL DEFAULT 0
+    ''')
+    cur.execute("UPDATE rooms SET flushed_version = version WHERE flushed_version < version")
+
+def create_room_changes(cur):
+    # Committed change log entries, so any worker can replay ?since= and Last-Event-ID;
+    # write_batch_to_db keeps the newest ROOM_CHANGE_LOG_SIZE per room
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS room_changes (
+            room_code VARCHAR(10) NOT NULL REFERENCES rooms(code) ON DELETE CASCADE,
+            version BIGINT NOT NULL,
+            event TEXT NOT NULL,
+            data JSONB NOT NULL,
+            PRIMARY KEY (room_code, version)
+        )
+    ''')
+
+def add_reserved_at(cur):
+    # When versions were last reserved; see RESERVE_LEASE_SECONDS
+    cur.execute('''
+        ALTER TABLE rooms ADD COLUMN IF NOT EXISTS reserved_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    ''')
+
+def drop_task_list_indexes(cur):
+    # GET /tasks filters and sorts the cached room in memory; tasks are only read by room
+    cur.execute('DROP INDEX IF EXISTS idx_tasks_room_completed')
+    cur.execute('DROP INDEX IF EXISTS idx_tasks_room_priority')
+    cur.execute('DROP INDEX IF EXISTS idx_tasks_room_due_date')
+
+# Applied in order by `flask --app app migrate`; append new steps, never edit applied ones.
+# Every step is idempotent so databases created before versioning converge too.
+MIGRATIONS = [
+    (1, 'create rooms and tasks tables', create_base_tables),
+    (2, 'index tasks by status, priority and due date', create_task_indexes),
+    (3, 'move legacy rooms.tasks JSONB into tasks', move_legacy_tasks),
+    (4, 'add rooms.next_task_id', add_next_task_id),
+    (5, 'add rooms.version', add_room_version),
+    (6, 'create room_codes', create_room_codes),
+    (7, 'add tasks.search_vector', add_task_search),
+    (8, 'lowercase tasks.priority', lowercase_priorities),
+    (9, 'add rooms.flushed_version', add_flushed_version),
+    (10, 'create room_changes', create_room_changes),
+    (11, 'add rooms.reserved_at', add_reserved_at),
+    (12, 'drop task status, priority and due date indexes', drop_task_list_indexes),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+# Serializes concurrent migration runs (e.g. several containers starting at once)
+MIGRATION_LOCK_ID = zlib.crc32(b'taskmanager-migrations')
+
+def run_migrations():
+    """Apply pending migrations, each in its own transaction. Returns the versions applied, None on error."""
+    applied = []
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                ''')
+            conn.commit()
+
+            for version, name, migrate in MIGRATIONS:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+                    cur.execute('SELECT 1 FROM schema_migrations WHERE version = %s', (version,))
+                    if cur.fetchone():
+                        conn.commit()
+                        continue
+                    migrate(cur)
+                    cur.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                                (version, name))
+                conn.commit()
+                applied.append(version)
+                print(f"Applied migration {version}: {name}")
+        except psycopg2.Error as e:
+            print(f"Database migration error: {e}")
+            return None
+
+    return applied
+
+def current_schema_version():
+    """Highest applied migration (0 if never migrated), or None if the database is unreachable."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('schema_migrations')")
+                version = 0
+                if cur.fetchone()[0] is not None:
+                    cur.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+                    version = cur.fetchone()[0]
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error reading schema version: {e}")
+            return None
+
+    return version
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Bring the database schema up to date."""
+    engine = make_storage()
+    applied = engine.migrate()
+    if applied is None:
+        raise SystemExit(1)
+    print(f"{engine.name} schema is at version {engine.schema_target} ({len(applied)} migration(s) applied)")
+
+# ---------------- Task model ----------------
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def to_timestamp(value):
+    """
+    Integer seconds for a 'YYYY-MM-DD HH:MM:SS' string or datetime; None passes through.
+    Times are naive wall-clock values, counted as if UTC so they round-trip exactly.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.strptime(value, TIMESTAMP_FORMAT)
+    return calendar.timegm(value.timetuple())
+
+def format_timestamp(seconds):
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds)) if seconds is not None else None
+
+def now_ts():
+    return to_timestamp(datetime.now())
+
+
+def normalize_priority(priority):
+    """Priorities match case-insensitively, so they are stored lowercased; none means medium."""
+    return str(priority).lower() if priority is not None else 'medium'
+
+
+class Task:
+    """
+    A task held in a cached room. Timestamps are integers (see to_timestamp) and
+    are only formatted by to_dict(), the API and persistence representation.
+    """
+    __slots__ = TASK_COLUMNS
+
+    def __init__(self, id, title, description='', priority='medium', due_date=None,
+                 completed=False, completed_at=None, created_at=None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.priority = normalize_priority(priority)
+        self.due_date = due_date
+        self.completed = completed
+        self.completed_at = completed_at
+        self.created_at = created_at
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['id'], data['title'], data.get('description') or '',
+                   data.get('priority', 'medium'), to_timestamp(data.get('due_date')),
+                   bool(data.get('completed')), to_timestamp(data.get('completed_at')),
+                   to_timestamp(data.get('created_at')))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "priority": self.priority,
+            "due_date": format_timestamp(self.due_date),
+            "completed": self.completed,
+            "completed_at": format_timestamp(self.completed_at),
+            "created_at": format_timestamp(self.created_at)
+        }
+
+# ---------------- Database helpers ----------------
+def format_ts(value):
+    """Format a TIMESTAMP column value the way the API returns it."""
+    return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+TIMESTAMP_COLUMNS = ('due_date', 'completed_at', 'created_at')
+
+def task_from_row(row):
+    """Convert a (possibly projected) tasks table row into the task dict the API returns."""
+    return {c: format_ts(v) if c in TIMESTAMP_COLUMNS else v for c, v in row.items()}
+
+def get_room_from_db(room_code):
+    """Get room and its tasks from database."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT code, owner, members, created_at, next_task_id, version, flushed_version,
+                           reserved_at < NOW() - make_interval(secs => %s) AS lease_expired
+                    FROM rooms WHERE code = %s
+                ''', (RESERVE_LEASE_SECONDS, room_code))
+                room = cur.fetchone()
+                tasks = []
+                if room and room['flushed_version'] < room['version'] and room['lease_expired']:
+                    # Nobody will commit the missing versions any more
+                    cur.execute('''
+                        UPDATE rooms SET flushed_version = version
+                        WHERE code = %s AND flushed_version < version
+                          AND reserved_at < NOW() - make_interval(secs => %s)
+                    ''', (room_code, RESERVE_LEASE_SECONDS))
+                    if cur.rowcount:
+                        room['flushed_version'] = room['version']
+                if room:
+                    cur.execute(f'''
+                        SELECT {', '.join(TASK_COLUMNS)} FROM tasks
+                        WHERE room_code = %s ORDER BY id
+                    ''', (room_code,))
+                    tasks = [task_from_row(r) for r in cur.fetchall()]
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error getting room: {e}")
+            DB_ERRORS.labels('postgres', 'load_room').inc()
+            return None
+
+    if room:
+        return build_room_indexes({
+            'code': room['code'],
+            'owner': room['owner'],
+            'members': room['members'],
+            'created_at': format_ts(room['created_at']),
+            'tasks': {t['id']: Task.from_dict(t) for t in tasks},
+            'next_task_id': max(room['next_task_id'], tasks[-1]['id'] + 1 if tasks else 1),
+            'version': room['version'],
+            'partial': room['flushed_version'] < room['version']
+        })
+    return None
+
+def insert_room(room):
+    """Insert a new room row. Returns False if the code is already taken, None on error."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    INSERT INTO rooms (code, owner, members, created_at, next_task_id, version, flushed_version)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (code) DO NOTHING
+                    RETURNING code
+                ''', (room['code'], room['owner'], json.dumps(room['members']),
+                      datetime.strptime(room['created_at'], '%Y-%m-%d %H:%M:%S'),
+                      room['next_task_id'], room['version'], room['version']))
+                inserted = cur.fetchone() is not None
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error creating room: {e}")
+            DB_ERRORS.labels('postgres', 'create_room').inc()
+            return None
+
+    return inserted
+
+def reserve_in_db(room_code, task_ids, versions):
+    """
+    Advance a room's task id and version counters in one statement.
+    Returns the (next_task_id, version) they had before, or None on error.
+    """
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    UPDATE rooms SET next_task_id = next_task_id + %s, version = version + %s,
+                                     reserved_at = NOW()
+                    WHERE code = %s
+                    RETURNING next_task_id - %s, version - %s
+                ''', (task_ids, versions, room_code, task_ids, versions))
+                row = cur.fetchone()
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error reserving versions: {e}")
+            DB_ERRORS.labels('postgres', 'reserve').inc()
+            return None
+
+    if row is None:
+        print(f"Room {room_code} is not stored; cannot reserve versions")
+    return row
+
+def write_batch_to_db(batch):
+    """
+    Persist a batch of dirty rooms in a single transaction.
+
+    `batch` is a list of (room_code, change) pairs as produced by WriteBehindQueue:
+    `change['room']` is a room metadata snapshot or None, `change['versions']` counts
+    the reserved versions it commits, `change['upserts']` maps task id to task
+    snapshot, `change['deletes']` is a set of deleted task ids and `change['changes']`
+    lists the change log entries of those versions. Room rows already exist
+    (insert_room) and their counters are advanced by reserve_in_db. Members are only
+    ever added, and another worker may have added some since this snapshot was taken,
+    so the stored list gains the snapshot's new members rather than being replaced.
+    """
+    room_rows, task_rows, delete_rows, change_rows, trim_rows = [], [], [], [], []
+    for room_code, change in batch:
+        room = change['room']
+        if room:
+            room_rows.append((room['code'], json.dumps(room['members']), change['versions']))
+        task_rows.extend((room_code, *(t[c] for c in TASK_COLUMNS)) for t in change['upserts'].values())
+        delete_rows.extend((room_code, task_id) for task_id in change['deletes'])
+        change_rows.extend((room_code, c['version'], c['event'], json.dumps(c['data'])) for c in change['changes'])
+        if change['changes']:
+            trim_rows.append((room_code, change['changes'][-1]['version'] - ROOM_CHANGE_LOG_SIZE))
+
+    with db_connection() as conn:
+        if not conn:
+            return False
+
+        try:
+            with conn.cursor() as cur:
+                if room_rows:
+                    psycopg2.extras.execute_values(cur, '''
+                        UPDATE rooms r SET
+                            members = r.members || COALESCE((
+                                SELECT jsonb_agg(m.value ORDER BY m.n)
+                                FROM jsonb_array_elements(v.members::jsonb) WITH ORDINALITY AS m(value, n)
+                                WHERE NOT r.members @> jsonb_build_array(m.value)
+                            ), '[]'::jsonb),
+                            flushed_version = LEAST(r.version, r.flushed_version + v.versions)
+                        FROM (VALUES %s) AS v(code, members, versions)
+                        WHERE r.code = v.code
+                    ''', room_rows)
+                if delete_rows:
+                    psycopg2.extras.execute_values(cur, '''
+                        DELETE FROM tasks t USING (VALUES %s) AS d(room_code, id)
+                        WHERE t.room_code = d.room_code AND t.id = d.id
+                    ''', delete_rows)
+                if task_rows:
+                    psycopg2.extras.execute_values(cur, '''
+                        INSERT INTO tasks (room_code, id, title, description, priority, due_date,
+                                           completed, completed_at, created_at)
+                        VALUES %s
+                        ON CONFLICT (room_code, id) DO UPDATE SET
+                            title = EXCLUDED.title,
+                            description = EXCLUDED.description,
+                            priority = EXCLUDED.priority,
+                            due_date = EXCLUDED.due_date,
+                            completed = EXCLUDED.completed,
+                            completed_at = EXCLUDED.completed_at
+                    ''', task_rows)
+                if change_rows:
+                    psycopg2.extras.execute_values(cur, '''
+                        INSERT INTO room_changes (room_code, version, event, data) VALUES %s
+                        ON CONFLICT (room_code, version) DO NOTHING
+                    ''', change_rows)
+                    psycopg2.extras.execute_values(cur, '''
+                        DELETE FROM room_changes c USING (VALUES %s) AS n(room_code, oldest_dropped)
+                        WHERE c.room_code = n.room_code AND c.version <= n.oldest_dropped
+                    ''', trim_rows)
+                # Delivered on commit; tells other workers to drop their cached copies
+                psycopg2.extras.execute_values(
+                    cur,
+                    f"SELECT pg_notify('{INVALIDATION_CHANNEL}', v.payload) FROM (VALUES %s) AS v(payload)",
+                    [(f"{room_code}:{INSTANCE_ID}",) for room_code, _ in batch]
+                )
+            conn.commit()
+            return True
+        except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+            DB_ERRORS.labels('postgres', 'write_batch').inc()
+            raise PermanentWriteError(str(e).strip()) from e
+        except psycopg2.Error as e:
+            print(f"Database error flushing {len(batch)} room(s): {e}")
+            DB_ERRORS.labels('postgres', 'write_batch').inc()
+            return False
+
+def get_changes_from_db(room_code, after, upto):
+    """Stored change log entries with versions in (after, upto], oldest first, or None on error."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT version, event, data FROM room_changes
+                    WHERE room_code = %s AND version > %s AND version <= %s
+                    ORDER BY version
+                ''', (room_code, after, upto))
+                rows = cur.fetchall()
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error getting room changes: {e}")
+            DB_ERRORS.labels('postgres', 'load_changes').inc()
+            return None
+
+    return [dict(row) for row in rows]
+
+def search_tasks_in_db(room_code, query, offset=0, limit=None, fields=None):
+    """
+    Rank a room's tasks against `query` through the GIN index on search_vector.
+    Returns (total matches, page of tasks), or None on error.
+    """
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(f'''
+                    SELECT {', '.join(fields or TASK_COLUMNS)}, COUNT(*) OVER () AS total_matches
+                    FROM tasks, plainto_tsquery('simple', %s) query
+                    WHERE room_code = %s AND search_vector @@ query
+                    ORDER BY ts_rank(search_vector, query) DESC, id
+                    OFFSET %s {'LIMIT %s' if limit is not None else ''}
+                ''', [query, room_code, offset] + ([limit] if limit is not None else []))
+                rows = cur.fetchall()
+                total = rows[0]['total_matches'] if rows else 0
+                if not rows and offset:
+                    # Past the last page: the window count is not available, ask for it
+                    cur.execute('''
+                        SELECT COUNT(*) AS n FROM tasks
+                        WHERE room_code = %s AND search_vector @@ plainto_tsquery('simple', %s)
+                    ''', (room_code, query))
+                    total = cur.fetchone()['n']
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error searching tasks: {e}")
+            DB_ERRORS.labels('postgres', 'search_tasks').inc()
+            return None
+
+    for row in rows:
+        del row['total_matches']
+    return total, [task_from_row(r) for r in rows]
+
+def claim_room_codes(codes):
+    """
+    Atomically claim candidate room codes in one statement.
+    Returns the codes this worker now owns (taken ones are skipped), or None on error.
+    """
+    with db_connection() as conn:
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                rows = psycopg2.extras.execute_values(cur, '''
+                    INSERT INTO room_codes (code, claimed_by) VALUES %s
+                    ON CONFLICT (code) DO NOTHING
+                    RETURNING code
+                ''', [(code, INSTANCE_ID) for code in codes], fetch=True)
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Database error claiming room codes: {e}")
+            DB_ERRORS.labels('postgres', 'claim_room_codes').inc()
+            return None
+
+    return [row[0] for row in rows]
+
+# ---------------- Storage engines ----------------
+# Rooms are always served from the in-memory cache; an engine only decides where
+# they are loaded from and where the write-behind queue persists them.
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'postgres')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'taskmanager.db')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+# Reserved versions still uncommitted this long after the room's last reservation are
+# given up as lost (a killed worker, a quarantined batch), so the room stops being partial
+RESERVE_LEASE_SECONDS = float(os.getenv('RESERVE_LEASE_SECONDS', '60'))
+# Task ids and versions a worker reserves for a room in one database write; 0 reserves
+# exactly what each mutation needs (see reserve_changes)
+RESERVE_BLOCK_SIZE = int(os.getenv('RESERVE_BLOCK_SIZE', '0'))
+
+
+class PermanentWriteError(Exception):
+    """Raised by Storage.write_batch when a batch violates a constraint and can never commit."""
+
+
+class Storage:
+    """
+    Interface every storage engine implements; the defaults keep nothing.
+
+    `persistent` engines get the write-behind queue and a bounded cache. Engines
+    that `notifies` push cross-process invalidations; other persistent engines are
+    revalidated per request through room_version().
+    """
+    name = 'memory'
+    persistent = False
+    notifies = False
+    schema_target = 0
+
+    def schema_version(self):
+        """Highest applied migration, 0 if never migrated, None if unreachable."""
+        return 0
+
+    def migrate(self):
+        """Apply pending migrations. Returns the versions applied, None on error."""
+        return []
+
+    def load_room(self, room_code):
+        """Room with its tasks and indexes, or None."""
+        return None
+
+    def room_version(self, room_code):
+        """Stored (version, flushed_version) of a room, or None."""
+        return None
+
+    def load_changes(self, room_code, after, upto):
+        """
+        Committed change log entries with versions in (after, upto], oldest first,
+        or None if not stored. Versions other workers have not committed are missing.
+        """
+        return None
+
+    def search_tasks(self, room_code, query, offset=0, limit=None, fields=None):
+        """Ranked (total, page) of tasks matching `query`, or None to use the room's search index."""
+        return None
+
+    def create_room(self, room):
+        """Store a new room right away. Returns False if its code is taken, None on error."""
+        return True
+
+    def reserve(self, room_code, task_ids, versions):
+        """
+        Advance the room's stored task id and version counters, which every process
+        allocates from. Returns the (next_task_id, version) before, or None on error.
+        """
+        return None
+
+    def write_batch(self, batch):
+        """
+        Persist a WriteBehindQueue batch atomically. Returns False to retry, and
+        raises PermanentWriteError if retrying cannot help.
+        """
+        return True
+
+    def claim_room_codes(self, codes):
+        """Claim codes for this process. Returns those claimed, or None if not shared."""
+        return None
+
+
+class MemoryStorage(Storage):
+    """Rooms live only in this process and are lost on restart."""
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL through the connection pool, with LISTEN/NOTIFY invalidation."""
+    name = 'postgres'
+    persistent = True
+    notifies = True
+    schema_target = SCHEMA_VERSION
+
+    def schema_version(self):
+        return current_schema_version()
+
+    def migrate(self):
+        return run_migrations()
+
+    @timed_operation
+    def load_room(self, room_code):
+        return get_room_from_db(room_code)
+
+    @timed_operation
+    def load_changes(self, room_code, after, upto):
+        return get_changes_from_db(room_code, after, upto)
+
+    @timed_operation
+    def search_tasks(self, room_code, query, offset=0, limit=None, fields=None):
+        return search_tasks_in_db(room_code, query, offset, limit, fields)
+
+    @timed_operation
+    def create_room(self, room):
+        return insert_room(room)
+
+    @timed_operation
+    def reserve(self, room_code, task_ids, versions):
+        return reserve_in_db(room_code, task_ids, versions)
+
+    @timed_operation
+    def write_batch(self, batch):
+        return write_batch_to_db(batch)
+
+    @timed_operation
+    def claim_room_codes(self, codes):
+        return claim_room_codes(codes)
+
+
+SQLITE_MIGRATIONS = [
+    (1, 'create rooms, tasks and room_codes', '''
+        CREATE TABLE IF NOT EXISTS rooms (
+            code TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            members TEXT NOT NULL DEFAULT '[]',
+            created_at TEXT NOT NULL,
+            next_task_id INTEGER NOT NULL DEFAULT 1,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            room_code TEXT NOT NULL REFERENCES rooms(code) ON DELETE CASCADE,
+            id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL DEFAULT '',
+            priority TEXT NOT NULL DEFAULT 'medium',
+            due_date TEXT,
+            completed INTEGER NOT NULL DEFAULT 0,
+            completed_at TEXT,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (room_code, id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_completed ON tasks (room_code, completed, id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_priority ON tasks (room_code, lower(priority), id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_room_due_date ON tasks (room_code, due_date)
+            WHERE due_date IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS room_codes (
+            code TEXT PRIMARY KEY,
+            claimed_by TEXT NOT NULL,
+            claimed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (2, 'lowercase tasks.priority', '''
+        UPDATE tasks SET priority = lower(priority) WHERE priority <> lower(priority);
+    '''),
+    (3, 'add rooms.flushed_version', '''
+        ALTER TABLE rooms ADD COLUMN flushed_version INTEGER NOT NULL DEFAULT 0;
+        UPDATE rooms SET flushed_version = version;
+    '''),
+    (4, 'create room_changes', '''
+        CREATE TABLE IF NOT EXISTS room_changes (
+            room_code TEXT NOT NULL REFERENCES rooms(code) ON DELETE CASCADE,
+            version INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (room_code, version)
+        );
+    '''),
+    (5, 'add rooms.reserved_at', '''
+        ALTER TABLE rooms ADD COLUMN reserved_at REAL NOT NULL DEFAULT 0;
+    '''),
+    (6, 'drop task status, priority and due date indexes', '''
+        DROP INDEX IF EXISTS idx_tasks_room_completed;
+        DROP INDEX IF EXISTS idx_tasks_room_priority;
+        DROP INDEX IF EXISTS idx_tasks_room_due_date;
+    '''),
+]
+
+
+class SQLiteStorage(Storage):
+    """
+    A local SQLite file in WAL mode, for single-node deployments.
+
+    Each thread keeps its own connection. Workers on the same node share the
+    file; they see each other's writes by comparing room versions per request.
+    Timestamps are stored as the API's 'YYYY-MM-DD HH:MM:SS' text.
+    """
+    name = 'sqlite'
+    persistent = True
+    schema_target = SQLITE_MIGRATIONS[-1][0]
+
+    def __init__(self, path=SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def _task(row):
+        task = dict(row)
+        if 'completed' in task:
+            task['completed'] = bool(task['completed'])
+        return task
+
+    def schema_version(self):
+        try:
+            conn = self._connection()
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_migrations'").fetchone():
+                return 0
+            return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations').fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"SQLite error reading schema version: {e}")
+            return None
+
+    def migrate(self):
+        applied = []
+        try:
+            conn = self._connection()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.commit()
+            for version, name, script in SQLITE_MIGRATIONS:
+                # BEGIN IMMEDIATE takes the write lock, serializing concurrent runs
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if conn.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,)).fetchone():
+                        conn.rollback()
+                        continue
+                    for statement in script.split(';'):
+                        if statement.strip():
+                            conn.execute(statement)
+                    conn.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                applied.append(version)
+                print(f"Applied migration {version}: {name}")
+        except sqlite3.Error as e:
+            print(f"SQLite migration error: {e}")
+            return None
+        return applied
+
+    @timed_operation
+    def load_room(self, room_code):
+        try:
+            conn = self._connection()
+            room = conn.execute('''
+                SELECT code, owner, members, created_at, next_task_id, version, flushed_version, reserved_at
+                FROM rooms WHERE code = ?
+            ''', (room_code,)).fetchone()
+            if not room:
+                return None
+            flushed_version = self._reconcile(conn, room)
+            tasks = [self._task(r) for r in conn.execute(
+                f"SELECT {', '.join(TASK_COLUMNS)} FROM tasks WHERE room_code = ? ORDER BY id", (room_code,))]
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"SQLite error getting room: {e}")
+            DB_ERRORS.labels('sqlite', 'load_room').inc()
+            return None
+
+        return build_room_indexes({
+            'code': room['code'],
+            'owner': room['owner'],
+            'members': json.loads(room['members']),
+            'created_at': room['created_at'],
+            'tasks': {t['id']: Task.from_dict(t) for t in tasks},
+            'next_task_id': max(room['next_task_id'], tasks[-1]['id'] + 1 if tasks else 1),
+            'version': room['version'],
+            'partial': flushed_version < room['version']
+        })
+
+    @staticmethod
+    def _reconcile(conn, room):
+        """The room row's flushed_version, first giving up versions whose lease has expired."""
+        if room['flushed_version'] >= room['version'] or room['reserved_at'] > time.time() - RESERVE_LEASE_SECONDS:
+            return room['flushed_version']
+        # Nobody will commit the missing versions any more
+        with conn:
+            updated = conn.execute('''
+                UPDATE rooms SET flushed_version = version
+                WHERE code = ? AND flushed_version < version AND reserved_at <= ?
+            ''', (room['code'], time.time() - RESERVE_LEASE_SECONDS)).rowcount
+        return room['version'] if updated else room['flushed_version']
+
+    @timed_operation
+    def room_version(self, room_code):
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT code, version, flushed_version, reserved_at FROM rooms WHERE code = ?',
+                (room_code,)).fetchone()
+            if not row:
+                return None
+            return row['version'], self._reconcile(conn, row)
+        except sqlite3.Error as e:
+            print(f"SQLite error getting room version: {e}")
+            DB_ERRORS.labels('sqlite', 'room_version').inc()
+            return None
+
+    @timed_operation
+    def load_changes(self, room_code, after, upto):
+        try:
+            rows = self._connection().execute('''
+                SELECT version, event, data FROM room_changes
+                WHERE room_code = ? AND version > ? AND version <= ? ORDER BY version
+            ''', (room_code, after, upto)).fetchall()
+        except sqlite3.Error as e:
+            print(f"SQLite error getting room changes: {e}")
+            DB_ERRORS.labels('sqlite', 'load_changes').inc()
+            return None
+        return [{"version": r['version'], "event": r['event'], "data": json.loads(r['data'])} for r in rows]
+
+    @timed_operation
+    def create_room(self, room):
+        try:
+            with self._connection() as conn:
+                return conn.execute('''
+                    INSERT OR IGNORE INTO rooms (code, owner, members, created_at, next_task_id,
+                                                 version, flushed_version)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (room['code'], room['owner'], json.dumps(room['members']), room['created_at'],
+                      room['next_task_id'], room['version'], room['version'])).rowcount == 1
+        except sqlite3.Error as e:
+            print(f"SQLite error creating room: {e}")
+            DB_ERRORS.labels('sqlite', 'create_room').inc()
+            return None
+
+    @timed_operation
+    def reserve(self, room_code, task_ids, versions):
+        try:
+            with self._connection() as conn:
+                row = conn.execute('''
+                    UPDATE rooms SET next_task_id = next_task_id + ?, version = version + ?, reserved_at = ?
+                    WHERE code = ?
+                    RETURNING next_task_id - ?, version - ?
+                ''', (task_ids, versions, time.time(), room_code, task_ids, versions)).fetchone()
+        except sqlite3.Error as e:
+            print(f"SQLite error reserving versions: {e}")
+            DB_ERRORS.labels('sqlite', 'reserve').inc()
+            return None
+        if row is None:
+            print(f"Room {room_code} is not stored; cannot reserve versions")
+            return None
+        return tuple(row)
+
+    @timed_operation
+    def write_batch(self, batch):
+        room_rows, task_rows, delete_rows, change_rows, trim_rows = [], [], [], [], []
+        for room_code, change in batch:
+            room = change['room']
+            if room:
+                room_rows.append({'members': json.dumps(room['members']), 'versions': change['versions'],
+                                  'code': room['code']})
+            task_rows.extend((room_code, *(t[c] for c in TASK_COLUMNS)) for t in change['upserts'].values())
+            delete_rows.extend((room_code, task_id) for task_id in change['deletes'])
+            change_rows.extend((room_code, c['version'], c['event'], json.dumps(c['data'])) for c in change['changes'])
+            if change['changes']:
+                trim_rows.append((room_code, change['changes'][-1]['version'] - ROOM_CHANGE_LOG_SIZE))
+
+        try:
+            with self._connection() as conn:
+                # Append the snapshot's members the stored list lacks (see write_batch_to_db)
+                conn.executemany('''
+                    UPDATE rooms SET
+                        members = (
+                            SELECT json_group_array(value) FROM (
+                                SELECT 0 AS src, key, value FROM json_each(rooms.members)
+                                UNION ALL
+                                SELECT 1, key, value FROM json_each(:members)
+                                WHERE value NOT IN (SELECT value FROM json_each(rooms.members))
+                                ORDER BY src, key
+                            )
+                        ),
+                        flushed_version = MIN(version, flushed_version + :versions)
+                    WHERE code = :code
+                ''', room_rows)
+                conn.executemany('DELETE FROM tasks WHERE room_code = ? AND id = ?', delete_rows)
+                conn.executemany('''
+                    INSERT INTO tasks (room_code, id, title, description, priority, due_date,
+                                       completed, completed_at, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (room_code, id) DO UPDATE SET
+                        title = excluded.title,
+                        description = excluded.description,
+                        priority = excluded.priority,
+                        due_date = excluded.due_date,
+                        completed = excluded.completed,
+                        completed_at = excluded.completed_at
+                ''', task_rows)
+                conn.executemany('''
+                    INSERT OR IGNORE INTO room_changes (room_code, version, event, data) VALUES (?, ?, ?, ?)
+                ''', change_rows)
+                conn.executemany('DELETE FROM room_changes WHERE room_code = ? AND version <= ?', trim_rows)
+            return True
+        except (sqlite3.IntegrityError, sqlite3.DataError) as e:
+            DB_ERRORS.labels('sqlite', 'write_batch').inc()
+            raise PermanentWriteError(str(e)) from e
+        except sqlite3.Error as e:
+            print(f"SQLite error flushing {len(batch)} room(s): {e}")
+            DB_ERRORS.labels('sqlite', 'write_batch').inc()
+            return False
+
+    @timed_operation
+    def claim_room_codes(self, codes):
+        try:
+            with self._connection() as conn:
+                return [code for code in codes if conn.execute(
+                    'INSERT OR IGNORE INTO room_codes (code, claimed_by) VALUES (?, ?)',
+                    (code, INSTANCE_ID)).rowcount]
+        except sqlite3.Error as e:
+            print(f"SQLite error claiming room codes: {e}")
+            DB_ERRORS.labels('sqlite', 'claim_room_codes').inc()
+            return None
+
+
+STORAGE_ENGINES = {'memory': MemoryStorage, 'sqlite': SQLiteStorage, 'postgres': PostgresStorage}
+
+def make_storage(name=None, **kwargs):
+    """Build the storage engine called `name` (default: STORAGE_BACKEND)."""
+    name = name or STORAGE_BACKEND
+    if name not in STORAGE_ENGINES:
+        raise ValueError(f"STORAGE_BACKEND must be one of: {', '.join(STORAGE_ENGINES)}")
+    return STORAGE_ENGINES[name](**kwargs)
+
+storage = MemoryStorage()
+# The engine named by STORAGE_BACKEND; differs from `storage` while falling back to memory
+configured_storage = None
+
+# ---------------- Write-behind persistence ----------------
+WRITE_BEHIND_MAX_LATENCY_MS = float(os.getenv('WRITE_BEHIND_MAX_LATENCY_MS', '5'))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '100'))
+WRITE_BEHIND_RETRY_SECONDS = float(os.getenv('WRITE_BEHIND_RETRY_SECONDS', '1'))
+WRITE_BEHIND_DRAIN_TIMEOUT = float(os.getenv('WRITE_BEHIND_DRAIN_TIMEOUT', '10'))
+
+
+class WriteBehindQueue:
+    """
+    Coalesces room and task mutations and persists them from a background thread.
+
+    Request handlers only mark rooms dirty. The flusher waits at most `max_latency`
+    seconds after the first pending change so that concurrent mutations share one
+    transaction (group commit), writes up to `batch_size` rooms per transaction via
+    `writer`, and re-queues a batch that failed to commit. Repeated changes to the
+    same task before a flush collapse into a single row write.
+
+    A batch the writer rejects with PermanentWriteError is split until the rooms
+    at fault are isolated; their changes are dropped, kept in `quarantined` for
+    inspection and reported to `on_quarantine(room_code)`, and the rest commits.
+    """
+
+    def __init__(self, writer=lambda batch: storage.write_batch(batch), enabled=True,
+                 max_latency=WRITE_BEHIND_MAX_LATENCY_MS / 1000.0,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, retry_delay=WRITE_BEHIND_RETRY_SECONDS,
+                 on_quarantine=None):
+        self.enabled = enabled
+        self.max_latency = max_latency
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.on_quarantine = on_quarantine
+        self.quarantined = deque(maxlen=100)  # (room_code, change, error), newest last
+        self._writer = writer
+        self._pending = OrderedDict()  # room_code -> change, oldest first
+        self._in_flight = set()
+        # Rooms in _pending or _in_flight, changed only under _cond but read without it,
+        # so that has_pending() never waits on a thread holding _cond (see RoomCache)
+        self._dirty = set()
+        self._first_dirty = 0.0
+        self._flushers = 0  # threads waiting in flush(); the flusher skips group commit for them
+        self._closing = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._counters = {"batches": 0, "rooms_flushed": 0, "failed_batches": 0, "quarantined_rooms": 0}
+
+    # -- producers (request handlers) --
+    def mark_room(self, room, changes=()):
+        """Queue the room's members and the change log entries of newly applied versions."""
+        snapshot = {k: room[k] for k in ('code', 'owner', 'created_at', 'next_task_id', 'version')}
+        snapshot['members'] = list(room['members'])
+        with self._change(room['code']) as change:
+            change['room'] = snapshot
+            change['versions'] += len(changes)
+            change['changes'].extend(changes)
+
+    def mark_task(self, room_code, task):
+        """Queue a created or modified task for persistence."""
+        with self._change(room_code) as change:
+            change['upserts'][task.id] = task.to_dict()
+            change['deletes'].discard(task.id)
+
+    def mark_deleted(self, room_code, task_id):
+        """Queue a task deletion for persistence."""
+        with self._change(room_code) as change:
+            change['upserts'].pop(task_id, None)
+            change['deletes'].add(task_id)
+
+    @contextmanager
+    def _change(self, room_code):
+        if not self.enabled:
+            yield self._new_change()
+            return
+        self._ensure_thread()
+        with self._cond:
+            change = self._pending.get(room_code)
+            if change is None:
+                if not self._pending:
+                    self._first_dirty = time.monotonic()
+                change = self._pending[room_code] = self._new_change()
+                self._dirty.add(room_code)
+            yield change
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    @staticmethod
+    def _new_change():
+        return {'room': None, 'versions': 0, 'upserts': {}, 'deletes': set(), 'changes': []}
+
+    # -- inspection / control --
+    def has_pending(self, room_code):
+        """True while the room has changes that are not yet committed. Takes no lock."""
+        return room_code in self._dirty
+
+    def flush(self, timeout=WRITE_BEHIND_DRAIN_TIMEOUT):
+        """Block until everything queued so far is committed. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flushers += 1
+            try:
+                self._cond.notify_all()
+                while self._pending or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._thread is None or not self._thread.is_alive():
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._flushers -= 1
+
+    def close(self, timeout=WRITE_BEHIND_DRAIN_TIMEOUT):
+        """Drain the queue and stop the flusher; used at worker shutdown."""
+        drained = self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if not drained:
+            print(f"Warning: {len(self._pending)} room(s) were not persisted before shutdown")
+        return drained
+
+    @contextmanager
+    def atomic(self):
+        """Hold back the flusher so every change queued inside the block commits together."""
+        with self._cond:
+            yield
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending_rooms": len(self._pending),
+                "in_flight_rooms": len(self._in_flight),
+                **self._counters,
+            }
+
+    # -- flusher thread --
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                # A thread inherited across fork() does not run in the child
+                self._pid = os.getpid()
+                self._closing = False
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Group commit: let concurrent writers join the batch until the
+                # oldest change has waited max_latency or the batch is full
+                deadline = self._first_dirty + self.max_latency
+                while len(self._pending) < self.batch_size and not (self._flushers or self._closing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popitem(last=False))
+                self._in_flight = {room_code for room_code, _ in batch}
+
+            try:
+                failed = self._write(batch)
+            except Exception as e:
+                # Whatever went wrong, the flusher keeps running and the changes stay queued
+                print(f"Write-behind error flushing {len(batch)} room(s): {e!r}")
+                failed = batch
+
+            with self._cond:
+                if failed:
+                    self._counters["failed_batches"] += 1
+                    self._requeue(failed)
+                # Committed or quarantined, unless changed again meanwhile
+                self._dirty.difference_update(c for c in self._in_flight if c not in self._pending)
+                self._in_flight = set()
+                self._cond.notify_all()
+            if failed:
+                time.sleep(self.retry_delay)
+
+    def _write(self, batch):
+        """Commit `batch`, isolating rooms that can never commit. Returns what is left to retry."""
+        try:
+            ok = self._writer(batch)
+        except PermanentWriteError as e:
+            if len(batch) == 1:
+                self._quarantine(*batch[0], e)
+                return []
+            half = len(batch) // 2
+            return self._write(batch[:half]) + self._write(batch[half:])
+        except Exception as e:
+            # Retry only this part: other parts of a split batch may have committed
+            print(f"Unexpected error flushing {len(batch)} room(s): {e!r}")
+            return batch
+        if not ok:
+            return batch
+        with self._cond:
+            self._counters["batches"] += 1
+            self._counters["rooms_flushed"] += len(batch)
+        return []
+
+    def _quarantine(self, room_code, change, error):
+        print(f"Dropping changes to room {room_code} that cannot be persisted: {error}")
+        with self._cond:
+            self._counters["quarantined_rooms"] += 1
+            self.quarantined.append((room_code, change, str(error)))
+        if self.on_quarantine:
+            self.on_quarantine(room_code)
+
+    def _requeue(self, batch):
+        """Put a failed batch back in front, letting newer changes win."""
+        for room_code, old in reversed(batch):
+            new = self._pending.pop(room_code, None)
+            if new is not None:
+                old['room'] = new['room'] or old['room']
+                old['versions'] += new['versions']
+                old['changes'].extend(new['changes'])
+                for task_id in new['deletes']:
+                    old['upserts'].pop(task_id, None)
+                    old['deletes'].add(task_id)
+                for task_id, task in new['upserts'].items():
+                    old['deletes'].discard(task_id)
+                    old['upserts'][task_id] = task
+            self._pending[room_code] = old
+            self._pending.move_to_end(room_code, last=False)
+
+
+write_queue = WriteBehindQueue(enabled=False)
+atexit.register(write_queue.close)
+
+# ---------------- Room cache ----------------
+ROOM_CACHE_MAX_ENTRIES = int(os.getenv('ROOM_CACHE_MAX_ENTRIES', '1000'))
+ROOM_CACHE_MAX_BYTES = int(os.getenv('ROOM_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+ROOM_CACHE_TTL = float(os.getenv('ROOM_CACHE_TTL', '300'))
+
+
+class RoomCache:
+    """
+    LRU cache of rooms with a TTL and an entry/byte budget.
+
+    A room's size is `sizeof(room)` when it is stored, updated by resize() after
+    each mutation. Rooms for which `is_pinned(code)` is true (unflushed writes) are
+    never evicted, and an invalidation that arrives while a room is pinned takes
+    effect once it is not. A limit of None disables that bound. `is_pinned` runs
+    under the cache lock, so it must not wait on locks held by callers of resize().
+    `on_drop(room)` is called with every room dropped or marked stale, once the
+    cache lock is released. A room looked up with hold=True is pinned as well until
+    release(), so that a request's mutation never lands on a copy dropped meanwhile.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None,
+                 is_pinned=lambda code: False, clock=time.monotonic,
+                 sizeof=lambda room: room_size(room), on_drop=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._is_pinned = is_pinned
+        self._sizeof = sizeof
+        self._clock = clock
+        self.on_drop = on_drop
+        self._entries = OrderedDict()  # code -> [room, expires_at, size, stale], LRU first
+        self._bytes = 0
+        self._dropped = []  # rooms on_drop has not been called with yet
+        self._holds = {}  # code -> number of holds not yet released
+        self._lock = threading.RLock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, code, default=None, hold=False):
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is not None and (entry[3] or (entry[1] is not None and entry[1] <= self._clock())):
+                if not self._pinned(code):
+                    self._counters["invalidations" if entry[3] else "expirations"] += 1
+                    self._remove(code)
+                    entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+            else:
+                self._entries.move_to_end(code)
+                self._counters["hits"] += 1
+                if hold:
+                    self._hold(code)
+        self._notify_dropped()
+        return entry[0] if entry is not None else default
+
+    def __setitem__(self, code, room):
+        with self._lock:
+            self._store(code, room)
+        self._notify_dropped()
+
+    def add(self, code, room, hold=False):
+        """Cache a freshly loaded room unless another thread cached it first; returns the cached room."""
+        with self._lock:
+            if hold:
+                self._hold(code)
+            entry = self._entries.get(code)
+            if entry is not None and not entry[3]:
+                return entry[0]
+            self._store(code, room)
+        self._notify_dropped()
+        return room
+
+    def release(self, code):
+        """End a hold taken by get() or add()."""
+        with self._lock:
+            count = self._holds.pop(code) - 1
+            if count:
+                self._holds[code] = count
+
+    def resize(self, code):
+        """Re-estimate a cached room's size after it changed, evicting others if now over budget."""
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return
+            size = self._sizeof(entry[0])
+            self._bytes += size - entry[2]
+            entry[2] = size
+            self._evict()
+        self._notify_dropped()
+
+    def __contains__(self, code):
+        with self._lock:
+            return code in self._entries
+
+    def items(self):
+        """(code, room) pairs of every cached room, least recently used first."""
+        with self._lock:
+            return [(code, entry[0]) for code, entry in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, code):
+        """Drop a room, or mark it stale if it still has unflushed writes."""
+        with self._lock:
+            if code not in self._entries:
+                return
+            if self._pinned(code):
+                self._entries[code][3] = True
+                self._dropped.append(self._entries[code][0])
+            else:
+                self._counters["invalidations"] += 1
+                self._remove(code)
+        self._notify_dropped()
+
+    def clear(self):
+        with self._lock:
+            self._dropped.extend(entry[0] for entry in self._entries.values())
+            self._entries.clear()
+            self._bytes = 0
+        self._notify_dropped()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else None,
+                **self._counters,
+            }
+
+    def _pinned(self, code):
+        return code in self._holds or self._is_pinned(code)
+
+    def _hold(self, code):
+        self._holds[code] = self._holds.get(code, 0) + 1
+
+    def _store(self, code, room):
+        size = self._sizeof(room)
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        if code in self._entries:
+            self._remove(code)
+        self._entries[code] = [room, expires_at, size, False]
+        self._bytes += size
+        self._evict()
+
+    def _remove(self, code):
+        entry = self._entries.pop(code)
+        self._bytes -= entry[2]
+        self._dropped.append(entry[0])
+
+    def _notify_dropped(self):
+        # Read without the lock: a thread that drops a room always notifies for it itself
+        if not self._dropped:
+            return
+        with self._lock:
+            dropped, self._dropped = self._dropped, []
+        if self.on_drop:
+            for room in dropped:
+                self.on_drop(room)
+
+    def _evict(self):
+        def over_budget():
+            return ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                    (self.max_bytes is not None and self._bytes > self.max_bytes))
+
+        for code in list(self._entries):
+            if not over_budget():
+                break
+            if not self._pinned(code):
+                self._remove(code)
+                self._counters["evictions"] += 1
+
+
+class InvalidationListener:
+    """
+    Background LISTEN on the invalidation channel that evicts rooms written elsewhere.
+
+    Uses a dedicated autocommit connection outside the pool. After a reconnect the
+    whole cache is cleared, since notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, cache, channel=INVALIDATION_CHANNEL, retry_delay=1.0, on_invalidate=None):
+        self.cache = cache
+        self.on_invalidate = on_invalidate
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the listener thread in this process if it is not already running."""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='cache-invalidation', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = _connect()
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {self.channel}')
+                if connected_before:
+                    self.cache.clear()
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.handle(conn.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                print(f"Cache invalidation listener error: {e}")
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+            time.sleep(self.retry_delay)
+
+    def handle(self, payload):
+        """Apply one '<room_code>:<instance_id>' notification."""
+        room_code, _, sender = payload.partition(':')
+        if sender != INSTANCE_ID:
+            self.cache.invalidate(room_code)
+            if self.on_invalidate:
+                self.on_invalidate(room_code)
+
+
+# Sized by use_storage() once the storage engine is known
+rooms = RoomCache(is_pinned=write_queue.has_pending, on_drop=lambda room: release_dropped(room))
+# The cached copy of a room whose changes were dropped is reloaded from storage
+write_queue.on_quarantine = rooms.invalidate
+
+# ---------------- Change feed ----------------
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = float(os.getenv('SSE_MAX_STREAM_SECONDS', '300'))
+ROOM_CHANGE_LOG_SIZE = int(os.getenv('ROOM_CHANGE_LOG_SIZE', '1000'))
+
+
+class EventHub:
+    """
+    Per-worker fan-out of "room changed" wake-ups to event stream subscribers.
+
+    The hub owns no threads: publish() runs each subscriber's callback on the
+    publishing thread, and the callback only flags its stream (a threading.Event
+    for WSGI streams). Event payloads are read from the room's change log.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # room_code -> set of callbacks
+        self._lock = threading.Lock()
+
+    def subscribe(self, room_code, callback):
+        with self._lock:
+            self._subscribers.setdefault(room_code, set()).add(callback)
+
+    def unsubscribe(self, room_code, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(room_code)
+            if callbacks is not None:
+                callbacks.discard(callback)
+                if not callbacks:
+                    del self._subscribers[room_code]
+
+    def publish(self, room_code):
+        with self._lock:
+            callbacks = list(self._subscribers.get(room_code, ()))
+        for callback in callbacks:
+            callback()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(callbacks) for callbacks in self._subscribers.values())
+
+
+event_hub = EventHub()
+# A write in another worker evicts the room and wakes local subscribers, which then
+# see a new version without the matching log entries and tell clients to resync
+invalidation_listener = InvalidationListener(rooms, on_invalidate=event_hub.publish)
+
+def format_sse(event, data, event_id=None):
+    """Encode one Server-Sent Events message."""
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def changes_since(room, version):
+    """
+    Change log entries newer than `version`, oldest first, or None if the log no
+    longer reaches back that far (the client must then reload the room).
+
+    The room's own log only holds changes made by this worker since it loaded the
+    room; older entries come from storage, which keeps the last ROOM_CHANGE_LOG_SIZE
+    committed ones. A version another worker has not committed yet is a gap: None.
+    """
+    if version == room['version']:
+        return []
+    changes = room['changes']
+    if version > room['version'] or room['version'] - version > ROOM_CHANGE_LOG_SIZE:
+        CHANGE_LOG_READS.labels('miss').inc()
+        return None
+    if changes and changes[0]['version'] <= version + 1:
+        CHANGE_LOG_READS.labels('memory').inc()
+        # Versions in the log are consecutive, so the start position is computed directly
+        return list(islice(changes, version + 1 - changes[0]['version'], None))
+    upto = changes[0]['version'] - 1 if changes else room['version']
+    stored = storage.load_changes(room['code'], version, upto)
+    if stored is None or len(stored) != upto - version:
+        CHANGE_LOG_READS.labels('miss').inc()
+        return None
+    CHANGE_LOG_READS.labels('storage').inc()
+    return stored + list(changes)
+
+def pending_room_events(room_code, last_id):
+    """
+    SSE messages a stream positioned at `last_id` has not sent yet.
+    Returns (messages, new_last_id, finished).
+    """
+    room = load_room(room_code)
+    if room is None:
+        return [format_sse('room_deleted', {"room_code": room_code})], last_id, True
+    messages = []
+    with room['lock']:
+        changes = changes_since(room, last_id)
+        version = room['version']
+    if changes is None:
+        last_id = version
+        messages.append(format_sse('resync', {"version": last_id}, last_id))
+    for change in changes or ():
+        last_id = change['version']
+        if change['event'] != RELEASED_EVENT:
+            messages.append(format_sse(change['event'], change['data'], last_id))
+    return messages, last_id, False
+
+def stream_room_events(room_code, last_id):
+    """Generator behind GET /rooms/<code>/events."""
+    wakeup = threading.Event()
+    event_hub.subscribe(room_code, wakeup.set)
+    deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            wakeup.clear()
+            messages, last_id, finished = pending_room_events(room_code, last_id)
+            yield from messages
+            if finished:
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # The browser reconnects with Last-Event-ID and resumes from here
+                return
+            if not wakeup.wait(min(SSE_HEARTBEAT_SECONDS, remaining)):
+                yield ': keepalive\n\n'
+    finally:
+        event_hub.unsubscribe(room_code, wakeup.set)
+
+# ---------------- Helpers ----------------
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+MAX_BATCH_OPERATIONS = int(os.getenv('MAX_BATCH_OPERATIONS', '1000'))
+BATCH_OPERATIONS = ('create', 'update', 'complete', 'delete')
+UPDATABLE_FIELDS = ('title', 'description', 'priority', 'completed', 'due_date')
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))
+DUE_DATE_ERROR = "Invalid due_date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"
+
+def now_str():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+def parse_due_date(s: str | None, end_of_day=False):
+    """
+    Accept 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD'. Return a to_timestamp() value or None.
+    A date alone means midnight, or its last second with `end_of_day` (upper bounds).
+    """
+    if not s or not isinstance(s, str):
+        return None
+    try:
+        return to_timestamp(datetime.strptime(s, TIMESTAMP_FORMAT))
+    except ValueError:
+        try:
+            # normalize date-only to midnight
+            midnight = to_timestamp(datetime.strptime(s, '%Y-%m-%d'))
+        except ValueError:
+            return None
+        return midnight + 86399 if end_of_day else midnight
+
+def json_object():
+    """The request's JSON body if it is an object, otherwise {}."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else {}
+
+def task_field_error(data):
+    """Message for a title, description or priority in `data` that is not text, or None."""
+    if 'title' in data and not isinstance(data['title'], str):
+        return "title must be a string"
+    for field in ('description', 'priority'):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} must be a string"
+    return None
+
+# ---------------- Room codes ----------------
+ROOM_CODE_LENGTH = 6
+# Codes claimed ahead of time per worker; 0 claims none and lets the room insert detect collisions
+ROOM_CODE_BLOCK_SIZE = int(os.getenv('ROOM_CODE_BLOCK_SIZE', '0'))
+# Fresh codes POST /rooms tries when a claimed code turns out to be stored already
+ROOM_CODE_ATTEMPTS = 3
+
+class RoomCodeAllocator:
+    """
+    Hands out room codes no other worker can be given.
+
+    Candidates are claimed through `claim` (an insert-if-absent into room_codes),
+    `block_size` at a time so most rooms are created without touching the database.
+    With a block size of 0 nothing is claimed: the caller's insert of the room is
+    what rejects a code already stored. Without `claim` (rooms live in this process
+    only) codes are checked locally; when `claim` fails, no code is handed out.
+    """
+
+    def __init__(self, claim=None, block_size=0, length=ROOM_CODE_LENGTH, is_taken=lambda code: False):
+        self.claim = claim
+        self.block_size = block_size
+        self.length = length
+        self._is_taken = is_taken
+        self._lock = threading.Lock()
+        self._reserved = deque()
+        self._issued = set()
+
+    def _candidates(self, n):
+        # Uppercase letters + digits
+        alphabet = string.ascii_uppercase + string.digits
+        return list({''.join(random.choices(alphabet, k=self.length)) for _ in range(n)})
+
+    def _claim_locally(self, codes):
+        with self._lock:
+            fresh = [c for c in codes if c not in self._issued and not self._is_taken(c)]
+            self._issued.update(fresh)
+        return fresh
+
+    def allocate(self):
+        """Return a code that is unique across rooms, or None if it cannot be claimed."""
+        while True:
+            with self._lock:
+                if self._reserved:
+                    return self._reserved.popleft()
+
+            candidates = self._candidates(max(self.block_size, 1))
+            if self.claim is not None and not self.block_size:
+                return candidates[0]
+            if self.claim is None:
+                claimed = self._claim_locally(candidates)
+            else:
+                claimed = self.claim(candidates)
+                if claimed is None:
+                    # Uniqueness within this process is not enough once rooms are shared
+                    return None
+            if not claimed:
+                continue
+
+            code, *rest = claimed
+            with self._lock:
+                self._reserved.extend(rest)
+            return code
+
+    def stats(self):
+        with self._lock:
+            return {"reserved": len(self._reserved), "block_size": self.block_size}
+
+room_codes = RoomCodeAllocator(is_taken=lambda code: code in rooms)
+
+def generate_room_code() -> str | None:
+    return room_codes.allocate()
+
+# ---------------- JSON encoding ----------------
+# Listings longer than this are streamed rather than encoded into one body
+STREAM_THRESHOLD_TASKS = int(os.getenv('STREAM_THRESHOLD_TASKS', '1000'))
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+class RawJSON:
+    """Already encoded JSON as an iterable of byte chunks, copied into responses verbatim."""
+    __slots__ = ('chunks',)
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value)
+else:
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def iter_json(value):
+    """Encode a response body piece by piece; RawJSON values anywhere inside nested dicts are passed through."""
+    if isinstance(value, RawJSON):
+        yield from value.chunks
+    elif isinstance(value, dict) and any(isinstance(v, (RawJSON, dict)) for v in value.values()):
+        separator = b'{'
+        for k, v in value.items():
+            yield separator + dumps(k) + b':'
+            yield from iter_json(v)
+            separator = b','
+        yield b'}'
+    else:
+        yield dumps(value)
+
+def encode_json(value):
+    return b''.join(iter_json(value))
+
+def _buffered(pieces, size=STREAM_CHUNK_BYTES):
+    """Group small pieces into writes of about `size` bytes."""
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def json_response(value, status=200, stream=False):
+    """JSON response; with `stream`, the body is sent as it is encoded instead of built up front."""
+    body = _buffered(iter_json(value)) if stream else encode_json(value)
+    return app.response_class(body, status=status, mimetype='application/json')
+
+def _array_chunks(fragments):
+    separator = b'['
+    for fragment in fragments:
+        yield separator + fragment
+        separator = b','
+    yield b']' if separator == b',' else b'[]'
+
+def task_json(room, task):
+    """
+    A task's encoded JSON, cached on the room until the task next changes.
+    Mutations drop the entry before and after bumping the room version, so an
+    encoding raced by a concurrent change is used once but never cached.
+    """
+    cache = room['task_json']
+    encoded = cache.get(task.id)
+    if encoded is None:
+        version = room['version']
+        encoded = dumps(task.to_dict())
+        if room['version'] == version:
+            cache[task.id] = encoded
+    return encoded
+
+def encoded_tasks(tasks, room=None, fields=None, stream=False):
+    """
+    A JSON array of tasks. Whole tasks of `room` come from its per-task cache;
+    projections and tasks read from storage are encoded on the spot.
+
+    With `stream`, the array is produced lazily for json_response(stream=True):
+    cached fragments are collected up front (references only, so the body matches
+    the version it is tagged with) and other tasks are encoded as they are sent.
+    Callers hold room['lock'].
+    """
+    if room is not None and not fields:
+        cached = room['task_json'].get
+        fragments = [cached(t.id) or task_json(room, t) for t in tasks]
+        if stream:
+            return RawJSON(_array_chunks(fragments))
+        return RawJSON((b'[', b','.join(fragments), b']'))
+    if stream:
+        lock = room['lock'] if room is not None else None
+        return RawJSON(_array_chunks(_projections(tasks, fields, lock)))
+    return RawJSON((dumps([project_task(t, fields) for t in tasks]),))
+
+def _projections(tasks, fields, lock=None):
+    """Encode streamed projections one by one, each read under the room's lock so no half-applied change is sent."""
+    for task in tasks:
+        if lock is None:
+            yield dumps(project_task(task, fields))
+            continue
+        with lock:
+            projected = project_task(task, fields)
+        yield dumps(projected)
+
+# ---------------- Room indexes ----------------
+# Derived per-room structures kept in step with room['tasks'] by every mutation:
+#   room['by_status']   'completed' and 'pending' -> sorted ids of the tasks in that state
+#   room['by_priority'] priority -> sorted ids of the tasks with that priority
+#   room['completed_by_priority']
+#                       priority -> number of completed tasks with that priority
+#   room['by_due']      sorted (due_date, id) pairs of all tasks with a due date
+#                       (to_timestamp() seconds)
+#   room['pending_due'] the same for pending tasks only
+#   room['search']      inverted index for GET /tasks/search: word -> {task id: weight}
+#   room['task_bytes']  estimated JSON size of all tasks (task_size()), for the room cache
+#   room['changes']     bounded log of recent mutations with consecutive versions,
+#                       appended by record_change() and release_reserved()
+#   room['reserved']    block of task ids and versions this worker reserved ahead
+#                       (reserve_changes()), or absent
+#   room['lock']        held by request threads while they mutate the room or read
+#                       any of the above; responses are snapshotted before it is released
+SEARCH_WORD = re.compile(r'\w+')
+# Encoded size of a task or room apart from its free text: keys, ids, priority, timestamps
+TASK_JSON_OVERHEAD = 200
+ROOM_JSON_OVERHEAD = 130
+# A word in the title counts this many times one in the description
+SEARCH_TITLE_WEIGHT = 3
+
+def search_words(text):
+    return SEARCH_WORD.findall(text.casefold()) if text else []
+
+def search_weights(task):
+    """Weight of each word of a task's title and description in the search index."""
+    weights = {}
+    for word in search_words(task.title):
+        weights[word] = weights.get(word, 0) + SEARCH_TITLE_WEIGHT
+    for word in search_words(task.description):
+        weights[word] = weights.get(word, 0) + 1
+    return weights
+
+def task_size(task):
+    """Estimated JSON size of a task, from the lengths of its text fields."""
+    return TASK_JSON_OVERHEAD + len(task.title) + len(task.description)
+
+def room_size(room):
+    """Estimated JSON size of a room and its tasks; kept current without encoding anything."""
+    members = sum(len(m) + 4 for m in room['members'])
+    return ROOM_JSON_OVERHEAD + len(room['owner']) + members + room['task_bytes']
+
+def build_room_indexes(room):
+    """(Re)build a room's derived structures from its tasks. Returns the room."""
+    room['by_status'] = {'completed': [], 'pending': []}
+    room['by_priority'] = {}
+    room['completed_by_priority'] = {}
+    room['by_due'] = []
+    room['pending_due'] = []
+    room['search'] = {}
+    room['task_bytes'] = 0
+    room.setdefault('changes', deque(maxlen=ROOM_CHANGE_LOG_SIZE))
+    room.setdefault('lock', threading.RLock())
+    room['task_json'] = {}
+    for task in room['tasks'].values():
+        add_to_indexes(room, task)
+    return room
+
+def add_to_indexes(room, task):
+    """Account for a task that was added or has just been modified."""
+    weights = search_weights(task)
+    status = 'completed' if task.completed else 'pending'
+    bisect.insort(room['by_status'][status], task.id)
+    bisect.insort(room['by_priority'].setdefault(task.priority, []), task.id)
+    if task.completed:
+        completed = room['completed_by_priority']
+        completed[task.priority] = completed.get(task.priority, 0) + 1
+    if task.due_date is not None:
+        bisect.insort(room['by_due'], (task.due_date, task.id))
+        if not task.completed:
+            bisect.insort(room['pending_due'], (task.due_date, task.id))
+    search = room['search']
+    for word, weight in weights.items():
+        search.setdefault(word, {})[task.id] = weight
+    room['task_bytes'] += task_size(task)
+
+def remove_from_indexes(room, task):
+    """Undo add_to_indexes; call before a task is modified or deleted."""
+    room['task_json'].pop(task.id, None)
+    ids = room['by_status']['completed' if task.completed else 'pending']
+    del ids[bisect.bisect_left(ids, task.id)]
+    ids = room['by_priority'][task.priority]
+    del ids[bisect.bisect_left(ids, task.id)]
+    if not ids:
+        del room['by_priority'][task.priority]
+    if task.completed:
+        room['completed_by_priority'][task.priority] -= 1
+    if task.due_date is not None:
+        entry = (task.due_date, task.id)
+        by_due = room['by_due']
+        del by_due[bisect.bisect_left(by_due, entry)]
+        if not task.completed:
+            pending_due = room['pending_due']
+            del pending_due[bisect.bisect_left(pending_due, entry)]
+    search = room['search']
+    for word in search_weights(task):
+        postings = search[word]
+        del postings[task.id]
+        if not postings:
+            del search[word]
+    room['task_bytes'] -= task_size(task)
+
+def count_overdue(room, now):
+    """Pending tasks due at or before `now` (a to_timestamp() value)."""
+    return bisect.bisect_right(room['pending_due'], (now, float('inf')))
+
+def count_matching(room, status=None, priority=None):
+    """Number of tasks matching the GET /tasks filters, answered from the indexes."""
+    if priority:
+        priority = normalize_priority(priority)
+        total = len(room['by_priority'].get(priority, ()))
+        completed = room['completed_by_priority'].get(priority, 0)
+    else:
+        total, completed = len(room['tasks']), len(room['by_status']['completed'])
+    status = (status or '').lower()
+    if status == 'completed':
+        return completed
+    if status == 'pending':
+        return total - completed
+    return total
+
+def iter_matching(room, status=None, priority=None, after_id=0):
+    """
+    Yield the tasks matching the GET /tasks filters in id order, starting after
+    `after_id`. With both filters, the smaller id list is walked and checked
+    against the other filter, which is its intersection with the larger one.
+    """
+    status = (status or '').lower()
+    if status not in ('completed', 'pending'):
+        status = None
+    if priority:
+        priority = normalize_priority(priority)
+    if not status and not priority:
+        yield from iter_tasks(room, after_id)
+        return
+
+    candidates = []
+    if status:
+        candidates.append(room['by_status'][status])
+    if priority:
+        candidates.append(room['by_priority'].get(priority, []))
+    ids = min(candidates, key=len)
+    completed = status == 'completed'
+
+    tasks = room['tasks']
+    for i in range(bisect.bisect_right(ids, after_id), len(ids)):
+        task = tasks[ids[i]]
+        if (not status or task.completed == completed) and (not priority or task.priority == priority):
+            yield task
+
+TASK_SORTS = ('due_date', 'created_at', 'priority')
+# Order of sort=priority; other priorities follow, alphabetically
+PRIORITY_ORDER = {'high': 0, 'medium': 1, 'low': 2}
+
+def priority_rank(priority):
+    """Sort key of a priority: high, medium, low, then any other value alphabetically."""
+    return PRIORITY_ORDER.get(priority, len(PRIORITY_ORDER)), priority
+
+# Position of a task in the GET /tasks orders other than by id; ties keep id order
+SORT_KEYS = {
+    'due_date': lambda task: (task.due_date is None, task.due_date or 0, task.id),
+    'priority': lambda task: (*priority_rank(task.priority), task.id),
+}
+
+def sort_cursor(sort, task):
+    """The next_cursor after `task` in a SORT_KEYS order: '<due timestamp or none>:<id>' or '<priority>:<id>'."""
+    if sort == 'due_date':
+        return f"{'none' if task.due_date is None else task.due_date}:{task.id}"
+    return f"{task.priority}:{task.id}"
+
+def parse_sort_cursor(sort, cursor):
+    """The SORT_KEYS key encoded by sort_cursor(), or None if `cursor` is not one."""
+    value, _, task_id = cursor.rpartition(':')
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            database=os.getenv('DB_NAME', 'taskmanager'),
-            user=os.getenv('DB_USER', 'taskmanager'),
-            password=os.getenv('DB_PASSWORD', 'password'),
-            port=os.getenv('DB_PORT', '5432')
-        )
-        return conn
-    except psycopg2.Error as e:
-        print(f"Database connection error: {e}")
+        task_id = int(task_id)
+        if sort == 'due_date':
+            return (True, 0, task_id) if value == 'none' else (False, int(value), task_id)
+    except ValueError:
         return None
+    return (*priority_rank(value), task_id) if value else None
 
-def init_database():
-    """Initialize database tables."""
-    conn = get_db_connection()
-    if not conn:
-        return False
-    
-    try:
-        cur = conn.cursor()
-        
-        # Create rooms table
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS rooms (
-                code VARCHAR(10) PRIMARY KEY,
-                owner VARCHAR(255) NOT NULL,
-                members JSONB NOT NULL DEFAULT '[]',
-                created_at TIMESTAMP NOT NULL,
-                tasks JSONB NOT NULL DEFAULT '[]'
-            )
-        ''')
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        return True
-    except psycopg2.Error as e:
-        print(f"Database initialization error: {e}")
-        if conn:
-            conn.close()
-        return False
+def due_range(room, due_after=None, due_before=None, overdue=False, now=None):
+    """
+    Ids of the tasks due within [due_after, due_before], in due order, read from
+    the sorted due-date indexes. With `overdue`, pending tasks due by `now` only.
+    """
+    entries = room['by_due']
+    if overdue:
+        entries = room['pending_due']
+        due_before = now if due_before is None else min(due_before, now)
+    lo = 0 if due_after is None else bisect.bisect_left(entries, (due_after,))
+    hi = len(entries) if due_before is None else bisect.bisect_right(entries, (due_before, float('inf')))
+    return [task_id for _, task_id in entries[lo:hi]]
 
-# Initialize database on startup
-if not init_database():
-    print("Warning: Database initialization failed, falling back to in-memory storage")
-    rooms = {}
-else:
-    print("Database initialized successfully")
-    rooms = {}  # We'll use database instead of in-memory
+def query_tasks(room, status=None, priority=None, due_after=None, due_before=None,
+                overdue=None, sort=None, now=None):
+    """
+    Tasks matching every GET /tasks filter, as a list in `sort` order. The default
+    is id order, which is also creation order. Due-date filters start from a slice
+    of a due-date index, so they cost O(log n + k) for k tasks in range.
+    """
+    status = (status or '').lower()
+    completed = status == 'completed' if status in ('completed', 'pending') else None
+    priority = normalize_priority(priority) if priority else None
 
-# ---------------- Database helpers ----------------
-def get_room_from_db(room_code):
-    """Get room from database."""
-    conn = get_db_connection()
-    if not conn:
-        return None
-    
+    def matches(task):
+        if completed is not None and task.completed != completed:
+            return False
+        if priority is not None and task.priority != priority:
+            return False
+        # overdue=false keeps everything but the overdue tasks
+        return overdue is not False or task.completed or task.due_date is None or task.due_date > now
+
+    tasks = room['tasks']
+    if overdue or due_after is not None or due_before is not None:
+        ids = due_range(room, due_after, due_before, overdue, now)
+        if sort != 'due_date':
+            ids.sort()
+        found = [task for task in map(tasks.__getitem__, ids) if matches(task)]
+        if sort == 'priority':
+            # A stable sort, so each priority stays in id order
+            found.sort(key=lambda task: priority_rank(task.priority))
+    elif sort == 'due_date':
+        # Tasks without a due date come last
+        found = [task for task in map(tasks.__getitem__, (i for _, i in room['by_due'])) if matches(task)]
+        found += [task for task in iter_matching(room, status, priority) if task.due_date is None]
+    elif sort == 'priority':
+        found = []
+        for value in sorted(room['by_priority'], key=priority_rank):
+            ids = room['by_priority'][value]
+            found += [task for task in map(tasks.__getitem__, ids) if matches(task)]
+    else:
+        found = [task for task in iter_matching(room, status, priority) if overdue is None or matches(task)]
+    return found
+
+def search_room(room, query, offset=0, limit=None):
+    """
+    Rank the tasks containing every word of `query` by their summed word weights,
+    rarer words counting more; ties keep id order. Returns (total matches, page of ids).
+    """
+    search = room['search']
+    postings = sorted((search.get(word, {}) for word in set(search_words(query))), key=len)
+    if not postings or not postings[0]:
+        return 0, []
+    total_tasks = len(room['tasks'])
+    weighted = [(p, math.log(1 + total_tasks / len(p))) for p in postings]
+    scored = []
+    # Walk the rarest word's postings and look the task up in the others
+    for task_id in postings[0]:
+        score = 0.0
+        for p, idf in weighted:
+            weight = p.get(task_id)
+            if weight is None:
+                break
+            score += weight * idf
+        else:
+            scored.append((-score, task_id))
+    ranked = sorted(scored) if limit is None else heapq.nsmallest(offset + limit, scored)
+    return len(scored), [task_id for _, task_id in ranked[offset:]]
+
+def iter_tasks(room, after_id=0):
+    """Yield a room's tasks in id order, starting after `after_id`."""
+    tasks = room['tasks']
+    if after_id <= 0:
+        yield from tasks.values()
+    elif room['next_task_id'] - after_id <= len(tasks):
+        # Ids are allocated in order, so probe the remaining id range directly
+        for task_id in range(after_id + 1, room['next_task_id']):
+            task = tasks.get(task_id)
+            if task is not None:
+                yield task
+    else:
+        # Sparse id range after many deletes: a skip-scan is cheaper
+        yield from (t for t in tasks.values() if t.id > after_id)
+
+def task_delta(room, since, fields=None):
+    """
+    Body of GET /tasks?since=<version>: tasks created or modified after `since` in
+    their current state plus ids deleted since then. Falls back to a full listing
+    ("full": true) when the change log no longer reaches back to `since`.
+    """
+    changes = changes_since(room, since)
+    if changes is None:
+        return {
+            "full": True,
+            "since": since,
+            "version": room['version'],
+            "tasks": encoded_tasks(room['tasks'].values(), room, fields),
+            "deleted": [],
+            "total_all": len(room['tasks'])
+        }
+
+    touched = sorted({c['data']['id'] for c in changes if c['event'].startswith('task_')})
+    tasks = room['tasks']
+    return {
+        "full": False,
+        "since": since,
+        "version": room['version'],
+        "tasks": encoded_tasks((tasks[i] for i in touched if i in tasks), room, fields),
+        "deleted": [i for i in touched if i not in tasks],
+        "total_all": len(tasks)
+    }
+
+def room_payload(room, stream=False):
+    """Public view of a room: its tasks as a list in creation order, without internal fields."""
+    return {
+        "code": room['code'],
+        "owner": room['owner'],
+        "members": list(room['members']),
+        "created_at": room['created_at'],
+        "tasks": encoded_tasks(room['tasks'].values(), room, stream=stream)
+    }
+
+BOARD_COLUMNS = ('high', 'medium', 'low', 'completed')
+
+def board_column(task):
+    """Column a task is shown in on the board: completed, else its priority (unknown -> medium)."""
+    if task.completed:
+        return 'completed'
+    priority = task.priority
+    return priority if priority in BOARD_COLUMNS else 'medium'
+
+def board_columns(room):
+    """Group a room's tasks into board columns in a single pass, keeping creation order."""
+    columns = {name: [] for name in BOARD_COLUMNS}
+    for task in room['tasks'].values():
+        columns[board_column(task)].append(task)
+    return columns
+
+def room_stats(room, overdue_tasks):
+    """Task statistics for a room, read from the maintained counters."""
+    total_tasks = len(room['tasks'])
+    completed_tasks = len(room['by_status']['completed'])
+    return {
+        "total_tasks": total_tasks,
+        "completed_tasks": completed_tasks,
+        "pending_tasks": total_tasks - completed_tasks,
+        "overdue_tasks": overdue_tasks,
+        "priority_counts": {p: len(ids) for p, ids in room['by_priority'].items()},
+        "completion_rate": round((completed_tasks / total_tasks * 100) if total_tasks > 0 else 0, 2)
+    }
+
+def parse_page_args(args, sort=None):
+    """
+    Read GET /tasks paging and projection parameters. For a SORT_KEYS `sort` the
+    cursor is that order's key (None on the first page), otherwise an integer.
+    Returns ((limit, cursor, fields), None) or (None, error_response).
+    """
     try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute('SELECT * FROM rooms WHERE code = %s', (room_code,))
-        room = cur.fetchone()
-        cur.close()
-        conn.close()
-        
-        if room:
-            return {
-                'code': room['code'],
-                'owner': room['owner'],
-                'members': room['members'],
-                'created_at': room['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
-                'tasks': room['tasks']
-            }
-        return None
-    except psycopg2.Error as e:
-        print(f"Database error getting room: {e}")
-        if conn:
-            conn.close()
+        limit = int(args['limit']) if args.get('limit') else None
+        cursor = int(args['cursor']) if args.get('cursor') and sort not in SORT_KEYS else 0
+    except ValueError:
+        return None, (jsonify({"error": "limit and cursor must be integers"}), 400)
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, (jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400)
+    if sort in SORT_KEYS:
+        cursor = parse_sort_cursor(sort, args['cursor']) if args.get('cursor') else None
+        if args.get('cursor') and cursor is None:
+            return None, (jsonify({"error": f"cursor must be a next_cursor returned with sort={sort}"}), 400)
+    elif cursor < 0:
+        return None, (jsonify({"error": "cursor must not be negative"}), 400)
+
+    # Empty entries are ignored; with none left every field is returned
+    fields = tuple(f.strip() for f in args.get('fields', '').split(',') if f.strip()) or None
+    if fields:
+        unknown = [f for f in fields if f not in TASK_COLUMNS]
+        if unknown:
+            return None, (jsonify({"error": f"Unknown fields: {', '.join(unknown)}. "
+                                            f"Choose from {', '.join(TASK_COLUMNS)}"}), 400)
+        if 'id' not in fields:
+            # Always returned: clients need it to act on a task and to page
+            fields = ('id',) + fields
+    return (limit, cursor, fields), None
+
+def parse_task_query(args):
+    """
+    Read the GET /tasks due-date filters and sort order.
+    Returns (query, None) with None for absent parameters, or (None, error_response).
+    """
+    query = {'due_after': None, 'due_before': None, 'overdue': None, 'sort': None}
+    for name in ('due_after', 'due_before'):
+        if args.get(name):
+            query[name] = parse_due_date(args[name], end_of_day=name == 'due_before')
+            if query[name] is None:
+                return None, (jsonify({"error": f"Invalid {name} format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}), 400)
+    if args.get('overdue'):
+        if args['overdue'].lower() not in ('true', 'false'):
+            return None, (jsonify({"error": "overdue must be true or false"}), 400)
+        query['overdue'] = args['overdue'].lower() == 'true'
+    if args.get('sort'):
+        if args['sort'] not in TASK_SORTS:
+            return None, (jsonify({"error": f"sort must be one of: {', '.join(TASK_SORTS)}"}), 400)
+        query['sort'] = args['sort']
+    return query, None
+
+def project_task(task, fields=None):
+    task = task.to_dict() if isinstance(task, Task) else task
+    return {f: task[f] for f in fields} if fields else task
+
+# ---------------- Task mutations ----------------
+# Shared by the single-task routes and /tasks/batch. Callers validate first, hold
+# room['lock'] and reserve_changes() for what they apply; each function keeps the
+# room's indexes, version, change log and persistence in step.
+# Change log entry for a reserved version given back unused; never sent to clients
+RELEASED_EVENT = 'version_released'
+
+def reserve_changes(room, task_ids=0, versions=1):
+    """
+    Claim task ids and versions for the mutations about to be applied, so that
+    workers caching the same room never hand out the same id or version. They come
+    from the room's reserved block while it lasts, otherwise from storage, reserving
+    RESERVE_BLOCK_SIZE ahead. Returns None, or an error response if storage cannot
+    be reached.
+    """
+    if not storage.persistent:
         return None
+    block = room.get('reserved')
+    if block:
+        if claim_reserved(room, block, task_ids, versions):
+            return None
+        release_reserved(room, block, log=True)
+        del room['reserved']
+    id_count, version_count = max(task_ids, RESERVE_BLOCK_SIZE), max(versions, RESERVE_BLOCK_SIZE)
+    reserved = storage.reserve(room['code'], id_count, version_count)
+    if reserved is None:
+        return jsonify({"error": "Storage is unavailable, try again"}), 503
+    next_task_id, version = reserved
+    if version != room['version']:
+        # Another worker changed the room since it was cached. This copy lacks those
+        # changes until it is reloaded, so its versions no longer describe one state:
+        # keep its ETags to this worker and make event streams resync
+        room['partial'] = True
+        room['changes'].clear()
+    room['next_task_id'] = max(room['next_task_id'], next_task_id)
+    room['version'] = version
+    if version_count > versions:
+        room['reserved'] = {
+            'lock': threading.Lock(), 'closed': False,
+            'task_id_end': next_task_id + id_count, 'version_end': version + version_count,
+            'claimed': version + versions,
+            # Half the lease, leaving the rest for the last claimed versions to be flushed
+            'expires_at': time.monotonic() + RESERVE_LEASE_SECONDS / 2,
+        }
+    return None
 
-def save_room_to_db(room):
-    """Save room to database."""
-    conn = get_db_connection()
-    if not conn:
+def claim_reserved(room, block, task_ids, versions):
+    """Take task ids and versions from the room's block. False if it cannot supply them."""
+    if room['next_task_id'] + task_ids > block['task_id_end'] or time.monotonic() >= block['expires_at']:
         return False
-    
-    try:
-        cur = conn.cursor()
-        cur.execute('''
-            INSERT INTO rooms (code, owner, members, created_at, tasks)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (code) DO UPDATE SET
-                owner = EXCLUDED.owner,
-                members = EXCLUDED.members,
-                tasks = EXCLUDED.tasks
-        ''', (
-            room['code'],
-            room['owner'],
-            json.dumps(room['members']),
-            datetime.strptime(room['created_at'], '%Y-%m-%d %H:%M:%S'),
-            json.dumps(room['tasks'])
-        ))
-        conn.commit()
-        cur.close()
-        conn.close()
+    if not storage.notifies:
+        # No invalidation feed: a worker reserving after this block ends it
+        stored = storage.room_version(room['code'])
+        if stored is None or stored[0] != block['version_end']:
+            return False
+    with block['lock']:
+        if block['closed'] or block['claimed'] + versions > block['version_end']:
+            return False
+        block['claimed'] += versions
         return True
-    except psycopg2.Error as e:
-        print(f"Database error saving room: {e}")
-        if conn:
-            conn.close()
-        return False
 
-# ---------------- Helpers ----------------
-def now_str():
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+def release_reserved(room, block, log):
+    """
+    Give back the block's unclaimed versions, committing them as RELEASED_EVENT entries
+    so that the stored change log stays gapless. With `log` they also go into the room's
+    own log; callers then hold room['lock'].
+    """
+    with block['lock']:
+        if block['closed']:
+            return
+        block['closed'] = True
+        released = [{"version": v, "event": RELEASED_EVENT, "data": {}}
+                    for v in range(block['claimed'] + 1, block['version_end'] + 1)]
+    if not released:
+        return
+    if log:
+        room['changes'].extend(released)
+        room['version'] = released[-1]['version']
+    write_queue.mark_room(room, released)
 
-def generate_room_code(length: int = 6) -> str:
-    # Uppercase letters + digits, unique across rooms
-    alphabet = string.ascii_uppercase + string.digits
-    while True:
-        code = ''.join(random.choices(alphabet, k=length))
-        # Check both in-memory and database
-        if code not in rooms and get_room_from_db(code) is None:
-            return code
+def release_dropped(room):
+    """RoomCache.on_drop: a copy leaving the cache gives back its reserved versions."""
+    block = room.get('reserved')
+    if block:
+        release_reserved(room, block, log=False)
+
+def reserved_version(room):
+    """The highest version this worker has reserved for the room."""
+    block = room.get('reserved')
+    return block['version_end'] if block and not block['closed'] else room['version']
+
+def apply_create(room, data, due_date):
+    """Create a task from validated request data and return it."""
+    # Ids come from a per-room counter so they are never reused after a delete
+    task_id = room['next_task_id']
+    room['next_task_id'] += 1
+    task = Task(task_id, data['title'], data.get('description') or '',
+                data.get('priority', 'medium'), due_date, created_at=now_ts())
+    
+    add_to_indexes(room, task)
+    room['tasks'][task_id] = task
+    record_change(room, 'task_created', task.to_dict())
+    write_queue.mark_task(room['code'], task)
+    return task
+
+def apply_update(room, task, data, due_date):
+    """Apply the fields present in `data`; `due_date` is the already parsed value."""
+    remove_from_indexes(room, task)
+    
+    # Update fields if provided
+    if 'title' in data:
+        task.title = data['title']
+    if 'description' in data:
+        task.description = data['description'] or ''
+    if 'priority' in data:
+        task.priority = normalize_priority(data['priority'])
+    if 'completed' in data:
+        task.completed = bool(data['completed'])
+        if task.completed and task.completed_at is None:
+            task.completed_at = now_ts()
+        elif not task.completed:
+            task.completed_at = None
+    
+    # Handle due_date update
+    if 'due_date' in data:
+        task.due_date = due_date
+    
+    add_to_indexes(room, task)
+    record_change(room, 'task_updated', task.to_dict())
+    write_queue.mark_task(room['code'], task)
+
+def apply_delete(room, task):
+    del room['tasks'][task.id]
+    remove_from_indexes(room, task)
+    record_change(room, 'task_deleted', {"id": task.id})
+    write_queue.mark_deleted(room['code'], task.id)
+
+def apply_complete(room, task):
+    remove_from_indexes(room, task)
+    task.completed = True
+    task.completed_at = now_ts()
+    add_to_indexes(room, task)
+    record_change(room, 'task_completed', task.to_dict())
+    write_queue.mark_task(room['code'], task)
+
+def record_change(room, event, data):
+    """
+    Bump the room's version after a mutation, log the change for event streams,
+    queue the room metadata for persistence and update its size in the cache.
+    """
+    room['version'] += 1
+    if event.startswith('task_'):
+        room['task_json'].pop(data['id'], None)
+    change = {"version": room['version'], "event": event, "data": data}
+    room['changes'].append(change)
+    write_queue.mark_room(room, [change])
+    rooms.resize(room['code'])
+    event_hub.publish(room['code'])
+
+def room_etag(room, *extra):
+    """
+    Strong validator for a response derived from the room's current version.
+    The request path and query are folded in, since filters and paging change the body.
+    A partial room (missing changes another worker has not committed yet) gets
+    validators of its own.
+    """
+    variant = zlib.crc32(request.full_path.encode('utf-8'))
+    if room.get('partial'):
+        extra = (*extra, INSTANCE_ID)
+    return '-'.join(str(part) for part in (room['code'], room['version'], f'{variant:08x}', *extra))
+
+def matching_etag(tag):
+    """The variant of `tag` (identity or compressed) named in If-None-Match, or None."""
+    for candidate in (tag, *(f'{tag}-{encoding}' for encoding in COMPRESSORS)):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+def not_modified(tag):
+    response = app.response_class(status=304)
+    response.set_etag(tag)
+    return response
+
+def with_etag(response, tag):
+    response.set_etag(tag)
+    # Let browsers keep the body but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# ---------------- Compression ----------------
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.getenv('BROTLI_QUALITY', '5'))
+COMPRESS_CACHE_MAX_BYTES = int(os.getenv('COMPRESS_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                          'application/javascript', 'text/javascript')
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def brotli_chunks(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        out = compressor.process(chunk)
+        if out:
+            yield out
+    yield compressor.finish()
+
+# Content codings in order of preference when the client accepts several equally
+COMPRESSORS = {'br': brotli_chunks, 'gzip': gzip_chunks} if brotli is not None else {'gzip': gzip_chunks}
+
+
+class CompressedBodyCache:
+    """
+    LRU of compressed response bodies keyed by (ETag, coding). ETags carry the room
+    version, so an entry is reused until the room changes and then ages out.
+    """
+
+    def __init__(self, max_bytes=COMPRESS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, **self._counters}
 
-def parse_due_date_str(s: str | None):
-    """Accept 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD'. Return normalized 'YYYY-MM-DD HH:MM:SS' or None."""
-    if not s:
-        return None
-    try:
-        return datetime.strptime(s, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        try:
-            # normalize date-only to midnight
-            return datetime.strptime(s, '%Y-%m-%d').strftime('%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            return None
+
+compressed_bodies = CompressedBodyCache()
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses of at least COMPRESS_MIN_BYTES with the best coding the client accepts."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(list(COMPRESSORS))
+    if not encoding:
+        return response
+
+    etag, weak = response.get_etag()
+    if response.is_streamed:
+        # Only large listings are streamed; compress them as they are sent
+        response.response = COMPRESSORS[encoding](response.iter_encoded())
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        key = (etag, encoding) if etag else None
+        compressed = compressed_bodies.get(key) if key else None
+        if compressed is None:
+            compressed = b''.join(COMPRESSORS[encoding]((body,)))
+            if key:
+                compressed_bodies.put(key, compressed)
+        response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # Each coding is a different representation and needs its own strong validator
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def load_room(room_code, hold=False):
+    """
+    Return the room from the cache, falling back to storage, or None. With `hold` the
+    cached room stays pinned until the request ends (see release_held_rooms).
+    """
+    if hold:
+        held = g.setdefault('held_rooms', [])
+    # Check in-memory first, then storage
+    room = rooms.get(room_code, hold=hold)
+    if room and hold:
+        held.append(room_code)
+    if room and storage.persistent and not storage.notifies:
+        # No invalidation feed: drop the cached copy if another worker has reserved a newer
+        # version, or if it is partial and every stored version has since been committed.
+        # The lock keeps out this worker's own mutations, which reserve before they apply.
+        with room['lock']:
+            stored = None
+            if not write_queue.has_pending(room_code):
+                stored = storage.room_version(room_code)
+            if stored is not None and (stored[0] > reserved_version(room) or
+                                       room.get('partial') and stored[1] >= stored[0]):
+                rooms.invalidate(room_code)
+                event_hub.publish(room_code)
+                room = None
+    if not room and storage.persistent:
+        room = storage.load_room(room_code)
+        if room:
+            # Threads that missed together must all mutate the same copy
+            room = rooms.add(room_code, room, hold=hold)
+            if hold:
+                held.append(room_code)
+    return room
+
+@app.teardown_request
+def release_held_rooms(exc):
+    for room_code in g.pop('held_rooms', ()):
+        rooms.release(room_code)
+
+def validate_batch_operation(room, op, deleted_ids):
+    """
+    Check one /tasks/batch operation against the room as it will be when the
+    operation runs. Returns ((kind, task_id, op, due_date), None) or
+    (None, (message, status)).
+    """
+    if not isinstance(op, dict):
+        return None, ("Each operation must be an object", 400)
+    kind = op.get('op')
+    if kind not in BATCH_OPERATIONS:
+        return None, (f"op must be one of: {', '.join(BATCH_OPERATIONS)}", 400)
+
+    due_date = None
+    if kind in ('create', 'update') and op.get('due_date') is not None:
+        due_date = parse_due_date(op['due_date'])
+        if due_date is None:
+            return None, (DUE_DATE_ERROR, 400)
+    if kind in ('create', 'update'):
+        error = task_field_error(op)
+        if error:
+            return None, (error, 400)
+
+    if kind == 'create':
+        if 'title' not in op:
+            return None, ("Missing task title", 400)
+        return (kind, None, op, due_date), None
+
+    task_id = op.get('id')
+    if not isinstance(task_id, int) or isinstance(task_id, bool):
+        return None, ("id must be an integer", 400)
+    if task_id not in room['tasks'] or task_id in deleted_ids:
+        return None, ("Task not found", 404)
+    if kind == 'update' and not any(f in op for f in UPDATABLE_FIELDS):
+        return None, ("No data provided", 400)
+    if kind == 'delete':
+        deleted_ids.add(task_id)
+    return (kind, task_id, op, due_date), None
 
 def require_room(room_code: str | None):
     if not room_code:
         return None, (jsonify({"error": "room is required. Provide ?room=ROOM_CODE or body.room_code"}), 400)
     
-    # Check in-memory first, then database
-    room = rooms.get(room_code)
-    if not room:
-        room = get_room_from_db(room_code)
-        if room:
-            # Cache in memory for faster access
-            rooms[room_code] = room
-    
+    # Held until the request ends, so the room cannot leave the cache before a mutation
+    # applied to it is queued
+    room = load_room(room_code, hold=True)
     if not room:
         return None, (jsonify({"error": f"room '{room_code}' not found"}), 404)
     return room, None
 
+# ---------------- Startup ----------------
+STORAGE_RETRY_SECONDS = float(os.getenv('STORAGE_RETRY_SECONDS', '30'))
+_storage_lock = threading.Lock()
+_storage_pid = None
+# While falling back to memory, when to try the STORAGE_BACKEND engine again
+_storage_retry_at = 0.0
+
+def use_storage(engine):
+    """Make `engine` this process's storage and size the caches around it."""
+    global storage, _storage_pid
+    write_queue.flush()
+    rooms.clear()
+    storage = engine
+    bounded = engine.persistent
+    write_queue.enabled = engine.persistent
+    # Memory may hold the only copy of a room, so nothing is evicted without persistence
+    rooms.max_entries = ROOM_CACHE_MAX_ENTRIES if bounded else None
+    rooms.max_bytes = ROOM_CACHE_MAX_BYTES if bounded else None
+    rooms.ttl = ROOM_CACHE_TTL if bounded else None
+    room_codes.claim = engine.claim_room_codes if engine.persistent else None
+    room_codes.block_size = ROOM_CODE_BLOCK_SIZE if engine.persistent else 0
+    _storage_pid = os.getpid()
+
+def carry_over_rooms(engine):
+    """Store the rooms this process created in memory while `engine` was unavailable."""
+    lost = []
+    for code, room in rooms.items():
+        with room['lock']:
+            change = {'room': room, 'versions': 0, 'deletes': set(), 'changes': [],
+                      'upserts': {task.id: task.to_dict() for task in room['tasks'].values()}}
+            try:
+                stored = engine.create_room(room) and engine.write_batch([(code, change)])
+            except PermanentWriteError:
+                stored = False
+        if not stored:
+            lost.append(code)
+    if lost:
+        print(f"Warning: could not store room(s) {', '.join(lost)} created in memory; they are discarded")
+
+def _storage_decided():
+    return _storage_pid == os.getpid() and (storage is configured_storage or time.monotonic() < _storage_retry_at)
+
+def init_storage():
+    """
+    Choose this process's storage engine on its first request.
+
+    The STORAGE_BACKEND engine is used only if it is reachable and fully migrated;
+    otherwise rooms live in memory and the engine is tried again every
+    STORAGE_RETRY_SECONDS. Once it is ready the rooms created meanwhile are stored in it.
+    """
+    global configured_storage, _storage_retry_at
+    if _storage_decided():
+        return
+    with _storage_lock:
+        if _storage_decided():
+            return
+        retrying = _storage_pid == os.getpid()
+        engine = configured_storage = make_storage()
+        version = engine.schema_version()
+        if version is not None and version >= engine.schema_target:
+            if retrying:
+                print(f"{engine.name} storage is ready; leaving in-memory storage")
+                carry_over_rooms(engine)
+            use_storage(engine)
+            return
+        _storage_retry_at = time.monotonic() + STORAGE_RETRY_SECONDS
+        if version is None:
+            print(f"Warning: {engine.name} storage unreachable, using in-memory storage")
+        else:
+            print(f"Warning: {engine.name} schema is at version {version}, expected {engine.schema_target}; "
+                  "run 'flask --app app migrate'. Using in-memory storage")
+        if not retrying:
+            use_storage(MemoryStorage())
+
+@app.before_request
+def start_storage():
+    init_storage()
+    if storage.notifies:
+        invalidation_listener.start()
+
 @app.route('/', methods=['GET'])
 def index():
     return app.send_static_file('index.html')
@@ -182,9 +3131,51 @@ def health():
         "status": "healthy",
         "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         "version": "1.0.0",
-        "uptime": "running"
+        "uptime_seconds": round(time.monotonic() - PROCESS_STARTED),
+        "storage": storage.name,
+        "db_pool": pool_stats(),
+        "write_behind": write_queue.stats(),
+        "room_cache": rooms.stats(),
+        "compressed_bodies": compressed_bodies.stats(),
+        "room_codes": room_codes.stats(),
+        "event_subscribers": event_hub.subscriber_count()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics, for all gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set."""
+    if prometheus_client is None:
+        return jsonify({"error": "metrics require the prometheus_client package"}), 501
+    refresh_metrics()
+    registry = prometheus_client.REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness probe: 200 only when the configured storage is reachable, fully
+    migrated and in use (not while this worker serves from its memory fallback).
+    The memory engine has no database to check.
+    """
+    engine = configured_storage
+    version = engine.schema_version()
+    is_ready = version is not None and version >= engine.schema_target and storage is engine
+    if not engine.persistent:
+        database = "none"
+    else:
+        database = "unreachable" if version is None else "reachable"
+    return jsonify({
+        "status": "ready" if is_ready else "not ready",
+        "storage": engine.name,
+        "active_storage": storage.name,
+        "database": database,
+        "schema_version": version,
+        "expected_schema_version": engine.schema_target
+    }), 200 if is_ready else 503
+
 # ---------------- Rooms ----------------
 @app.route('/rooms', methods=['POST'])
 def create_room():
@@ -193,25 +3184,39 @@ def create_room():
     Body: { "username": "Alice" }
     Returns: { room_code, room }
     """
-    data = request.get_json(silent=True) or {}
+    data = json_object()
     username = (data.get('username') or '').strip()
     if not username:
         return jsonify({"error": "username is required"}), 400
 
-    code = generate_room_code()
-    room = {
-        "code": code,
-        "owner": username,
-        "members": [username],
-        "created_at": now_str(),
-        "tasks": []
-    }
+    # Stored before it is handed out: reserve_changes() allocates from the stored row.
+    # A claimed code can still be stored already (e.g. room_codes was restored from an
+    # older backup than rooms); another code is tried then.
+    created = None
+    for _ in range(ROOM_CODE_ATTEMPTS):
+        code = generate_room_code()
+        if code is None:
+            break
+        room = {
+            "code": code,
+            "owner": username,
+            "members": [username],
+            "created_at": now_str(),
+            "tasks": {},
+            "next_task_id": 1,
+            "version": 1
+        }
+        created = storage.create_room(room)
+        if created is not False:
+            break
+    if not created:
+        return jsonify({"error": "Storage is unavailable, try again"}), 503
+    build_room_indexes(room)
     rooms[code] = room
-    save_room_to_db(room)  # Persist to database
-    return jsonify({
+    return json_response({
         "room_code": code,
-        "room": room
-    }), 201
+        "room": room_payload(room)
+    }, 201)
 
 @app.route('/rooms/<room_code>', methods=['GET'])
 def get_room(room_code):
@@ -219,25 +3224,68 @@ def get_room(room_code):
     room, err = require_room(room_code)
     if err:
         return err
-    return jsonify(room)
+    with room['lock']:
+        tag = room_etag(room)
+        held = matching_etag(tag)
+        if held:
+            return not_modified(held)
+        stream = len(room['tasks']) > STREAM_THRESHOLD_TASKS
+        payload = room_payload(room, stream)
+    return with_etag(json_response(payload, stream=stream), tag)
+
+@app.route('/rooms/<room_code>/snapshot', methods=['GET'])
+def get_room_snapshot(room_code):
+    """
+    Everything the task board needs for first paint in one response:
+    { room, version, columns: {high, medium, low, completed}, stats }
+    """
+    room, err = require_room(room_code)
+    if err:
+        return err
+    with room['lock']:
+        overdue_tasks = count_overdue(room, now_ts())
+        tag = room_etag(room, overdue_tasks)
+        held = matching_etag(tag)
+        if held:
+            return not_modified(held)
+        return with_etag(json_response({
+            "room": {
+                "code": room['code'],
+                "owner": room['owner'],
+                "members": room['members'],
+                "created_at": room['created_at']
+            },
+            "version": room['version'],
+            "columns": {name: encoded_tasks(tasks, room) for name, tasks in board_columns(room).items()},
+            "stats": room_stats(room, overdue_tasks)
+        }), tag)
 
 # Existing route: still works with /rooms/<room_code>/join
 @app.route('/rooms/<room_code>/join', methods=['POST'])
 def join_room(room_code):
-    data = request.get_json(silent=True) or {}
+    data = json_object()
     username = (data.get('username') or '').strip()
     if not username:
         return jsonify({"error": "username is required"}), 400
 
-    if username not in rooms[room_code]['members']:
-        rooms[room_code]['members'].append(username)
-    return jsonify({"message": "Joined room", "room": rooms[room_code]})
+    room, err = require_room(room_code)
+    if err:
+        return err
+
+    with room['lock']:
+        if username not in room['members']:
+            err = reserve_changes(room)
+            if err:
+                return err
+            room['members'].append(username)
+            record_change(room, 'member_joined', {"username": username, "members": list(room['members'])})
+        return json_response({"message": "Joined room", "room": room_payload(room)})
 
 
 # New shortcut route: allows POST /rooms/join with body {room_code, username}
 @app.route('/rooms/join', methods=['POST'])
 def join_room_short():
-    data = request.get_json(silent=True) or {}
+    data = json_object()
     username = (data.get('username') or '').strip()
     room_code = (data.get('room_code') or request.args.get('room') or '').strip()
 
@@ -250,9 +3298,36 @@ def join_room_short():
     if err:
         return err
 
-    if username not in room['members']:
-        room['members'].append(username)
-    return jsonify({"message": "Joined room", "room": room})
+    with room['lock']:
+        if username not in room['members']:
+            err = reserve_changes(room)
+            if err:
+                return err
+            room['members'].append(username)
+            record_change(room, 'member_joined', {"username": username, "members": list(room['members'])})
+        return json_response({"message": "Joined room", "room": room_payload(room)})
+
+@app.route('/rooms/<room_code>/events', methods=['GET'])
+def room_events(room_code):
+    """
+    Server-Sent Events stream of the room's changes. Each event id is the room
+    version after the change; reconnecting with Last-Event-ID resumes after it.
+    """
+    room, err = require_room(room_code)
+    if err:
+        return err
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else room['version']
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+
+    return Response(
+        stream_with_context(stream_room_events(room_code, last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/tasks', methods=['GET'])
 def get_tasks():
@@ -264,29 +3339,128 @@ def get_tasks():
     if err:
         return err
     
-    filtered_tasks = room['tasks'].copy()
+    query, err = parse_task_query(request.args)
+    if err:
+        return err
+    
+    paging, err = parse_page_args(request.args, query['sort'])
+    if err:
+        return err
+    limit, cursor, fields = paging
+    indexed_query = any(v is not None for v in query.values())
     
-    if status_filter:
-        if status_filter.lower() == 'completed':
-            filtered_tasks = [t for t in filtered_tasks if t['completed']]
-        elif status_filter.lower() == 'pending':
-            filtered_tasks = [t for t in filtered_tasks if not t['completed']]
+    since = request.args.get('since')
+    if since is not None:
+        if status_filter or priority_filter or limit or cursor or indexed_query:
+            return jsonify({"error": "since cannot be combined with filters, sort, limit or cursor"}), 400
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({"error": "since must be an integer room version"}), 400
     
-    if priority_filter:
-        filtered_tasks = [t for t in filtered_tasks if t.get('priority', '').lower() == priority_filter.lower()]
+    with room['lock']:
+        now = now_ts()
+        # Which tasks are overdue also changes with the clock
+        tag = room_etag(room, count_overdue(room, now)) if query['overdue'] is not None else room_etag(room)
+        held = matching_etag(tag)
+        if held:
+            return not_modified(held)
+        if since is not None:
+            return with_etag(json_response(task_delta(room, since, fields)), tag)
+        # Fetch one extra task to learn whether another page follows
+        fetch = limit + 1 if limit else None
     
-    return jsonify({
-        "tasks": filtered_tasks,
-        "total": len(filtered_tasks),
-        "total_all": len(room['tasks'])
-    })
+        # Orders other than by id page by the last task's sort key rather than its id
+        sort_key = SORT_KEYS.get(query['sort'])
+    
+        # require_room has loaded every task of the room, so listings are always read from
+        # it: whole tasks are then encoded from their cached fragments, never from fresh rows
+        if indexed_query:
+            # Due-date ranges and sorting are answered from the room's indexes
+            matching = query_tasks(room, status_filter, priority_filter, now=now, **query)
+            total = len(matching)
+            if sort_key:
+                start = bisect.bisect_right(matching, cursor, key=sort_key) if cursor else 0
+            else:
+                start = bisect.bisect_right(matching, cursor, key=lambda t: t.id)
+            filtered_tasks = matching[start:start + fetch] if fetch else matching[start:]
+        else:
+            filtered_tasks = list(islice(iter_matching(room, status_filter, priority_filter, cursor), fetch))
+            # Totals come from the room's counters, so large listings can be streamed
+            total = count_matching(room, status_filter, priority_filter)
+    
+        page = filtered_tasks[:limit] if limit else filtered_tasks
+        stream = len(page) > STREAM_THRESHOLD_TASKS
+        response = {
+            "total": total,
+            "total_all": len(room['tasks']),
+            "version": room['version']
+        }
+        if limit:
+            response["next_cursor"] = None
+            if len(filtered_tasks) > limit:
+                last = filtered_tasks[limit - 1]
+                response["next_cursor"] = sort_cursor(query['sort'], last) if sort_key else last.id
+        response["tasks"] = encoded_tasks(page, room, fields, stream)
+        return with_etag(json_response(response, stream=stream), tag)
+
+@app.route('/tasks/search', methods=['GET'])
+def search_tasks():
+    room_code = request.args.get('room')
+    room, err = require_room(room_code)
+    if err:
+        return err
+    
+    query = request.args.get('q', '').strip()
+    if not search_words(query):
+        return jsonify({"error": "q must contain at least one word"}), 400
+    
+    # Results are ranked, so the cursor is an offset into the ranking
+    paging, err = parse_page_args(request.args)
+    if err:
+        return err
+    limit, offset, fields = paging
+    limit = limit or SEARCH_PAGE_SIZE
+    
+    with room['lock']:
+        tag = room_etag(room)
+    held = matching_etag(tag)
+    if held:
+        return not_modified(held)
+    
+    # Rooms with unflushed writes are searched in memory so clients read their own writes.
+    # The storage query runs without the room's lock, against what is committed.
+    found = None
+    if not write_queue.has_pending(room_code):
+        found = storage.search_tasks(room_code, query, offset, limit, fields)
+    with room['lock']:
+        source = None
+        if found is None:
+            tag = room_etag(room)
+            total, ids = search_room(room, query, offset, limit)
+            found = total, [room['tasks'][i] for i in ids]
+            source = room
+        total, page = found
+        
+        return with_etag(json_response({
+            "query": query,
+            "total": total,
+            "version": room['version'],
+            "next_cursor": offset + limit if offset + limit < total else None,
+            "tasks": encoded_tasks(page, source, fields)
+        }), tag)
 
 @app.route('/tasks', methods=['POST'])
 def create_task():
     data = request.get_json()
     
+    if data is not None and not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
     if not data or 'title' not in data:
         return jsonify({"error": "Missing task title"}), 400
+    error = task_field_error(data)
+    if error:
+        return jsonify({"error": error}), 400
     
     room_code = data.get('room_code') or request.args.get('room')
     room, err = require_room(room_code)
@@ -294,22 +3468,16 @@ def create_task():
         return err
     
     # Parse due_date if provided
-    due_date = parse_due_date_str(data.get('due_date'))
-    if data.get('due_date') and not due_date:
-        return jsonify({"error": "Invalid due_date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}), 400
-    
-    task = {
-        "id": len(room['tasks']) + 1,
-        "title": data['title'],
-        "description": data.get('description', ''),
-        "priority": data.get('priority', 'medium'),
-        "due_date": due_date,
-        "completed": False,
-        "completed_at": None,
-        "created_at": now_str()
-    }
+    due_date = parse_due_date(data.get('due_date'))
+    if data.get('due_date') and due_date is None:
+        return jsonify({"error": DUE_DATE_ERROR}), 400
     
-    room['tasks'].append(task)
+    with room['lock']:
+        err = reserve_changes(room, task_ids=1)
+        if err:
+            return err
+        task = apply_create(room, data, due_date)
+        task = task.to_dict()
     
     return jsonify({
         "message": "Task created successfully",
@@ -323,39 +3491,34 @@ def update_task(task_id):
     if err:
         return err
     
-    task = next((t for t in room['tasks'] if t['id'] == task_id), None)
-    
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-    
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({"error": "No data provided"}), 400
-    
-    # Update fields if provided
-    if 'title' in data:
-        task['title'] = data['title']
-    if 'description' in data:
-        task['description'] = data['description']
-    if 'priority' in data:
-        task['priority'] = data['priority']
-    if 'completed' in data:
-        task['completed'] = bool(data['completed'])
-        if task['completed'] and not task['completed_at']:
-            task['completed_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        elif not task['completed']:
-            task['completed_at'] = None
-    
-    # Handle due_date update
-    if 'due_date' in data:
-        if data['due_date'] is None:
-            task['due_date'] = None
-        else:
-            due_date = parse_due_date_str(data['due_date'])
-            if not due_date:
-                return jsonify({"error": "Invalid due_date format. Use YYYY-MM-DD or YYYY-MM-DD HH:MM:SS"}), 400
-            task['due_date'] = due_date
+    with room['lock']:
+        task = room['tasks'].get(task_id)
+        
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+        
+        data = request.get_json()
+        
+        if data is not None and not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        error = task_field_error(data)
+        if error:
+            return jsonify({"error": error}), 400
+        
+        # Validate before touching the task so a rejected update leaves it unchanged
+        due_date = None
+        if data.get('due_date') is not None:
+            due_date = parse_due_date(data['due_date'])
+            if due_date is None:
+                return jsonify({"error": DUE_DATE_ERROR}), 400
+        
+        err = reserve_changes(room)
+        if err:
+            return err
+        apply_update(room, task, data, due_date)
+        task = task.to_dict()
     
     return jsonify({
         "message": "Task updated successfully",
@@ -369,16 +3532,20 @@ def delete_task(task_id):
     if err:
         return err
     
-    task = next((t for t in room['tasks'] if t['id'] == task_id), None)
-    
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-    
-    room['tasks'] = [t for t in room['tasks'] if t['id'] != task_id]
+    with room['lock']:
+        task = room['tasks'].get(task_id)
+        
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+        
+        err = reserve_changes(room)
+        if err:
+            return err
+        apply_delete(room, task)
     
     return jsonify({
         "message": "Task deleted successfully",
-        "deleted_task": task
+        "deleted_task": task.to_dict()
     })
 
 @app.route('/tasks/<int:task_id>/complete', methods=['POST'])
@@ -388,46 +3555,109 @@ def complete_task(task_id):
     if err:
         return err
     
-    task = next((t for t in room['tasks'] if t['id'] == task_id), None)
-    
-    if not task:
-        return jsonify({"error": "Task not found"}), 404
-    
-    task['completed'] = True
-    task['completed_at'] = now_str()
+    with room['lock']:
+        task = room['tasks'].get(task_id)
+        
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+        
+        err = reserve_changes(room)
+        if err:
+            return err
+        apply_complete(room, task)
+        task = task.to_dict()
     
     return jsonify({
         "message": "Task marked as completed",
         "task": task
     })
 
-@app.route('/tasks/stats', methods=['GET'])
-def get_stats():
-    room_code = request.args.get('room')
+@app.route('/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """
+    Apply many task operations to one room in a single request.
+    Body: { "room_code": "ABC123", "operations": [
+              {"op": "create", "title": "New", "priority": "high"},
+              {"op": "update", "id": 3, "due_date": "2025-12-31"},
+              {"op": "complete", "id": 4},
+              {"op": "delete", "id": 5} ] }
+    Every operation is validated first; if any is invalid nothing is applied.
+    Otherwise all of them are applied and persisted in one transaction.
+    Returns: { results: [{ index, op, status, task | deleted_task }], version }
+    """
+    data = json_object()
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"error": "operations must be a non-empty list"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+    
+    room_code = data.get('room_code') or request.args.get('room')
     room, err = require_room(room_code)
     if err:
         return err
     
-    total_tasks = len(room['tasks'])
-    completed_tasks = len([t for t in room['tasks'] if t['completed']])
-    pending_tasks = total_tasks - completed_tasks
-    overdue_tasks = 0
+    with room['lock']:
+        planned, errors = [], []
+        deleted_ids = set()
+        for index, op in enumerate(operations):
+            step, error = validate_batch_operation(room, op, deleted_ids)
+            if error:
+                errors.append({"index": index, "status": error[1], "error": error[0]})
+            else:
+                planned.append((index, step))
+        if errors:
+            return jsonify({"error": "No operations were applied", "errors": errors}), 400
+        creates = sum(1 for _, step in planned if step[0] == 'create')
+        err = reserve_changes(room, task_ids=creates, versions=len(planned))
+        if err:
+            return err
     
-    now = datetime.now()
-    for task in room['tasks']:
-        if not task['completed'] and task['due_date']:
-            due_date = datetime.strptime(task['due_date'], '%Y-%m-%d %H:%M:%S')
-            if due_date < now:
-                overdue_tasks += 1
+        results = []
+        # Keep the write-behind flusher out until every change is queued, so the
+        # whole batch lands in one transaction
+        with write_queue.atomic():
+            for index, (kind, task_id, op, due_date) in planned:
+                task = room['tasks'].get(task_id)
+                if kind == 'create':
+                    results.append({"index": index, "op": kind, "status": 201,
+                                    "task": apply_create(room, op, due_date).to_dict()})
+                elif kind == 'update':
+                    apply_update(room, task, op, due_date)
+                    results.append({"index": index, "op": kind, "status": 200, "task": task.to_dict()})
+                elif kind == 'complete':
+                    apply_complete(room, task)
+                    results.append({"index": index, "op": kind, "status": 200, "task": task.to_dict()})
+                else:
+                    apply_delete(room, task)
+                    results.append({"index": index, "op": kind, "status": 200, "deleted_task": task.to_dict()})
+        version = room['version']
     
     return jsonify({
-        "total_tasks": total_tasks,
-        "completed_tasks": completed_tasks,
-        "pending_tasks": pending_tasks,
-        "overdue_tasks": overdue_tasks,
-        "completion_rate": round((completed_tasks / total_tasks * 100) if total_tasks > 0 else 0, 2)
+        "message": f"Applied {len(results)} operations",
+        "results": results,
+        "version": version
     })
 
+@app.route('/tasks/stats', methods=['GET'])
+def get_stats():
+    room_code = request.args.get('room')
+    room, err = require_room(room_code)
+    if err:
+        return err
+    
+    with room['lock']:
+        # Counters are maintained on every mutation; overdue is one bisect over pending due dates
+        overdue_tasks = count_overdue(room, now_ts())
+        # Overdue also changes with the clock, so it is part of the validator
+        tag = room_etag(room, overdue_tasks)
+        held = matching_etag(tag)
+        if held:
+            return not_modified(held)
+        stats = room_stats(room, overdue_tasks)
+    
+    return with_etag(jsonify(stats), tag)
+
 if __name__ == '__main__':
     print("Starting Task Manager API with web UI...")
     print("Available endpoints:")
@@ -442,5 +3672,9 @@ if __name__ == '__main__':
     print("   POST /tasks/<id>/complete - Mark task as completed")
     print("   GET  /tasks/stats        - Get task statistics")
     print("   GET  /health             - Health check endpoint")
+    print("   GET  /ready              - Readiness check (database reachable and migrated)")
+    print("   GET  /metrics            - Prometheus metrics")
     print("Web interface available at http://localhost:5125/")
+    # Convenience for local runs; deployments run `flask --app app migrate` once instead
+    make_storage().migrate()
     app.run(host='0.0.0.0', port=5125, debug=True)
\ No newline at end of file
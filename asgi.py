@@ -0,0 +1,158 @@
+"""
+ASGI entry point: uvicorn asgi:application --host 0.0.0.0 --port 5125
+
+Serves the same routes as the Flask `app`. Room event streams run as coroutines
+on the event loop, so one process holds thousands of open streams without a
+thread each; every other route is the Flask app, up to ASGI_THREADS requests at
+once, each on a thread. Those routes are synchronous and do hit the database
+through the same blocking drivers as under gunicorn: mutations reserve
+task ids and versions before answering, cache misses load the room, Postgres
+searches query per request and SQLite revalidates the cached room per request.
+A process therefore serves at most ASGI_THREADS Flask requests at once (fewer
+against Postgres, which caps them at DB_POOL_MAX connections); the rest queue.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import asyncio
+import contextvars
+import json
+import os
+import re
+import time
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+import app as taskmanager
+
+# Flask requests running at once, each on a thread of its own; also sizes the pool
+# that event streams use for their storage calls
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '32'))
+
+EVENTS_PATH = re.compile(r'/rooms/([^/]+)/events')
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+flask_application = WsgiToAsgi(taskmanager.app)
+flask_slots = asyncio.Semaphore(ASGI_THREADS)
+
+
+async def run_flask(scope, receive, send):
+    """
+    Serve a request through the Flask app on a thread of its own.
+
+    WsgiToAsgi runs the app thread_sensitive, which puts every request on one shared
+    thread unless it is inside a ThreadSensitiveContext of its own. The request also
+    starts from an empty contextvars context: on a keep-alive connection uvicorn starts
+    the next request inside the previous one's send(), whose context still names that
+    request's finished executor.
+    """
+    async def serve():
+        async with ThreadSensitiveContext():
+            await flask_application(scope, receive, send)
+
+    async with flask_slots:
+        await contextvars.Context().run(asyncio.ensure_future, serve())
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = EVENTS_PATH.fullmatch(scope['path'])
+        if match:
+            await room_events(scope, receive, send, match.group(1))
+            return
+    await run_flask(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix='flask'))
+            await loop.run_in_executor(None, taskmanager.init_storage)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, taskmanager.write_queue.close)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def send_json(send, status, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': json.dumps(body).encode('utf-8')})
+
+
+async def room_events(scope, receive, send, room_code):
+    """Event-loop version of GET /rooms/<code>/events; same messages as the WSGI stream."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, taskmanager.init_storage)
+    if taskmanager.storage.notifies:
+        taskmanager.invalidation_listener.start()
+
+    room = await loop.run_in_executor(None, taskmanager.load_room, room_code)
+    if room is None:
+        await send_json(send, 404, {"error": f"room '{room_code}' not found"})
+        return
+
+    headers = dict(scope['headers'])
+    last_id = headers.get(b'last-event-id', b'').decode('latin-1')
+    if not last_id:
+        last_id = parse_qs(scope['query_string'].decode('latin-1')).get('last_event_id', [''])[0]
+    try:
+        last_id = int(last_id) if last_id else room['version']
+    except ValueError:
+        await send_json(send, 400, {"error": "Last-Event-ID must be an integer"})
+        return
+
+    wakeup = asyncio.Event()
+    disconnected = asyncio.Event()
+
+    def notify():
+        # Called on whichever thread published the change
+        loop.call_soon_threadsafe(wakeup.set)
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+        wakeup.set()
+
+    async def write(text):
+        await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+    taskmanager.event_hub.subscribe(room_code, notify)
+    watcher = asyncio.create_task(watch_disconnect())
+    deadline = time.monotonic() + taskmanager.SSE_MAX_STREAM_SECONDS
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': SSE_HEADERS})
+        await write('retry: 3000\n\n')
+        while not disconnected.is_set():
+            wakeup.clear()
+            messages, last_id, finished = await loop.run_in_executor(
+                None, taskmanager.pending_room_events, room_code, last_id)
+            if messages:
+                await write(''.join(messages))
+            if finished:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # The browser reconnects with Last-Event-ID and resumes from here
+                break
+            try:
+                await asyncio.wait_for(wakeup.wait(), min(taskmanager.SSE_HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                await write(': keepalive\n\n')
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        taskmanager.event_hub.unsubscribe(room_code, notify)
+        watcher.cancel()
@@ -0,0 +1,314 @@
+"""
+Load and latency benchmark for the API, in process through the Flask test client
+or against a running server (e.g. gunicorn with STORAGE_BACKEND=postgres).
+
+    python benchmarks/bench_endpoints.py --sizes 10 1000 10000 --output before.json
+    python benchmarks/bench_endpoints.py --url http://127.0.0.1:5125 --concurrency 16
+    python benchmarks/bench_endpoints.py --compare before.json after.json
+
+For every room size a room is filled through POST /tasks/batch, then each
+workload sends --requests requests from --concurrency workers, choosing endpoints
+by the workload's weights. Throughput and p50/p95/p99 latency are reported per
+endpoint and, with --output, saved as JSON. Workers are seeded, so the same
+arguments send the same requests. In process, STORAGE_BACKEND selects the engine
+(default: memory). Latency and throughput count successful requests only; the run
+exits with status 1 if any request failed.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+WORDS = ('report', 'budget', 'review', 'deploy', 'invoice', 'design', 'meeting', 'release',
+         'backup', 'audit', 'hiring', 'roadmap', 'survey', 'launch', 'migration', 'training')
+PRIORITIES = ('high', 'medium', 'low')
+BATCH_SIZE = 500
+FIRST_DUE = datetime(2030, 1, 1)
+# Fewer samples than this make a p95 too noisy to call a regression
+MIN_COMPARE_SAMPLES = 100
+
+
+# ---------------- Requests ----------------
+# Each endpoint builds (method, path, body) for a room of `n` seeded tasks; writes
+# only touch those tasks or ones the worker created, so runs stay comparable.
+def random_due(rng):
+    return (FIRST_DUE + timedelta(days=rng.randrange(365), hours=rng.randrange(24))).strftime('%Y-%m-%d %H:%M:%S')
+
+def random_task(rng):
+    return {
+        "title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.randrange(10000)}",
+        "description": ' '.join(rng.choice(WORDS) for _ in range(8)),
+        "priority": rng.choice(PRIORITIES),
+        "due_date": random_due(rng) if rng.random() < 0.7 else None,
+    }
+
+def week_range(rng):
+    start = FIRST_DUE + timedelta(days=rng.randrange(358))
+    return f"due_after={start:%Y-%m-%d}&due_before={start + timedelta(days=7):%Y-%m-%d}"
+
+ENDPOINTS = {
+    'get_tasks': lambda w: ('GET', f"/tasks?room={w.code}", None),
+    'get_tasks_page': lambda w: ('GET', f"/tasks?room={w.code}&status=pending&priority={w.rng.choice(PRIORITIES)}"
+                                        f"&limit=100&cursor={w.rng.randrange(w.n + 1)}", None),
+    'get_tasks_due': lambda w: ('GET', f"/tasks?room={w.code}&{week_range(w.rng)}&sort=due_date&limit=100", None),
+    'search_tasks': lambda w: ('GET', f"/tasks/search?room={w.code}&q={w.rng.choice(WORDS)}+{w.rng.choice(WORDS)}", None),
+    'get_stats': lambda w: ('GET', f"/tasks/stats?room={w.code}", None),
+    'get_room': lambda w: ('GET', f"/rooms/{w.code}", None),
+    'get_snapshot': lambda w: ('GET', f"/rooms/{w.code}/snapshot", None),
+    'create_room': lambda w: ('POST', "/rooms", {"username": "bench"}),
+    'join_room': lambda w: ('POST', f"/rooms/{w.code}/join", {"username": f"user{w.rng.randrange(50)}"}),
+    'create_task': lambda w: ('POST', f"/tasks?room={w.code}", random_task(w.rng)),
+    'update_task': lambda w: ('PUT', f"/tasks/{w.rng.randrange(1, w.n + 1)}?room={w.code}",
+                              {"priority": w.rng.choice(PRIORITIES), "due_date": random_due(w.rng)}),
+    'complete_task': lambda w: ('POST', f"/tasks/{w.rng.randrange(1, w.n + 1)}/complete?room={w.code}", None),
+    'delete_task': lambda w: ('DELETE', f"/tasks/{w.created.pop()}?room={w.code}", None),
+    'batch_tasks': lambda w: ('POST', f"/tasks/batch?room={w.code}",
+                              {"operations": [dict(random_task(w.rng), op="create") for _ in range(20)]}),
+}
+
+# Relative weights of the endpoints in each workload
+WORKLOADS = {
+    'read': {'get_tasks_page': 30, 'get_tasks_due': 15, 'search_tasks': 15, 'get_stats': 25,
+             'get_tasks': 2, 'get_room': 2, 'get_snapshot': 1},
+    'mixed': {'get_tasks_page': 25, 'get_tasks_due': 10, 'search_tasks': 10, 'get_stats': 20,
+              'get_tasks': 1, 'get_room': 1, 'get_snapshot': 1, 'create_task': 10, 'update_task': 10,
+              'complete_task': 5, 'delete_task': 4, 'batch_tasks': 1, 'join_room': 1, 'create_room': 1},
+    'write': {'create_task': 30, 'update_task': 30, 'complete_task': 15, 'delete_task': 15,
+              'batch_tasks': 5, 'create_room': 5},
+}
+
+
+# ---------------- Targets ----------------
+class FlaskTarget:
+    """Requests through the Flask test client; one client per worker thread."""
+    name = 'flask test client'
+
+    def __init__(self):
+        import app as taskmanager
+        self.app = taskmanager.app
+        self.storage = os.environ['STORAGE_BACKEND']
+
+    def client(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            response = client.open(path, method=method, json=body)
+            return response.status_code, response.get_data()
+        return send
+
+
+class HttpTarget:
+    """Requests over HTTP to a running server; one keep-alive session per worker thread."""
+    storage = None
+
+    def __init__(self, url):
+        import requests
+        self.requests = requests
+        self.name = self.url = url.rstrip('/')
+
+    def client(self):
+        session = self.requests.Session()
+
+        def send(method, path, body):
+            response = session.request(method, self.url + path, json=body, timeout=60)
+            return response.status_code, response.content
+        return send
+
+
+# ---------------- Running ----------------
+class Worker:
+    def __init__(self, send, code, n, seed):
+        self.send, self.code, self.n = send, code, n
+        self.rng = random.Random(seed)
+        self.created = []
+        self.samples = []
+
+    def step(self, names, weights):
+        name = self.rng.choices(names, weights)[0]
+        if name == 'delete_task' and not self.created:
+            name = 'create_task'
+        method, path, body = ENDPOINTS[name](self)
+        start = time.perf_counter()
+        status, content = self.send(method, path, body)
+        elapsed = time.perf_counter() - start
+        if name == 'create_task' and status == 201:
+            self.created.append(json.loads(content)['task']['id'])
+        self.samples.append((name, elapsed, status < 400))
+
+def make_room(send, n, seed):
+    """Create a room with `n` tasks (ids 1..n) and return its code."""
+    status, content = send('POST', '/rooms', {"username": "bench"})
+    assert status == 201, content
+    code = json.loads(content)['room_code']
+    rng = random.Random(seed)
+    for start in range(0, n, BATCH_SIZE):
+        operations = [dict(random_task(rng), op="create") for _ in range(min(BATCH_SIZE, n - start))]
+        status, content = send('POST', f'/tasks/batch?room={code}', {"operations": operations})
+        assert status == 200, content
+    return code
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(samples, wall):
+    # Failed requests are often fast rejections; timing them would flatter the result
+    latencies = sorted(s[1] for s in samples if s[2])
+    if not latencies:
+        return {"requests": len(samples), "errors": len(samples), "throughput": 0.0, "mean_ms": None,
+                "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(latencies),
+        "throughput": round(len(latencies) / wall, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+def run_workload(target, code, n, workload, requests, concurrency, warmup, seed):
+    names, weights = zip(*WORKLOADS[workload].items())
+    workers = [Worker(target.client(), code, n, seed * 1000 + i) for i in range(concurrency)]
+    for worker in workers:
+        for _ in range(warmup // concurrency):
+            worker.step(names, weights)
+        worker.samples.clear()
+
+    share = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+
+    def run(i):
+        for _ in range(share[i]):
+            workers[i].step(names, weights)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(run, range(concurrency)))
+    wall = time.perf_counter() - start
+
+    samples = [s for w in workers for s in w.samples]
+    result = {"tasks": n, "workload": workload, **summarize(samples, wall), "endpoints": {}}
+    for name in names:
+        endpoint_samples = [s for s in samples if s[0] == name]
+        if endpoint_samples:
+            # Throughput an endpoint got within the mix, over the same wall time
+            result["endpoints"][name] = summarize(endpoint_samples, wall)
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def shown(value):
+    """A latency for display; None (no successful request) prints as '-'."""
+    return '-' if value is None else value
+
+def print_result(result):
+    print(f"\n{result['tasks']} tasks, {result['workload']}: {result['throughput']} req/s, "
+          f"p50 {shown(result['p50_ms'])}ms, p99 {shown(result['p99_ms'])}ms, {result['errors']} errors")
+    print(f"  {'endpoint':<16} {'req':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+    for name, e in result['endpoints'].items():
+        print(f"  {name:<16} {e['requests']:>6} {e['throughput']:>8} {shown(e['p50_ms']):>9} "
+              f"{shown(e['p95_ms']):>9} {shown(e['p99_ms']):>9} {e['errors']:>6}")
+
+
+# ---------------- Comparing ----------------
+def compare(before_path, after_path, threshold):
+    """
+    Print per-endpoint changes between two result files. Returns 1 if any p95
+    regressed past `threshold`% or the newer run had failed requests.
+    """
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+    old = {(r['tasks'], r['workload']): r for r in before['results']}
+    regressed = False
+    for result in after['results']:
+        previous = old.get((result['tasks'], result['workload']))
+        if previous is None:
+            continue
+        print(f"\n{result['tasks']} tasks, {result['workload']}")
+        print(f"  {'endpoint':<16} {'req/s':>16} {'p50 ms':>18} {'p95 ms':>18}")
+        for name, e in result['endpoints'].items():
+            p = previous['endpoints'].get(name)
+            if p is None:
+                continue
+            change = (e['p95_ms'] - p['p95_ms']) / p['p95_ms'] * 100 if e['p95_ms'] and p['p95_ms'] else 0
+            flag = ''
+            if e['errors']:
+                flag = f"  {e['errors']} ERRORS"
+            elif min(e['requests'] - e['errors'], p['requests'] - p['errors']) < MIN_COMPARE_SAMPLES:
+                flag = '  (few samples)'
+            elif change > threshold:
+                flag = '  REGRESSION'
+            regressed |= e['errors'] > 0 or flag == '  REGRESSION'
+            print(f"  {name:<16} {p['throughput']:>7} -> {e['throughput']:<7} {shown(p['p50_ms']):>8} -> "
+                  f"{shown(e['p50_ms']):<8} {shown(p['p95_ms']):>8} -> {shown(e['p95_ms']):<8} {change:+.0f}%{flag}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help="benchmark a running server instead of the in-process app")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000, 100000])
+    parser.add_argument('--workloads', nargs='+', choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument('--requests', type=int, default=2000, help="measured requests per size and workload")
+    parser.add_argument('--warmup', type=int, default=100, help="unmeasured requests before each workload")
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="compare two result files")
+    parser.add_argument('--threshold', type=float, default=10, help="p95 increase in %% reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    target = HttpTarget(args.url) if args.url else FlaskTarget()
+    meta = {
+        "commit": git_commit(), "target": target.name, "storage": target.storage,
+        "python": platform.python_version(), "platform": platform.platform(),
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency, "seed": args.seed,
+    }
+    print(f"Benchmarking {target.name} at commit {meta['commit']}")
+    results = []
+    for n in args.sizes:
+        start = time.perf_counter()
+        # Every workload gets a fresh room, so writes from one do not skew the next
+        for workload in args.workloads:
+            code = make_room(target.client(), n, args.seed)
+            results.append(run_workload(target, code, n, workload, args.requests,
+                                        args.concurrency, args.warmup, args.seed))
+            print_result(results[-1])
+        print(f"  ({time.perf_counter() - start:.1f}s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    errors = sum(r['errors'] for r in results)
+    if errors:
+        print(f"\n{errors} request(s) failed; latency and throughput exclude them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Time encoding a room's task list the old way (jsonify over every task as a dict), with
+the fast encoder over every task, and from cached per-task fragments (warm, and
+with one task changed since the last request).
+
+    python benchmarks/bench_json.py [sizes...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+
+import app as taskmanager
+
+
+def task_dict(i):
+    return {
+        "id": i, "title": f"Task {i}", "description": "Something to do " * 3,
+        "priority": ("high", "medium", "low")[i % 3],
+        "due_date": "2030-01-01 12:00:00" if i % 2 else None,
+        "completed": i % 5 == 0, "completed_at": None, "created_at": "2026-01-01 09:00:00",
+    }
+
+
+def make_room(n):
+    tasks = {i: taskmanager.Task.from_dict(task_dict(i)) for i in range(1, n + 1)}
+    return taskmanager.build_room_indexes({
+        "code": "BENCH1", "owner": "bench", "members": ["bench"], "created_at": "2026-01-01 09:00:00",
+        "tasks": tasks, "next_task_id": n + 1, "version": 1,
+    })
+
+
+def best_of(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(sizes):
+    print(f"orjson: {'available' if taskmanager.orjson else 'not installed'}")
+    print(f"{'tasks':>8} {'jsonify':>10} {'encode all':>10} {'cached':>10} {'1 changed':>10} {'speedup':>8}")
+    with taskmanager.app.app_context():
+        for n in sizes:
+            room = make_room(n)
+            payload = lambda: {"tasks": [t.to_dict() for t in room['tasks'].values()], "total": n, "version": room['version']}
+            cached = lambda: taskmanager.json_response(
+                {"tasks": taskmanager.encoded_tasks(room['tasks'].values(), room), "total": n,
+                 "version": room['version']})
+
+            baseline = best_of(lambda: taskmanager.jsonify(payload()).get_data())
+            uncached = best_of(lambda: taskmanager.json_response(payload()).get_data())
+            cached()  # fill the cache
+            warm = best_of(lambda: cached().get_data())
+
+            def one_change():
+                task = room['tasks'][1]
+                taskmanager.remove_from_indexes(room, task)
+                taskmanager.add_to_indexes(room, task)
+                cached().get_data()
+            changed = best_of(one_change)
+            print(f"{n:>8} {baseline * 1000:>8.1f}ms {uncached * 1000:>8.1f}ms {warm * 1000:>8.1f}ms {changed * 1000:>8.1f}ms "
+                  f"{baseline / warm:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,46 @@
+"""
+Measure the memory a room's tasks take, per task: the old representation (a dict
+per task with 'YYYY-MM-DD HH:MM:SS' timestamp strings) against Task objects with
+integer timestamps. Counts everything allocated while building the room's task
+table, so shared strings such as the priority names are not included.
+
+    python benchmarks/bench_memory.py [sizes...]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_json import task_dict, taskmanager
+
+
+def measure(build, n):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = build(n)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert len(tasks) == n
+    return used / n
+
+
+def as_dicts(n):
+    # to_dict() formats a fresh string per timestamp, as parsing requests and rows did
+    return {i: taskmanager.Task.from_dict(task_dict(i)).to_dict() for i in range(1, n + 1)}
+
+
+def as_tasks(n):
+    return {i: taskmanager.Task.from_dict(task_dict(i)) for i in range(1, n + 1)}
+
+
+def main(sizes):
+    print(f"{'tasks':>8} {'dict':>12} {'Task':>12} {'saved':>7}")
+    for n in sizes:
+        before = measure(as_dicts, n)
+        after = measure(as_tasks, n)
+        print(f"{n:>8} {before:>8.0f} B/task {after:>6.0f} B/task {1 - after / before:>6.0%}")
+
+
+if __name__ == '__main__':
+    main([int(a) for a in sys.argv[1:]] or [10000, 100000])
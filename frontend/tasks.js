@@ -27,6 +27,28 @@ async function fetchJSON(url, options) {
   }
 }
 
+/* ========== Conditional GETs (ETag revalidation) ========== */
+// url -> { etag, data } of the last successful response
+const validatorCache = new Map();
+
+// Sends the stored ETag as If-None-Match so an unchanged resource comes back as
+// a bodiless 304. Resolves to { ok, status, data, changed }; never shows errors.
+async function fetchCached(url) {
+  const cached = validatorCache.get(url);
+  const res = await fetch(url, {
+    cache: 'no-store',
+    headers: cached ? { 'If-None-Match': cached.etag } : {}
+  });
+  if (res.status === 304 && cached) {
+    return { ok: true, status: 304, data: cached.data, changed: false };
+  }
+  let data = null;
+  try { data = await res.json(); } catch {}
+  const etag = res.headers.get('ETag');
+  if (res.ok && etag) validatorCache.set(url, { etag, data });
+  return { ok: res.ok, status: res.status, data, changed: true };
+}
+
 function escapeHTML(s) {
   if (!s) return '';
   return s.replaceAll('&', '&amp;')
@@ -124,7 +146,6 @@ function copyTextFallback(text) {
 async function loadRoomInfo() {
   const codeEl = document.getElementById('room-code');
   const listEl = document.getElementById('member-list');
-  const copyBtn = document.getElementById('copy-code');
 
   if (!ROOM) {
     if (codeEl) codeEl.textContent = 'Room: —';
@@ -133,65 +154,81 @@ async function loadRoomInfo() {
   }
 
   try {
-    // Use direct fetch instead of fetchJSON to avoid automatic error display
-    const res = await fetch(`/rooms/${encodeURIComponent(ROOM)}`);
-    let room = null;
-    try { 
-      room = await res.json(); 
-    } catch {}
-    
-    if (!res.ok) {
-      throw new Error(room?.error || res.statusText || 'Room not found');
-    }
+    // Use fetchCached instead of fetchJSON to avoid automatic error display
+    const { ok, data: room, changed } = await fetchCached(`/rooms/${encodeURIComponent(ROOM)}`);
 
-    if (codeEl) codeEl.textContent = `Room: ${room.code || ROOM}`;
-
-    if (copyBtn) {
-      copyBtn.onclick = async () => {
-        const text = room.code || ROOM;
-        try {
-          if (navigator.clipboard && window.isSecureContext) {
-            await navigator.clipboard.writeText(text);
-          } else {
-            copyTextFallback(text);
-          }
-          copyBtn.textContent = "Copied!";
-        } catch (err) {
-          console.error("Copy failed:", err);
-          copyBtn.textContent = "Copy failed";
-        }
-        setTimeout(() => (copyBtn.textContent = "Copy"), 1200);
-      };
+    if (!ok) {
+      throw new Error(room?.error || 'Room not found');
     }
+    if (!changed) return;
+    renderRoomInfo(room);
+  } catch (err) {
+    showRoomError(err);
+  }
+}
 
-    const members = Array.isArray(room.members) ? room.members : [];
-    if (listEl) {
-      if (members.length === 0) {
-        listEl.innerHTML = '<li>No members yet.</li>';
-      } else {
-        listEl.innerHTML = members
-          .map(name => {
-            const me = USER && name && name.toLowerCase() === USER.toLowerCase();
-            return `<li class="${me ? 'me' : ''}">
-                      <span>${escapeHTML(name || 'Unknown')}</span>
-                      ${me ? '<span class="badge">You</span>' : ''}
-                    </li>`;
-          })
-          .join('');
+function renderRoomInfo(room) {
+  const codeEl = document.getElementById('room-code');
+  const listEl = document.getElementById('member-list');
+  const copyBtn = document.getElementById('copy-code');
+
+  if (codeEl) codeEl.textContent = `Room: ${room.code || ROOM}`;
+
+  if (copyBtn) {
+    copyBtn.onclick = async () => {
+      const text = room.code || ROOM;
+      try {
+        if (navigator.clipboard && window.isSecureContext) {
+          await navigator.clipboard.writeText(text);
+        } else {
+          copyTextFallback(text);
+        }
+        copyBtn.textContent = "Copied!";
+      } catch (err) {
+        console.error("Copy failed:", err);
+        copyBtn.textContent = "Copy failed";
       }
+      setTimeout(() => (copyBtn.textContent = "Copy"), 1200);
+    };
+  }
+
+  const members = Array.isArray(room.members) ? room.members : [];
+  if (listEl) {
+    if (members.length === 0) {
+      listEl.innerHTML = '<li>No members yet.</li>';
+    } else {
+      listEl.innerHTML = members
+        .map(name => {
+          const me = USER && name && name.toLowerCase() === USER.toLowerCase();
+          return `<li class="${me ? 'me' : ''}">
+                    <span>${escapeHTML(name || 'Unknown')}</span>
+                    ${me ? '<span class="badge">You</span>' : ''}
+                  </li>`;
+        })
+        .join('');
     }
-    
-    // Clear any previous errors when room loads successfully
-    showError('');
-  } catch (err) {
-    console.error('Failed to load room:', err);
-    if (codeEl) codeEl.textContent = `Room: ${ROOM} (not found)`;
-    if (listEl) listEl.innerHTML = `<li>${escapeHTML(err.message || 'Failed to load room')}</li>`;
-    showError(`Room "${ROOM}" not found. Please check the room code or create a new room.`);
   }
+
+  // Clear any previous errors when room loads successfully
+  showError('');
+}
+
+function showRoomError(err) {
+  const codeEl = document.getElementById('room-code');
+  const listEl = document.getElementById('member-list');
+  console.error('Failed to load room:', err);
+  if (codeEl) codeEl.textContent = `Room: ${ROOM} (not found)`;
+  if (listEl) listEl.innerHTML = `<li>${escapeHTML(err.message || 'Failed to load room')}</li>`;
+  showError(`Room "${ROOM}" not found. Please check the room code or create a new room.`);
 }
 
 /* ========== Load tasks (main grid) ========== */
+// Client copy of the room's tasks and the room version it reflects, so that
+// loadTasks only downloads what changed since then (version 0 = everything)
+const taskState = new Map();
+let renderedVersion = 0;
+let renderedOverdue = null;
+
 async function loadTasks() {
   if (!ROOM) {
     showError('Missing room code. Please enter via the landing page.');
@@ -199,76 +236,185 @@ async function loadTasks() {
   }
   showError('');
   try {
-    const data = await fetchJSON(withRoom('/tasks'));
-    const groups = {
-      high: document.getElementById('high-body'),
-      medium: document.getElementById('medium-body'),
-      low: document.getElementById('low-body'),
-      completed: document.getElementById('completed-body')
-    };
-    Object.values(groups).forEach(t => t && (t.innerHTML = ''));
+    const delta = await fetchJSON(withRoom(`/tasks?since=${renderedVersion}`));
+    applyTaskDelta(delta);
 
-    const now = new Date();
+    const statsRes = await fetchCached(withRoom('/tasks/stats'));
+    if (!statsRes.ok) throw new Error(statsRes.data?.error || 'Failed to load stats');
+    if (statsRes.changed) updateStats(statsRes.data);
+  } catch (err) {
+    showError(err.message);
+    console.error(err);
+  }
+}
 
-    (data.tasks || []).forEach(task => {
-      let buttons = '';
-      if (!task.completed) {
-        buttons += `<button class="action-btn complete" data-action="complete">Complete</button>`;
-      }
-      buttons += `<button class="action-btn delete" data-action="delete">Delete</button>`;
-
-      const row = document.createElement('tr');
-      row.dataset.id = task.id;
-      row.className = 'task-row' + (task.completed ? ' completed' : '');
-      row.innerHTML = `<td><div class="task-title">${escapeHTML(task.title)}</div></td>`;
-
-      const descRow = document.createElement('tr');
-      descRow.className = 'desc-row';
-      descRow.style.display = 'none';
-
-      let dueInfo = '';
-      if (task.due_date) {
-        const dueDate = parseDueDate(task.due_date);
-        if (dueDate) {
-          const overdue = (!task.completed && dueDate < now);
-          if (overdue) { row.classList.add('overdue'); descRow.classList.add('overdue'); }
-
-          const tl = formatTimeLeft(dueDate);
-          const tlClass = overdue ? 'time-left overdue' : 'time-left';
-          const formattedDate = formatDateDMY(dueDate);
-
-          dueInfo = `
-            <div class="due-info">
-              <span class="due-date"><small>Due: ${formattedDate}</small></span>
-              <span class="${tlClass}">(${escapeHTML(tl)})</span>
-            </div>
-          `;
-        }
-      }
+/* First paint: room info, tasks and stats in a single request. */
+async function loadSnapshot() {
+  if (!ROOM) {
+    await loadRoomInfo();
+    return loadTasks();
+  }
+  try {
+    const { ok, data: snapshot } = await fetchCached(`/rooms/${encodeURIComponent(ROOM)}/snapshot`);
+    if (!ok) throw new Error(snapshot?.error || 'Room not found');
+
+    renderRoomInfo(snapshot.room);
+    taskState.clear();
+    Object.values(snapshot.columns).forEach(tasks => tasks.forEach(task => taskState.set(task.id, task)));
+    renderColumns(snapshot.columns);
+    renderedVersion = snapshot.version;
+    updateStats(snapshot.stats);
+  } catch (err) {
+    showRoomError(err);
+  }
+}
 
-      descRow.innerHTML = `
-        <td>
-          <div class="desc-box">
-            <div class="desc-content">${escapeHTML(task.description || '')}</div>
-            ${dueInfo}
-            <div class="actions below-title">${buttons}</div>
-          </div>
-        </td>
-      `;
+function applyTaskDelta(delta) {
+  if (delta.full) {
+    taskState.clear();
+    (delta.tasks || []).forEach(task => taskState.set(task.id, task));
+    renderTasks(sortedTasks());
+  } else {
+    (delta.deleted || []).forEach(id => {
+      taskState.delete(id);
+      removeTask(id);
+    });
+    (delta.tasks || []).forEach(task => {
+      taskState.set(task.id, task);
+      placeTask(task);
+    });
+  }
+  renderedVersion = delta.version;
+}
+
+function sortedTasks() {
+  return [...taskState.values()].sort((a, b) => a.id - b.id);
+}
+
+function taskGroups() {
+  return {
+    high: document.getElementById('high-body'),
+    medium: document.getElementById('medium-body'),
+    low: document.getElementById('low-body'),
+    completed: document.getElementById('completed-body')
+  };
+}
+
+function boardColumn(task) {
+  if (task.completed) return 'completed';
+  return ['high', 'medium', 'low'].includes(task.priority) ? task.priority : 'medium';
+}
+
+function renderTasks(tasks) {
+  const columns = { high: [], medium: [], low: [], completed: [] };
+  tasks.forEach(task => columns[boardColumn(task)].push(task));
+  renderColumns(columns);
+}
+
+function renderColumns(columns) {
+  const groups = taskGroups();
+  Object.values(groups).forEach(t => t && (t.innerHTML = ''));
 
-      const group = task.completed ? groups.completed : (groups[task.priority] || groups.medium);
-      (group || groups.medium).appendChild(row);
-      (group || groups.medium).appendChild(descRow);
+  const now = new Date();
+  Object.entries(columns).forEach(([name, tasks]) => {
+    const group = groups[name] || groups.medium;
+    if (!group) return;
+    tasks.forEach(task => {
+      const [row, descRow] = buildTaskRows(task, now);
+      group.appendChild(row);
+      group.appendChild(descRow);
     });
+  });
+}
 
-    const stats = await fetchJSON(withRoom('/tasks/stats'));
-    const statsEl = document.getElementById('stats');
-    if (statsEl) {
-      statsEl.textContent = `Total: ${stats.total_tasks}, Completed: ${stats.completed_tasks}, Pending: ${stats.pending_tasks}, Overdue: ${stats.overdue_tasks}`;
+function buildTaskRows(task, now) {
+  let buttons = '';
+  if (!task.completed) {
+    buttons += `<button class="action-btn complete" data-action="complete">Complete</button>`;
+  }
+  buttons += `<button class="action-btn delete" data-action="delete">Delete</button>`;
+
+  const row = document.createElement('tr');
+  row.dataset.id = task.id;
+  row.className = 'task-row' + (task.completed ? ' completed' : '');
+  row.innerHTML = `<td><div class="task-title">${escapeHTML(task.title)}</div></td>`;
+
+  const descRow = document.createElement('tr');
+  descRow.className = 'desc-row';
+  descRow.style.display = 'none';
+
+  let dueInfo = '';
+  if (task.due_date) {
+    const dueDate = parseDueDate(task.due_date);
+    if (dueDate) {
+      const overdue = (!task.completed && dueDate < now);
+      if (overdue) { row.classList.add('overdue'); descRow.classList.add('overdue'); }
+
+      const tl = formatTimeLeft(dueDate);
+      const tlClass = overdue ? 'time-left overdue' : 'time-left';
+      const formattedDate = formatDateDMY(dueDate);
+
+      dueInfo = `
+        <div class="due-info">
+          <span class="due-date"><small>Due: ${formattedDate}</small></span>
+          <span class="${tlClass}">(${escapeHTML(tl)})</span>
+        </div>
+      `;
     }
-  } catch (err) {
-    console.error(err);
   }
+
+  descRow.innerHTML = `
+    <td>
+      <div class="desc-box">
+        <div class="desc-content">${escapeHTML(task.description || '')}</div>
+        ${dueInfo}
+        <div class="actions below-title">${buttons}</div>
+      </div>
+    </td>
+  `;
+  return [row, descRow];
+}
+
+/* Remove a task's rows; returns whether its description was expanded. */
+function removeTask(id) {
+  const row = document.querySelector(`#task-tables tr.task-row[data-id="${id}"]`);
+  if (!row) return false;
+  const descRow = row.nextElementSibling;
+  const expanded = descRow?.style.display === 'table-row';
+  if (descRow && descRow.classList.contains('desc-row')) descRow.remove();
+  row.remove();
+  return expanded;
+}
+
+/* Insert or replace a single task, keeping each table in id order. */
+function placeTask(task) {
+  const expanded = removeTask(task.id);
+  const groups = taskGroups();
+  const group = groups[boardColumn(task)] || groups.medium;
+  if (!group) return;
+
+  const [row, descRow] = buildTaskRows(task, new Date());
+  if (expanded) descRow.style.display = 'table-row';
+  const next = [...group.querySelectorAll('tr.task-row')].find(r => Number(r.dataset.id) > task.id);
+  group.insertBefore(row, next || null);
+  group.insertBefore(descRow, next || null);
+}
+
+function renderStats(stats) {
+  const statsEl = document.getElementById('stats');
+  if (statsEl) {
+    statsEl.textContent = `Total: ${stats.total_tasks}, Completed: ${stats.completed_tasks}, Pending: ${stats.pending_tasks}, Overdue: ${stats.overdue_tasks}`;
+  }
+}
+
+// Tasks turn overdue with the clock rather than through a change, so rows are
+// only redrawn when the overdue count moved
+function updateStats(stats) {
+  renderStats(stats);
+  if (renderedOverdue !== null && stats.overdue_tasks !== renderedOverdue) {
+    renderTasks(sortedTasks());
+  }
+  renderedOverdue = stats.overdue_tasks;
 }
 
 /* ========== Modal create task (if present) ========== */
@@ -308,7 +454,7 @@ if (taskForm) {
         modal.classList.add('hidden');
         modal.setAttribute('aria-hidden', 'true');
       }
-      loadTasks();
+      if (!liveFeedOpen) loadTasks();
     } catch (err) {
       console.error(err);
     }
@@ -331,7 +477,8 @@ document.getElementById('task-tables')?.addEventListener('click', async (e) => {
       } else if (action === 'complete') {
         await fetchJSON(withRoom(`/tasks/${id}/complete`), { method: 'POST' });
       }
-      loadTasks();
+      // With the live feed open the change arrives as an event
+      if (!liveFeedOpen) loadTasks();
     } catch (err) {
       console.error(err);
     }
@@ -347,11 +494,65 @@ document.getElementById('task-tables')?.addEventListener('click', async (e) => {
   }
 });
 
+/* ========== Live updates (Server-Sent Events) ========== */
+let liveFeedOpen = false;
+let statsTimer = null;
+
+// Coalesce a burst of events into one (usually cheap) stats request
+function refreshStatsSoon() {
+  clearTimeout(statsTimer);
+  statsTimer = setTimeout(async () => {
+    try {
+      const res = await fetchCached(withRoom('/tasks/stats'));
+      if (res.ok && res.changed) updateStats(res.data);
+    } catch (err) {
+      console.error(err);
+    }
+  }, 250);
+}
+
+function connectLiveFeed() {
+  if (!ROOM || !window.EventSource) return;
+  // Start from the version already rendered; on reconnect EventSource sends
+  // Last-Event-ID itself, which takes precedence on the server
+  const source = new EventSource(
+    `/rooms/${encodeURIComponent(ROOM)}/events?last_event_id=${renderedVersion}`
+  );
+  source.onopen = () => { liveFeedOpen = true; };
+  source.onerror = () => { liveFeedOpen = false; };
+
+  ['task_created', 'task_updated', 'task_completed'].forEach(type => {
+    source.addEventListener(type, e => {
+      applyTaskDelta({ tasks: [JSON.parse(e.data)], version: Number(e.lastEventId) });
+      refreshStatsSoon();
+    });
+  });
+  source.addEventListener('task_deleted', e => {
+    applyTaskDelta({ deleted: [JSON.parse(e.data).id], version: Number(e.lastEventId) });
+    refreshStatsSoon();
+  });
+  source.addEventListener('member_joined', e => {
+    renderedVersion = Number(e.lastEventId);
+    loadRoomInfo();
+  });
+  // The server could not replay what we missed: reload everything
+  source.addEventListener('resync', () => {
+    loadRoomInfo();
+    loadTasks();
+  });
+  source.addEventListener('room_deleted', () => source.close());
+}
+
 /* ========== Init & live refresh ========== */
-loadRoomInfo();
-loadTasks();
+loadSnapshot().then(connectLiveFeed);
 
+// Fallback polling while the live feed is unavailable. With the feed open only
+// stats are revalidated, since the overdue count changes with the clock.
 setInterval(() => {
+  if (liveFeedOpen) {
+    refreshStatsSoon();
+    return;
+  }
   loadRoomInfo();
   loadTasks();
 }, 60000);
@@ -0,0 +1,25 @@
+"""Gunicorn hooks for sharing Prometheus metrics between workers.
+
+Used as `gunicorn --config gunicorn.conf.py ... asgi:application` (or `app:app`) with
+PROMETHEUS_MULTIPROC_DIR set.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    """Start every run with an empty metrics directory; files left by a previous run would be counted again."""
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited (e.g. recycled by --max-requests)."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        try:
+            from prometheus_client import multiprocess
+        except ImportError:
+            return
+        multiprocess.mark_process_dead(worker.pid)
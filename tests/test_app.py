@@ -1,7 +1,8 @@
+import os
 import pytest
 import json
 from datetime import datetime
-from app import app, rooms
+from app import app, rooms, Task
 
 class TestRoomManagement:
     """Test room creation and management."""
@@ -139,6 +140,224 @@ class TestTaskRetrieval:
         assert len(data['tasks']) == 1
         assert data['tasks'][0]['completed'] is False
 
+    def test_combined_filters_follow_mutations(self, client, test_room):
+        """Test status and priority indexes stay in id order as tasks change."""
+        for i, priority in enumerate(["HIGH", "low", "High", "high"], 1):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}", "priority": priority})
+        client.post(f'/tasks/3/complete?room={test_room}')
+        client.put(f'/tasks/2?room={test_room}', json={"priority": "high"})
+        client.put(f'/tasks/1?room={test_room}', json={"completed": True})
+        client.delete(f'/tasks/4?room={test_room}')
+
+        data = client.get(f'/tasks?room={test_room}&status=completed&priority=High').json
+        assert [t['id'] for t in data['tasks']] == [1, 3]
+        assert data['tasks'][0]['priority'] == "high"
+        assert data['total'] == 2
+        data = client.get(f'/tasks?room={test_room}&status=pending&priority=high').json
+        assert [t['id'] for t in data['tasks']] == [2]
+        assert data['total'] == 1
+        room = rooms.get(test_room)
+        assert room['by_status'] == {'completed': [1, 3], 'pending': [2]}
+        assert room['by_priority'] == {'high': [1, 2, 3]}
+
+class TestTaskPagination:
+    """Test keyset pagination and field projection on GET /tasks."""
+
+    def test_pages_follow_cursor(self, client, test_room):
+        """Test walking a filtered listing page by page while tasks change."""
+        for i in range(1, 6):
+            client.post(f'/tasks?room={test_room}',
+                        json={"title": f"Task {i}", "priority": "high" if i % 2 else "low"})
+
+        response = client.get(f'/tasks?room={test_room}&priority=high&limit=2')
+        data = response.json
+        assert [t['id'] for t in data['tasks']] == [1, 3]
+        assert data['total'] == 3
+        assert data['total_all'] == 5
+        assert data['next_cursor'] == 3
+
+        # Deleting a task already returned does not shift the next page
+        client.delete(f'/tasks/1?room={test_room}')
+        data = client.get(f'/tasks?room={test_room}&priority=high&limit=2&cursor=3').json
+        assert [t['id'] for t in data['tasks']] == [5]
+        assert data['next_cursor'] is None
+
+    def test_field_projection(self, client, test_room):
+        """Test that fields= limits the returned keys and always keeps the id."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Task", "description": "Long text"})
+
+        data = client.get(f'/tasks?room={test_room}&fields=title,completed').json
+        assert data['tasks'] == [{"id": 1, "title": "Task", "completed": False}]
+        assert 'next_cursor' not in data
+        # Empty entries are ignored
+        data = client.get(f'/tasks?room={test_room}&fields=,title,').json
+        assert data['tasks'] == [{"id": 1, "title": "Task"}]
+        data = client.get(f'/tasks?room={test_room}&fields=,').json
+        assert data['tasks'][0]['description'] == "Long text"
+
+    def test_invalid_paging_arguments(self, client, test_room):
+        """Test validation of limit, cursor and fields."""
+        assert client.get(f'/tasks?room={test_room}&limit=0').status_code == 400
+        assert client.get(f'/tasks?room={test_room}&cursor=abc').status_code == 400
+        assert client.get(f'/tasks?room={test_room}&fields=title,secret').status_code == 400
+
+class TestDueDateQueries:
+    """Test due-date ranges, overdue and sort parameters on GET /tasks."""
+
+    @pytest.fixture
+    def dated_tasks(self, client, test_room):
+        for title, due, priority in [("Mar", "2030-03-01", "low"), ("None", None, "high"),
+                                     ("Jan", "2030-01-01", "medium"), ("Past", "2000-01-01", "low"),
+                                     ("Feb", "2030-02-01 12:00:00", "high")]:
+            client.post(f'/tasks?room={test_room}', json={"title": title, "due_date": due, "priority": priority})
+        client.post(f'/tasks/4/complete?room={test_room}')
+        client.post(f'/tasks?room={test_room}', json={"title": "Late", "due_date": "2001-01-01"})
+
+    def titles(self, client, test_room, query):
+        return [t['title'] for t in client.get(f'/tasks?room={test_room}&{query}').json['tasks']]
+
+    def test_due_ranges(self, client, test_room, dated_tasks):
+        """Test inclusive due_after/due_before bounds return tasks in id order."""
+        assert self.titles(client, test_room, 'due_after=2030-01-01&due_before=2030-02-01 12:00:00') == ["Jan", "Feb"]
+        assert self.titles(client, test_room, 'due_before=2030-01-31') == ["Jan", "Past", "Late"]
+        assert self.titles(client, test_room, 'due_after=2030-02-01&priority=high') == ["Feb"]
+        data = client.get(f'/tasks?room={test_room}&due_after=2002-01-01&status=pending').json
+        assert data['total'] == 3
+
+    def test_date_only_due_before_covers_the_whole_day(self, client, test_room, dated_tasks):
+        """Test due_before=YYYY-MM-DD includes tasks due at any time that day."""
+        assert self.titles(client, test_room, 'due_before=2030-02-01') == ["Jan", "Past", "Feb", "Late"]
+        assert self.titles(client, test_room, 'due_after=2030-02-01&due_before=2030-02-01') == ["Feb"]
+        assert self.titles(client, test_room, 'due_before=2030-02-01 11:59:59') == ["Jan", "Past", "Late"]
+
+    def test_overdue(self, client, test_room, dated_tasks):
+        """Test overdue=true selects pending past-due tasks and false the rest."""
+        assert self.titles(client, test_room, 'overdue=true') == ["Late"]
+        assert self.titles(client, test_room, 'overdue=false') == ["Mar", "None", "Jan", "Past", "Feb"]
+        response = client.get(f'/tasks?room={test_room}&overdue=true')
+        assert response.headers['ETag'] != client.get(f'/tasks?room={test_room}').headers['ETag']
+
+    def test_sorting(self, client, test_room, dated_tasks):
+        """Test due_date, priority and created_at orders, paging by sort key."""
+        assert self.titles(client, test_room, 'sort=due_date') == ["Past", "Late", "Jan", "Feb", "Mar", "None"]
+        assert self.titles(client, test_room, 'sort=priority') == ["None", "Feb", "Jan", "Late", "Mar", "Past"]
+        assert self.titles(client, test_room, 'sort=created_at&status=pending') == ["Mar", "None", "Jan", "Feb", "Late"]
+
+        data = client.get(f'/tasks?room={test_room}&sort=due_date&due_after=2001-01-01&limit=2').json
+        assert [t['title'] for t in data['tasks']] == ["Late", "Jan"]
+        assert data['total'] == 4
+        data = client.get(f'/tasks?room={test_room}&sort=due_date&due_after=2001-01-01&limit=2&cursor={data["next_cursor"]}').json
+        assert [t['title'] for t in data['tasks']] == ["Feb", "Mar"]
+        assert data['next_cursor'] is None
+
+    def test_sorted_pages_survive_changes(self, client, test_room, dated_tasks):
+        """Test a sorted page's cursor names the last task's key, so changes before it skip nothing."""
+        data = client.get(f'/tasks?room={test_room}&sort=due_date&limit=2').json
+        assert [t['title'] for t in data['tasks']] == ["Past", "Late"]
+        client.delete(f'/tasks/4?room={test_room}')
+        data = client.get(f'/tasks?room={test_room}&sort=due_date&limit=3&cursor={data["next_cursor"]}').json
+        assert [t['title'] for t in data['tasks']] == ["Jan", "Feb", "Mar"]
+        # Tasks without a due date come after the cursor of the last dated one
+        data = client.get(f'/tasks?room={test_room}&sort=due_date&limit=1&cursor={data["next_cursor"]}').json
+        assert [t['title'] for t in data['tasks']] == ["None"]
+        assert data['next_cursor'] is None
+
+        data = client.get(f'/tasks?room={test_room}&sort=priority&limit=2').json
+        assert [t['title'] for t in data['tasks']] == ["None", "Feb"]
+        client.delete(f'/tasks/2?room={test_room}')
+        data = client.get(f'/tasks?room={test_room}&sort=priority&limit=2&cursor={data["next_cursor"]}').json
+        assert [t['title'] for t in data['tasks']] == ["Jan", "Late"]
+
+        for cursor in ('3', 'soon:1', 'high:x'):
+            assert client.get(f'/tasks?room={test_room}&sort=due_date&cursor={cursor}').status_code == 400
+        assert client.get(f'/tasks?room={test_room}&sort=priority&cursor=5').status_code == 400
+
+    def test_invalid_parameters(self, client, test_room):
+        """Test malformed dates, flags and sort keys are rejected."""
+        for query in ('due_before=soon', 'due_after=2030-13-01', 'overdue=maybe', 'sort=title', 'since=1&sort=due_date'):
+            assert client.get(f'/tasks?room={test_room}&{query}').status_code == 400
+
+class TestTaskSearch:
+    """Test GET /tasks/search."""
+
+    def test_ranked_results(self, client, test_room):
+        """Test every word must match and title matches rank above description matches."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Write report", "description": "Budget numbers"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Budget report", "description": "Review it"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Budget", "description": "Nothing else"})
+
+        data = client.get(f'/tasks/search?room={test_room}&q=budget REPORT').json
+        assert [t['id'] for t in data['tasks']] == [2, 1]
+        assert data['total'] == 2
+        assert data['next_cursor'] is None
+        assert data['tasks'][0]['title'] == "Budget report"
+        assert client.get(f'/tasks/search?room={test_room}&q=missing').json['tasks'] == []
+
+    def test_index_follows_changes(self, client, test_room):
+        """Test updated, completed and deleted tasks are found by their current text only."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Old name"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Other name"})
+        client.put(f'/tasks/1?room={test_room}', json={"title": "New name"})
+        client.post(f'/tasks/1/complete?room={test_room}')
+
+        search = lambda q: [t['id'] for t in client.get(f'/tasks/search?room={test_room}&q={q}').json['tasks']]
+        assert search('old') == []
+        assert search('new') == [1]
+        client.delete(f'/tasks/1?room={test_room}')
+        assert search('name') == [2]
+        assert rooms.get(test_room)['search'].keys() == {'other', 'name'}
+
+    def test_pages_and_fields(self, client, test_room):
+        """Test limit/cursor paging through the ranking and field projection."""
+        for i in range(5):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}"})
+
+        data = client.get(f'/tasks/search?room={test_room}&q=task&limit=2&fields=title').json
+        assert data['tasks'] == [{"id": 1, "title": "Task 0"}, {"id": 2, "title": "Task 1"}]
+        assert data['total'] == 5
+        data = client.get(f'/tasks/search?room={test_room}&q=task&limit=2&cursor={data["next_cursor"]}').json
+        assert [t['id'] for t in data['tasks']] == [3, 4]
+        assert data['next_cursor'] == 4
+
+    def test_invalid_query(self, client, test_room):
+        """Test a query without words and an unknown room."""
+        assert client.get(f'/tasks/search?room={test_room}&q=').status_code == 400
+        assert client.get(f'/tasks/search?room={test_room}&q=--').status_code == 400
+        assert client.get('/tasks/search?room=NOPE99&q=x').status_code == 404
+
+class TestDeltaSync:
+    """Test GET /tasks?since=<version>."""
+
+    def test_only_changes_since_version_are_returned(self, client, test_room):
+        """Test that a delta holds modified tasks and tombstones, not the whole room."""
+        for title in ("Keep", "Change", "Remove"):
+            client.post(f'/tasks?room={test_room}', json={"title": title})
+        version = client.get(f'/tasks?room={test_room}').json['version']
+
+        client.put(f'/tasks/2?room={test_room}', json={"title": "Changed"})
+        client.delete(f'/tasks/3?room={test_room}')
+        client.post(f'/tasks?room={test_room}', json={"title": "Added"})
+
+        data = client.get(f'/tasks?room={test_room}&since={version}').json
+        assert data['full'] is False
+        assert data['version'] == version + 3
+        assert [(t['id'], t['title']) for t in data['tasks']] == [(2, "Changed"), (4, "Added")]
+        assert data['deleted'] == [3]
+        assert data['total_all'] == 3
+
+    def test_aged_out_version_returns_snapshot(self, client, test_room):
+        """Test the full-snapshot fallback when the change log cannot answer."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Task"})
+
+        data = client.get(f'/tasks?room={test_room}&since=999').json
+        assert data['full'] is True
+        assert [t['id'] for t in data['tasks']] == [1]
+
+    def test_since_rejects_filters(self, client, test_room):
+        """Test that since cannot be mixed with filtering or paging."""
+        assert client.get(f'/tasks?room={test_room}&since=1&priority=high').status_code == 400
+        assert client.get(f'/tasks?room={test_room}&since=abc').status_code == 400
+
 class TestTaskUpdate:
     """Test task update functionality."""
     
@@ -197,6 +416,60 @@ class TestTaskDeletion:
         data = json.loads(response.data)
         assert len(data['tasks']) == 0
 
+    def test_task_ids_are_not_reused(self, client, test_room):
+        """Test that ids keep increasing after a delete and list order is preserved."""
+        for title in ("First", "Second", "Third"):
+            client.post(f'/tasks?room={test_room}', json={"title": title})
+        client.delete(f'/tasks/2?room={test_room}')
+
+        response = client.post(f'/tasks?room={test_room}', json={"title": "Fourth"})
+        assert response.json['task']['id'] == 4
+
+        response = client.get(f'/rooms/{test_room}')
+        assert [t['id'] for t in response.json['tasks']] == [1, 3, 4]
+        assert 'next_task_id' not in response.json
+
+class TestBatchOperations:
+    """Test POST /tasks/batch."""
+
+    def test_batch_applies_all_operations(self, client, test_room):
+        """Test a mixed batch and its per-operation results."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Existing"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Other"})
+
+        response = client.post('/tasks/batch', json={"room_code": test_room, "operations": [
+            {"op": "create", "title": "Imported", "due_date": "2030-01-01"},
+            {"op": "update", "id": 1, "priority": "high"},
+            {"op": "complete", "id": 2},
+            {"op": "delete", "id": 1},
+        ]})
+
+        assert response.status_code == 200
+        results = response.json['results']
+        assert [(r['op'], r['status']) for r in results] == [
+            ("create", 201), ("update", 200), ("complete", 200), ("delete", 200)]
+        assert results[0]['task']['due_date'] == "2030-01-01 00:00:00"
+        assert results[3]['deleted_task']['priority'] == "high"
+
+        tasks = client.get(f'/tasks?room={test_room}').json['tasks']
+        assert [(t['id'], t['completed']) for t in tasks] == [(2, True), (3, False)]
+
+    def test_invalid_batch_applies_nothing(self, client, test_room):
+        """Test that one bad operation rejects the whole batch."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Existing"})
+
+        response = client.post(f'/tasks/batch?room={test_room}', json={"operations": [
+            {"op": "complete", "id": 1},
+            {"op": "create", "title": "Bad date", "due_date": "someday"},
+            {"op": "delete", "id": 1},
+            {"op": "update", "id": 1, "title": "Already deleted"},
+        ]})
+
+        assert response.status_code == 400
+        assert [(e['index'], e['status']) for e in response.json['errors']] == [(1, 400), (3, 404)]
+        task = client.get(f'/tasks?room={test_room}').json['tasks'][0]
+        assert task['completed'] is False
+
 class TestStatistics:
     """Test task statistics functionality."""
     
@@ -223,6 +496,556 @@ class TestStatistics:
         assert data['pending_tasks'] == 1
         assert data['completion_rate'] == 50.0
 
+    def test_stats_follow_mutations(self, client, test_room):
+        """Test overdue and priority counts as tasks are updated, completed and deleted."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Past", "priority": "High", "due_date": "2000-01-01"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Future", "due_date": "2999-01-01"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Past too", "priority": "low", "due_date": "2001-01-01"})
+
+        data = client.get(f'/tasks/stats?room={test_room}').json
+        assert data['overdue_tasks'] == 2
+        assert data['priority_counts'] == {"high": 1, "medium": 1, "low": 1}
+
+        client.put(f'/tasks/2?room={test_room}', json={"due_date": "2002-01-01", "priority": "low"})
+        client.post(f'/tasks/1/complete?room={test_room}')
+        client.delete(f'/tasks/3?room={test_room}')
+        # A rejected update must not change anything
+        client.put(f'/tasks/2?room={test_room}', json={"title": "Bad", "due_date": "soon"})
+
+        data = client.get(f'/tasks/stats?room={test_room}').json
+        assert data['total_tasks'] == 2
+        assert data['completed_tasks'] == 1
+        assert data['overdue_tasks'] == 1
+        assert data['priority_counts'] == {"high": 1, "low": 1}
+        assert client.get(f'/tasks?room={test_room}').json['tasks'][1]['title'] == "Future"
+
+class TestRoomSnapshot:
+    """Test the single-request board snapshot."""
+
+    def test_snapshot_groups_tasks_and_stats(self, client, test_room):
+        """Test columns, room metadata and stats come back together."""
+        client.post(f'/tasks?room={test_room}', json={"title": "A", "priority": "high"})
+        client.post(f'/tasks?room={test_room}', json={"title": "B", "priority": "low"})
+        client.post(f'/tasks?room={test_room}', json={"title": "C"})
+        client.post(f'/tasks?room={test_room}', json={"title": "D", "priority": "high"})
+        client.post(f'/tasks/1/complete?room={test_room}')
+
+        response = client.get(f'/rooms/{test_room}/snapshot')
+        assert response.status_code == 200
+        assert response.headers['ETag']
+        data = response.json
+        assert data['room']['code'] == test_room
+        assert 'tasks' not in data['room']
+        assert data['version'] == client.get(f'/tasks?room={test_room}').json['version']
+        columns = {name: [t['id'] for t in tasks] for name, tasks in data['columns'].items()}
+        assert columns == {"high": [4], "medium": [3], "low": [2], "completed": [1]}
+        assert data['stats'] == client.get(f'/tasks/stats?room={test_room}').json
+
+    def test_snapshot_revalidates(self, client, test_room):
+        """Test If-None-Match on an unchanged room, and a new ETag after a change."""
+        tag = client.get(f'/rooms/{test_room}/snapshot').headers['ETag']
+        assert client.get(f'/rooms/{test_room}/snapshot', headers={'If-None-Match': tag}).status_code == 304
+        client.post(f'/tasks?room={test_room}', json={"title": "New"})
+        assert client.get(f'/rooms/{test_room}/snapshot', headers={'If-None-Match': tag}).status_code == 200
+
+    def test_snapshot_unknown_room(self, client):
+        """Test snapshot of a room that does not exist."""
+        assert client.get('/rooms/NOPE99/snapshot').status_code == 404
+
+class TestStoragePersistence:
+    """Test rooms survive the cache on persistent storage engines."""
+
+    def test_room_reloads_from_storage(self, client, storage, test_room):
+        """Test a room and its tasks come back unchanged after the cache is dropped."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        client.post(f'/tasks?room={test_room}', json={"title": "Kept", "priority": "high", "due_date": "2030-01-01"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Done"})
+        client.post(f'/tasks/2/complete?room={test_room}')
+        before = client.get(f'/tasks?room={test_room}').json
+
+        assert app_module.write_queue.flush()
+        rooms.clear()
+        after = client.get(f'/tasks?room={test_room}').json
+        assert after == before
+        assert client.get(f'/tasks?room={test_room}&status=completed').json['tasks'][0]['completed'] is True
+        # Ids keep counting past what was stored
+        assert client.post(f'/tasks?room={test_room}', json={"title": "Next"}).json['task']['id'] == 3
+
+    def test_sees_writes_from_other_workers(self, client, storage, test_room):
+        """Test a newer stored version replaces the cached room without a notification."""
+        import app as app_module
+        if storage.name != 'sqlite':
+            pytest.skip("only SQLite revalidates cached rooms per request")
+        assert app_module.write_queue.flush()
+        other = app_module.SQLiteStorage(storage.path)
+        task_id, version = other.reserve(test_room, 1, 1)
+        room = other.load_room(test_room)
+        task = {"id": task_id, "title": "From elsewhere", "description": "", "priority": "low",
+                "due_date": None, "completed": False, "completed_at": None, "created_at": "2030-01-01 00:00:00"}
+        change = {"version": version + 1, "event": "task_created", "data": task}
+        assert other.write_batch([(test_room, {"room": room, "versions": 1, "upserts": {task_id: task},
+                                               "deletes": set(), "changes": [change]})])
+
+        data = client.get(f'/tasks?room={test_room}').json
+        assert [t['title'] for t in data['tasks']] == ["From elsewhere"]
+        assert data['version'] == version + 1
+
+    def test_workers_never_share_ids_or_versions(self, client, storage, test_room):
+        """Test ids and versions come from storage, so a concurrent worker's change never collides."""
+        import app as app_module
+        if storage.name != 'sqlite':
+            pytest.skip("only SQLite revalidates cached rooms per request")
+        client.post(f'/tasks?room={test_room}', json={"title": "Mine"})
+        other = app_module.SQLiteStorage(storage.path)
+        # Another worker caching the room creates a task it has not committed yet
+        assert other.reserve(test_room, 1, 1) == (2, 2)
+
+        assert client.post(f'/tasks?room={test_room}', json={"title": "Also mine"}).json['task']['id'] == 3
+        response = client.get(f'/tasks?room={test_room}')
+        assert response.json['version'] == 4
+        assert [t['id'] for t in response.json['tasks']] == [1, 3]
+        # This copy is missing version 3, so its validators are not shared with other workers
+        assert app_module.INSTANCE_ID in response.headers['ETag']
+
+        room = other.load_room(test_room)
+        task = {"id": 2, "title": "Theirs", "description": "", "priority": "low",
+                "due_date": None, "completed": False, "completed_at": None, "created_at": "2030-01-01 00:00:00"}
+        change = {"version": 3, "event": "task_created", "data": task}
+        assert other.write_batch([(test_room, {"room": room, "versions": 1, "upserts": {2: task},
+                                               "deletes": set(), "changes": [change]})])
+        assert app_module.write_queue.flush()
+
+        response = client.get(f'/tasks?room={test_room}')
+        assert [t['title'] for t in response.json['tasks']] == ["Mine", "Theirs", "Also mine"]
+        assert response.json['version'] == 4
+        assert app_module.INSTANCE_ID not in response.headers['ETag']
+        # The reloaded room replays both workers' changes from the stored log
+        delta = client.get(f'/tasks?room={test_room}&since=2').json
+        assert delta['full'] is False
+        assert [t['title'] for t in delta['tasks']] == ["Theirs", "Also mine"]
+
+    def test_change_log_is_shared_between_workers(self, client, storage, test_room, monkeypatch):
+        """Test a worker without the room's recent changes in memory replays them from storage."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        monkeypatch.setattr(app_module, 'ROOM_CHANGE_LOG_SIZE', 3)
+        monkeypatch.setattr(app_module, 'SSE_MAX_STREAM_SECONDS', 0)
+        base = client.get(f'/tasks?room={test_room}').json['version']
+        for title in ("One", "Two", "Three", "Four"):
+            client.post(f'/tasks?room={test_room}', json={"title": title})
+        client.delete(f'/tasks/1?room={test_room}')
+        assert app_module.write_queue.flush()
+        # Like a worker that has never served this room
+        rooms.clear()
+
+        delta = client.get(f'/tasks?room={test_room}&since={base + 2}').json
+        assert delta['full'] is False
+        assert [t['title'] for t in delta['tasks']] == ["Three", "Four"]
+        assert delta['deleted'] == [1]
+        body = client.get(f'/rooms/{test_room}/events',
+                          headers={'Last-Event-ID': str(base + 4)}).get_data(as_text=True)
+        assert f'id: {base + 5}\nevent: task_deleted\n' in body
+        # Only the newest ROOM_CHANGE_LOG_SIZE entries are kept
+        assert [c['version'] - base for c in storage.load_changes(test_room, 0, base + 10)] == [3, 4, 5]
+        assert client.get(f'/tasks?room={test_room}&since={base + 1}').json['full'] is True
+
+    def test_stale_snapshot_keeps_other_workers_members(self, client, storage, test_room):
+        """Test a worker flushing an older member list adds to the stored one instead of replacing it."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        assert app_module.write_queue.flush()
+        stale = storage.load_room(test_room)
+        client.post(f'/rooms/{test_room}/join', json={"username": "Bob"})
+        assert app_module.write_queue.flush()
+
+        # Another worker that cached the room before Bob joined lets Carol in
+        _, version = storage.reserve(test_room, 0, 1)
+        stale['members'] = stale['members'] + ["Carol"]
+        change = {"version": version + 1, "event": "member_joined", "data": {"username": "Carol"}}
+        assert storage.write_batch([(test_room, {"room": stale, "versions": 1, "upserts": {},
+                                                 "deletes": set(), "changes": [change]})])
+        assert storage.load_room(test_room)['members'] == ["testuser", "Bob", "Carol"]
+
+    def test_lost_versions_are_given_up_after_the_lease(self, client, storage, test_room, monkeypatch):
+        """Test a room whose reserved versions were never committed stops being partial."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        assert app_module.write_queue.flush()
+        # A worker reserves a version, then dies before flushing it
+        _, version = storage.reserve(test_room, 0, 1)
+        assert storage.load_room(test_room)['partial'] is True
+
+        monkeypatch.setattr(app_module, 'RESERVE_LEASE_SECONDS', 0)
+        room = storage.load_room(test_room)
+        assert room['partial'] is False
+        assert room['version'] == version + 1
+        # A flush arriving after all does not count past the reserved versions
+        change = {"version": version + 1, "event": "member_joined", "data": {"username": "Late"}}
+        assert storage.write_batch([(test_room, {"room": room, "versions": 1, "upserts": {},
+                                                 "deletes": set(), "changes": [change]})])
+        assert storage.load_room(test_room)['partial'] is False
+        if storage.name == 'sqlite':
+            assert storage.room_version(test_room) == (version + 1, version + 1)
+
+    def test_mutations_share_a_reserved_block(self, client, storage, test_room, monkeypatch):
+        """Test a block of ids and versions serves several mutations with one reservation."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage allocates ids in process")
+        monkeypatch.setattr(app_module, 'RESERVE_BLOCK_SIZE', 4)
+        monkeypatch.setattr(app_module, 'SSE_MAX_STREAM_SECONDS', 0)
+        reservations = []
+        reserve = storage.reserve
+        monkeypatch.setattr(storage, 'reserve', lambda *args: reservations.append(args) or reserve(*args))
+        base = client.get(f'/tasks?room={test_room}').json['version']
+
+        for title in ("One", "Two", "Three"):
+            client.post(f'/tasks?room={test_room}', json={"title": title})
+        assert len(reservations) == 1
+        client.post(f'/tasks?room={test_room}', json={"title": "Four"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Five"})
+        assert len(reservations) == 2
+        assert [t['id'] for t in client.get(f'/tasks?room={test_room}').json['tasks']] == [1, 2, 3, 4, 5]
+
+        # Dropping the cached copy gives back the unused versions, so nothing is missing
+        rooms.clear()
+        assert app_module.write_queue.flush()
+        room = storage.load_room(test_room)
+        assert room['partial'] is False
+        assert room['version'] == base + 8
+        delta = client.get(f'/tasks?room={test_room}&since={base}').json
+        assert delta['full'] is False
+        assert [t['title'] for t in delta['tasks']] == ["One", "Two", "Three", "Four", "Five"]
+        body = client.get(f'/rooms/{test_room}/events',
+                          headers={'Last-Event-ID': str(base)}).get_data(as_text=True)
+        assert body.count('event: task_created') == 5
+        assert app_module.RELEASED_EVENT not in body
+
+    def test_reservation_elsewhere_ends_the_block(self, client, storage, test_room, monkeypatch):
+        """Test a worker stops using its block once another worker reserves after it."""
+        import app as app_module
+        if storage.name != 'sqlite':
+            pytest.skip("only SQLite checks the block per mutation; Postgres is notified")
+        monkeypatch.setattr(app_module, 'RESERVE_BLOCK_SIZE', 4)
+        base = client.get(f'/tasks?room={test_room}').json['version']
+        client.post(f'/tasks?room={test_room}', json={"title": "Mine"})
+        other = app_module.SQLiteStorage(storage.path)
+        assert other.reserve(test_room, 1, 1) == (5, base + 4)
+
+        assert client.post(f'/tasks?room={test_room}', json={"title": "Also mine"}).json['task']['id'] == 6
+        assert app_module.write_queue.flush()
+        versions = [c['version'] - base for c in storage.load_changes(test_room, base, base + 10)]
+        # Version 5 is the other worker's, not yet committed
+        assert versions == [1, 2, 3, 4, 6]
+
+    def test_null_description_is_stored_empty(self, client, storage, test_room):
+        """Test that a null description does not leave a change that can never be written."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        created = client.post(f'/tasks?room={test_room}', json={"title": "x", "description": None})
+        assert created.json['task']['description'] == ''
+        client.put(f'/tasks/1?room={test_room}', json={"description": None})
+
+        assert app_module.write_queue.flush()
+        assert app_module.write_queue.stats()['quarantined_rooms'] == 0
+        rooms.clear()
+        assert client.get(f'/tasks?room={test_room}').json['tasks'][0]['description'] == ''
+
+    def test_unreachable_storage_rejects_mutations(self, client, storage, test_room, monkeypatch):
+        """Test that nothing is applied when ids and versions cannot be reserved."""
+        if not storage.persistent:
+            pytest.skip("memory storage allocates ids in process")
+        monkeypatch.setattr(storage, 'reserve', lambda *args: None)
+        monkeypatch.setattr(storage, 'create_room', lambda room: None)
+
+        assert client.post(f'/tasks?room={test_room}', json={"title": "Task"}).status_code == 503
+        assert client.post('/rooms', json={"username": "Bob"}).status_code == 503
+        data = client.get(f'/tasks?room={test_room}').json
+        assert data['tasks'] == []
+        assert data['version'] == 1
+
+class TestTaskModel:
+    """Test the compact in-memory task representation."""
+
+    def test_timestamps_round_trip(self):
+        """Test timestamps are held as integers and formatted back unchanged."""
+        data = {"id": 1, "title": "Task", "description": "", "priority": "high",
+                "due_date": "2030-02-28 23:59:59", "completed": True,
+                "completed_at": "2026-01-02 03:04:05", "created_at": "1969-12-31 23:00:00"}
+        task = Task.from_dict(data)
+        assert isinstance(task.due_date, int) and isinstance(task.created_at, int)
+        assert task.due_date > task.completed_at > task.created_at
+        assert task.to_dict() == data
+        assert not hasattr(task, '__dict__')
+
+    def test_api_formats_timestamps(self, client, test_room):
+        """Test responses and stored rows carry formatted timestamps."""
+        task = client.post(f'/tasks?room={test_room}', json={"title": "Due", "due_date": "2030-01-01"}).json['task']
+        assert task['due_date'] == "2030-01-01 00:00:00"
+        assert datetime.strptime(task['created_at'], '%Y-%m-%d %H:%M:%S')
+        completed = client.post(f'/tasks/1/complete?room={test_room}').json['task']
+        assert datetime.strptime(completed['completed_at'], '%Y-%m-%d %H:%M:%S')
+        assert client.get(f'/tasks?room={test_room}').json['tasks'] == [completed]
+
+class TestJsonEncoding:
+    """Test cached task JSON and response assembly."""
+
+    def test_encode_json_splices_raw_fragments(self):
+        """Test pre-encoded values are copied in verbatim, including inside nested dicts."""
+        from app import RawJSON, encode_json
+        body = encode_json({"a": RawJSON((b'[1, ', b'2]')), "b": {"c": RawJSON((b'{}',)), "d": "\u00e9"}, "e": [None]})
+        assert json.loads(body) == {"a": [1, 2], "b": {"c": {}, "d": "\u00e9"}, "e": [None]}
+        assert b'[1, 2]' in body
+
+    def test_task_json_is_invalidated_on_change(self, client, test_room):
+        """Test a listed task is cached and re-encoded after it changes."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Old"})
+        client.post(f'/tasks?room={test_room}', json={"title": "Other"})
+        assert [t['title'] for t in client.get(f'/rooms/{test_room}').json['tasks']] == ["Old", "Other"]
+        cache = rooms.get(test_room)['task_json']
+        assert set(cache) == {1, 2}
+
+        client.put(f'/tasks/1?room={test_room}', json={"title": "New"})
+        assert set(cache) == {2}
+        assert client.get(f'/tasks?room={test_room}').json['tasks'][0]['title'] == "New"
+        assert client.get(f'/rooms/{test_room}').json['tasks'][0]['title'] == "New"
+        client.post(f'/tasks/1/complete?room={test_room}')
+        assert client.get(f'/rooms/{test_room}/snapshot').json['columns']['completed'][0]['title'] == "New"
+
+class TestStreamingResponses:
+    """Test large listings are streamed with the same content."""
+
+    def test_large_listings_are_streamed(self, client, test_room, monkeypatch):
+        """Test GET /tasks and GET /rooms/<code> stream above the threshold."""
+        import app as app_module
+        for i in range(5):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}", "priority": "high" if i % 2 else "low"})
+        small = client.get(f'/tasks?room={test_room}')
+        assert 'Content-Length' in small.headers
+
+        monkeypatch.setattr(app_module, 'STREAM_THRESHOLD_TASKS', 2)
+        response = client.get(f'/tasks?room={test_room}')
+        assert 'Content-Length' not in response.headers
+        assert response.headers['ETag'] == small.headers['ETag']
+        assert response.json == small.json
+
+        projected = client.get(f'/tasks?room={test_room}&priority=low&fields=title').json
+        assert projected['tasks'] == [{"id": 1, "title": "Task 0"}, {"id": 3, "title": "Task 2"},
+                                      {"id": 5, "title": "Task 4"}]
+        assert projected['total'] == 3
+
+        room = client.get(f'/rooms/{test_room}')
+        assert 'Content-Length' not in room.headers
+        assert [t['id'] for t in room.json['tasks']] == [1, 2, 3, 4, 5]
+
+    def test_streamed_page_keeps_cursor(self, client, test_room, monkeypatch):
+        """Test keyset paging still reports the next cursor when streaming."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'STREAM_THRESHOLD_TASKS', 1)
+        for i in range(4):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}"})
+        data = client.get(f'/tasks?room={test_room}&limit=3').json
+        assert [t['id'] for t in data['tasks']] == [1, 2, 3]
+        assert data['next_cursor'] == 3
+
+    def test_listing_is_read_from_the_cached_room(self, client, storage, test_room):
+        """Test a reloaded room's listing is encoded from its task fragments, not fetched as rows."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage keeps nothing outside the cache")
+        for i in range(3):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}"})
+        assert app_module.write_queue.flush()
+        rooms.clear()
+
+        data = client.get(f'/tasks?room={test_room}&status=pending&limit=2').json
+        assert [t['title'] for t in data['tasks']] == ["Task 0", "Task 1"]
+        assert set(rooms.get(test_room)['task_json']) == {1, 2}
+
+class TestCompression:
+    """Test negotiated response compression."""
+
+    @pytest.fixture
+    def big_room(self, client, test_room):
+        for i in range(30):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}", "description": "Repeated text " * 5})
+        return test_room
+
+    def test_gzip_above_threshold(self, client, big_room):
+        """Test gzip is applied to large bodies and the content is unchanged."""
+        import gzip
+        plain = client.get(f'/tasks?room={big_room}')
+        assert 'Content-Encoding' not in plain.headers
+        response = client.get(f'/tasks?room={big_room}', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert len(response.data) < len(plain.data)
+        assert json.loads(gzip.decompress(response.data)) == plain.json
+        assert response.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+
+    def test_brotli_is_preferred(self, client, big_room):
+        """Test br wins when the client accepts both codings."""
+        brotli = pytest.importorskip('brotli')
+        response = client.get(f'/rooms/{big_room}', headers={'Accept-Encoding': 'gzip, deflate, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert json.loads(brotli.decompress(response.data))['code'] == big_room
+
+    def test_small_bodies_are_not_compressed(self, client, test_room):
+        """Test bodies under the threshold are sent as-is."""
+        response = client.get(f'/tasks/stats?room={test_room}', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compressed_body_reused_until_room_changes(self, client, big_room):
+        """Test the cache serves an unchanged room and revalidation accepts the coded ETag."""
+        from app import compressed_bodies
+        headers = {'Accept-Encoding': 'gzip'}
+        first = client.get(f'/tasks?room={big_room}', headers=headers)
+        hits = compressed_bodies.stats()['hits']
+        second = client.get(f'/tasks?room={big_room}', headers=headers)
+        assert second.data == first.data
+        assert compressed_bodies.stats()['hits'] == hits + 1
+
+        cached = client.get(f'/tasks?room={big_room}', headers={**headers, 'If-None-Match': first.headers['ETag']})
+        assert cached.status_code == 304
+        assert cached.headers['ETag'] == first.headers['ETag']
+
+        client.post(f'/tasks?room={big_room}', json={"title": "Change"})
+        third = client.get(f'/tasks?room={big_room}', headers=headers)
+        assert third.headers['ETag'] != first.headers['ETag']
+
+    def test_streamed_listing_is_compressed(self, client, big_room, monkeypatch):
+        """Test streamed listings are compressed as they are sent."""
+        import gzip
+        import app as app_module
+        plain = client.get(f'/tasks?room={big_room}').json
+        monkeypatch.setattr(app_module, 'STREAM_THRESHOLD_TASKS', 5)
+        response = client.get(f'/tasks?room={big_room}', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Length' not in response.headers
+        assert json.loads(gzip.decompress(response.data)) == plain
+
+class TestConditionalRequests:
+    """Test ETag validators backed by room versions."""
+
+    def test_unchanged_room_returns_not_modified(self, client, test_room):
+        """Test that a matching If-None-Match gets a 304 on every read endpoint."""
+        for url in (f'/rooms/{test_room}', f'/tasks?room={test_room}', f'/tasks/stats?room={test_room}'):
+            response = client.get(url)
+            etag = response.headers['ETag']
+
+            response = client.get(url, headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+
+    def test_mutation_changes_etag(self, client, test_room):
+        """Test that a task mutation invalidates previously issued validators."""
+        etag = client.get(f'/tasks?room={test_room}').headers['ETag']
+        client.post(f'/tasks?room={test_room}', json={"title": "New task"})
+
+        response = client.get(f'/tasks?room={test_room}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert len(response.json['tasks']) == 1
+
+    def test_etag_depends_on_query(self, client, test_room):
+        """Test that differently filtered listings do not share a validator."""
+        all_tasks = client.get(f'/tasks?room={test_room}').headers['ETag']
+        high_only = client.get(f'/tasks?room={test_room}&priority=high').headers['ETag']
+        assert all_tasks != high_only
+
+class TestConcurrentRequests:
+    """Test that request threads sharing a cached room do not race."""
+
+    def test_reads_and_writes_from_many_threads(self, client, test_room):
+        """Test that listings, searches and stats stay consistent while tasks change."""
+        import sys
+        import threading
+        from app import app
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often enough to hit the races
+
+        for i in range(200):
+            client.post(f'/tasks?room={test_room}', json={"title": f"Task {i}", "priority": "high"})
+
+        failures = []
+
+        def writer(offset):
+            own = app.test_client()
+            for i in range(20):
+                response = own.post(f'/tasks?room={test_room}', json={"title": f"New {offset} {i}"})
+                task_id = response.json['task']['id'] if response.status_code == 201 else None
+                if task_id is None:
+                    failures.append(response.status_code)
+                    continue
+                for response in (own.post(f'/tasks/{task_id}/complete?room={test_room}'),
+                                 own.delete(f'/tasks/{task_id}?room={test_room}')):
+                    if response.status_code != 200:
+                        failures.append(response.status_code)
+
+        def reader():
+            own = app.test_client()
+            for _ in range(10):
+                for url in (f'/tasks?room={test_room}', f'/tasks/search?room={test_room}&q=task',
+                            f'/rooms/{test_room}', f'/rooms/{test_room}/snapshot',
+                            f'/tasks/stats?room={test_room}'):
+                    response = own.get(url)
+                    if response.status_code not in (200, 304):
+                        failures.append(response.status_code)
+
+        def run(work, *args):
+            try:
+                work(*args)
+            except Exception as e:  # streamed bodies raise while the client reads them
+                failures.append(repr(e))
+
+        threads = [threading.Thread(target=run, args=(writer, n)) for n in range(4)]
+        threads += [threading.Thread(target=run, args=(reader,)) for _ in range(4)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+
+        assert failures == []
+        listing = client.get(f'/tasks?room={test_room}').json['tasks']
+        stats = client.get(f'/tasks/stats?room={test_room}').json
+        assert len(listing) == 200
+        assert stats['total_tasks'] == len(listing)
+
+class TestEventStream:
+    """Test the Server-Sent Events change feed."""
+
+    @pytest.fixture(autouse=True)
+    def short_streams(self, monkeypatch):
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_MAX_STREAM_SECONDS', 0)
+
+    def test_resume_from_last_event_id(self, client, test_room):
+        """Test that a reconnecting client receives only the changes it missed."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Task"})
+        client.post(f'/tasks/1/complete?room={test_room}')
+        client.post(f'/rooms/{test_room}/join', json={"username": "Bob"})
+
+        response = client.get(f'/rooms/{test_room}/events', headers={'Last-Event-ID': '2'})
+        assert response.mimetype == 'text/event-stream'
+        body = response.get_data(as_text=True)
+        assert 'task_created' not in body
+        assert 'id: 3\nevent: task_completed\n' in body
+        assert 'id: 4\nevent: member_joined\n' in body
+        assert '"Bob"' in body
+
+    def test_unknown_version_requests_resync(self, client, test_room):
+        """Test that a version outside the change log tells the client to reload."""
+        body = client.get(f'/rooms/{test_room}/events?last_event_id=99').get_data(as_text=True)
+        assert 'event: resync' in body
+
 class TestHealthCheck:
     """Test health check endpoint."""
     
@@ -235,6 +1058,219 @@ class TestHealthCheck:
         assert data['status'] == 'healthy'
         assert 'timestamp' in data
         assert 'version' in data
+        assert data['uptime_seconds'] >= 0
+
+    def test_ready_reflects_database(self, client, monkeypatch):
+        """Test /ready fails while the database is unreachable, behind or not in use, unlike /health."""
+        import app as app_module
+        engine = app_module.PostgresStorage()
+        monkeypatch.setattr(app_module, 'configured_storage', engine)
+        # This worker serves from another engine and is not due to retry yet
+        monkeypatch.setattr(app_module, '_storage_retry_at', float('inf'))
+        monkeypatch.setattr(app_module, 'current_schema_version', lambda: None)
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.json['database'] == 'unreachable'
+        assert client.get('/health').status_code == 200
+
+        monkeypatch.setattr(app_module, 'current_schema_version', lambda: app_module.SCHEMA_VERSION - 1)
+        assert client.get('/ready').status_code == 503
+
+        monkeypatch.setattr(app_module, 'current_schema_version', lambda: app_module.SCHEMA_VERSION)
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.json['active_storage'] != 'postgres'
+
+        monkeypatch.setattr(app_module, 'storage', engine)
+        monkeypatch.setattr(app_module.invalidation_listener, 'start', lambda: None)
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.json['status'] == 'ready'
+
+        # An explicitly configured memory engine has nothing to wait for
+        memory = app_module.MemoryStorage()
+        monkeypatch.setattr(app_module, 'configured_storage', memory)
+        monkeypatch.setattr(app_module, 'storage', memory)
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.json['storage'] == 'memory'
+        assert response.json['database'] == 'none'
+
+class TestMetrics:
+    """Test the Prometheus /metrics endpoint."""
+
+    @pytest.fixture
+    def registry(self):
+        return pytest.importorskip('prometheus_client').REGISTRY
+
+    def test_requests_are_counted_by_route(self, client, test_room, registry):
+        """Test requests are labelled by route template, not by the room or task in the path."""
+        labels = {'method': 'GET', 'route': '/rooms/<room_code>', 'status': '200'}
+        before = registry.get_sample_value('taskmanager_http_requests_total', labels) or 0
+        client.get(f'/rooms/{test_room}')
+        client.get(f'/rooms/{test_room}')
+        assert registry.get_sample_value('taskmanager_http_requests_total', labels) == before + 2
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain')
+        body = response.get_data(as_text=True)
+        assert 'route="/rooms/<room_code>"' in body
+        assert test_room not in body
+        assert 'taskmanager_http_requests_in_progress' in body
+
+    def test_storage_operations_are_timed(self, client, test_room, storage, registry):
+        """Test the storage engine's calls are recorded per operation."""
+        import app as app_module
+        labels = {'engine': storage.name, 'operation': 'load_room'}
+        before = registry.get_sample_value('taskmanager_db_operation_duration_seconds_count', labels) or 0
+        app_module.rooms.clear()
+        client.get(f'/rooms/{test_room}')
+        after = registry.get_sample_value('taskmanager_db_operation_duration_seconds_count', labels) or 0
+        # The memory engine has nothing to time
+        assert after == (before if storage.name == 'memory' else before + 1)
+
+    def test_room_cache_lookups(self, client, test_room, registry):
+        """Test cache hits reach the metrics once refreshed, counted only once."""
+        import app as app_module
+        app_module.refresh_metrics()
+        before = registry.get_sample_value('taskmanager_room_cache_lookups_total', {'result': 'hit'})
+        client.get(f'/rooms/{test_room}')
+        app_module.refresh_metrics()
+        app_module.refresh_metrics()
+        assert registry.get_sample_value('taskmanager_room_cache_lookups_total', {'result': 'hit'}) == before + 1
+        assert registry.get_sample_value('taskmanager_room_cache_rooms') == len(app_module.rooms)
+
+    def test_without_prometheus_client(self, client, monkeypatch):
+        """Test the endpoint reports it is unavailable and requests still succeed."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'prometheus_client', None)
+        response = client.get('/metrics')
+        assert response.status_code == 501
+        assert 'prometheus_client' in response.json['error']
+
+    def test_import_creates_multiprocess_directory(self, tmp_path, registry):
+        """Test entry points other than gunicorn can start with PROMETHEUS_MULTIPROC_DIR set."""
+        import subprocess
+        import sys
+        path = tmp_path / 'metrics'
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(path))
+        result = subprocess.run([sys.executable, '-c', 'import app'], env=env, capture_output=True, timeout=30)
+        assert result.returncode == 0, result.stderr
+        assert path.is_dir()
+
+class TestStartup:
+    """Test lazy startup and the migration runner."""
+
+    class FakeDatabase:
+        """Connection and cursor stand-in that tracks schema_migrations rows."""
+
+        def __init__(self):
+            self.applied = set()
+            self.statements = []
+            self._row = None
+
+        def cursor(self):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def execute(self, sql, params=None):
+            self.statements.append(sql)
+            self._row = None
+            if 'FROM schema_migrations WHERE' in sql:
+                self._row = (1,) if params[0] in self.applied else None
+            elif 'INSERT INTO schema_migrations' in sql:
+                self.applied.add(params[0])
+
+        def fetchone(self):
+            return self._row
+
+        def fetchall(self):
+            return []
+
+        def commit(self):
+            pass
+
+    def test_import_does_not_touch_database(self):
+        """Test importing the app opens no connection and runs no DDL."""
+        import subprocess
+        import sys
+        env = dict(os.environ, DB_HOST='192.0.2.1', DB_CONNECT_TIMEOUT='30')
+        result = subprocess.run(
+            [sys.executable, '-c', 'import app; assert app._pool is None and app.configured_storage is None'],
+            env=env, capture_output=True, timeout=10
+        )
+        assert result.returncode == 0, result.stderr
+
+    def test_migrations_apply_once_in_order(self, monkeypatch):
+        """Test each migration runs once and is recorded; a second run is a no-op."""
+        from contextlib import contextmanager
+        import app as app_module
+        db = self.FakeDatabase()
+
+        @contextmanager
+        def fake_connection():
+            yield db
+
+        monkeypatch.setattr(app_module, 'db_connection', fake_connection)
+        versions = [v for v, _, _ in app_module.MIGRATIONS]
+        assert versions == sorted(set(versions))
+        assert app_module.run_migrations() == versions
+        assert db.applied == set(versions)
+
+        executed = len(db.statements)
+        assert app_module.run_migrations() == []
+        assert not any('CREATE TABLE IF NOT EXISTS rooms' in s for s in db.statements[executed:])
+
+    def test_unmigrated_database_falls_back_to_memory(self, monkeypatch):
+        """Test a reachable database with an old schema is not used."""
+        import app as app_module
+        monkeypatch.setattr(app_module, '_storage_pid', None)
+        monkeypatch.setattr(app_module, 'current_schema_version', lambda: 0)
+        monkeypatch.setattr(app_module, 'STORAGE_BACKEND', 'postgres')
+        app_module.init_storage()
+        assert app_module.configured_storage.name == 'postgres'
+        assert app_module.storage.persistent is False
+        assert app_module.write_queue.enabled is False
+
+    def test_task_list_indexes_are_dropped(self, tmp_path):
+        """Test migrating SQLite leaves only the indexes queries use; task lists are filtered in memory."""
+        import app as app_module
+        engine = app_module.SQLiteStorage(str(tmp_path / 'tasks.db'))
+        assert engine.migrate() is not None
+        indexes = {row[0] for row in engine._connection().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL")}
+        assert indexes == set()
+
+    def test_memory_fallback_recovers_once_migrated(self, tmp_path, monkeypatch):
+        """Test a worker that fell back to memory switches to its storage engine later, keeping its rooms."""
+        import app as app_module
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(app_module, '_storage_pid', None)
+        monkeypatch.setattr(app_module, 'configured_storage', None)
+        monkeypatch.setattr(app_module, 'STORAGE_BACKEND', 'sqlite')
+        client = app.test_client()
+        app_module.init_storage()
+        assert app_module.storage.name == 'memory'
+
+        room_code = client.post('/rooms', json={"username": "Alice"}).json['room_code']
+        client.post(f'/tasks?room={room_code}', json={"title": "Made during the outage"})
+        assert client.get('/ready').status_code == 503
+
+        assert app_module.make_storage().migrate() is not None
+        monkeypatch.setattr(app_module, '_storage_retry_at', 0.0)
+        try:
+            data = client.get(f'/tasks?room={room_code}').json
+            assert app_module.storage.name == 'sqlite'
+            assert [t['title'] for t in data['tasks']] == ["Made during the outage"]
+            assert client.get('/ready').status_code == 200
+        finally:
+            app_module.use_storage(app_module.MemoryStorage())
 
 class TestErrorHandling:
     """Test error handling."""
@@ -259,4 +1295,417 @@ class TestErrorHandling:
         
         assert response.status_code == 404
         data = json.loads(response.data)
-        assert 'error' in data
\ No newline at end of file
+        assert 'error' in data
+
+    def test_non_text_fields_are_rejected(self, client, test_room):
+        """Test that a title, description or priority that is not a string is a 400, not a half-made task."""
+        for body in ({"title": 123}, {"title": None}, {"title": "x", "description": ["a"]},
+                     {"title": "x", "priority": 3}):
+            assert client.post(f'/tasks?room={test_room}', json=body).status_code == 400
+        response = client.post(f'/tasks/batch?room={test_room}', json={"operations": [{"op": "create", "title": 1}]})
+        assert response.status_code == 400
+        assert response.json['errors'][0]['error'] == "title must be a string"
+        assert client.get(f'/tasks?room={test_room}').json['tasks'] == []
+
+        client.post(f'/tasks?room={test_room}', json={"title": "Task"})
+        assert client.put(f'/tasks/1?room={test_room}', json={"title": {"a": 1}}).status_code == 400
+        assert client.delete(f'/tasks/1?room={test_room}').status_code == 200
+
+    def test_non_object_bodies_are_rejected(self, client, test_room):
+        """Test that a JSON list or scalar body is a 400, not a server error."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Task"})
+        for body in (["title"], "title", 3, True):
+            response = client.post(f'/tasks?room={test_room}', json=body)
+            assert response.status_code == 400
+            assert response.json['error'] == "Request body must be a JSON object"
+            assert client.put(f'/tasks/1?room={test_room}', json=body).status_code == 400
+            assert client.post('/rooms', json=body).status_code == 400
+            assert client.post(f'/rooms/{test_room}/join', json=body).status_code == 400
+            assert client.post(f'/tasks/batch?room={test_room}', json=body).status_code == 400
+        assert [t['title'] for t in client.get(f'/tasks?room={test_room}').json['tasks']] == ["Task"]
+
+class TestConnectionPool:
+    """Test the per-worker database connection pool."""
+
+    class FakeConnection:
+        """Minimal stand-in for a psycopg2 connection."""
+
+        def __init__(self):
+            self.closed = 0
+            self.info = type('Info', (), {'transaction_status': 0})()
+
+        def close(self):
+            self.closed = 1
+
+        def rollback(self):
+            pass
+
+    def make_pool(self, **kwargs):
+        from app import ConnectionPool
+        return ConnectionPool(connect=self.FakeConnection, **kwargs)
+
+    def test_connections_are_reused(self):
+        """Test that a released connection is handed out again."""
+        pool = self.make_pool(maxconn=2)
+        conn = pool.acquire()
+        pool.release(conn)
+
+        assert pool.acquire() is conn
+        stats = pool.stats()
+        assert stats['connections_created'] == 1
+        assert stats['checkouts'] == 2
+        assert stats['in_use'] == 1
+
+    def test_acquire_times_out_when_exhausted(self):
+        """Test that acquire gives up after the max wait when the pool is full."""
+        from app import PoolTimeout
+        pool = self.make_pool(maxconn=1, timeout=0.05)
+        pool.acquire()
+
+        with pytest.raises(PoolTimeout):
+            pool.acquire()
+        assert pool.stats()['timeouts'] == 1
+
+    def test_closed_connections_are_replaced(self):
+        """Test that a connection closed while idle is not handed out."""
+        pool = self.make_pool(maxconn=1)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.close()
+
+        assert pool.acquire() is not conn
+        assert pool.stats()['connections_created'] == 2
+
+    def test_pool_is_recreated_after_fork(self, monkeypatch):
+        """Test that a pool inherited from another process is not reused."""
+        import app as app_module
+        inherited = self.make_pool()
+        inherited.pid = -1
+        fresh = self.make_pool(minconn=0)
+        monkeypatch.setattr(app_module, '_pool', inherited)
+        monkeypatch.setattr(app_module, 'ConnectionPool', lambda: fresh)
+
+        assert app_module.get_pool() is fresh
+        assert app_module.get_pool().pid == os.getpid()
+        assert inherited in app_module._inherited_pools
+        app_module._inherited_pools.remove(inherited)
+
+class TestWriteBehindQueue:
+    """Test batching and coalescing of persisted mutations."""
+
+    def make_queue(self, results=None, **kwargs):
+        from app import WriteBehindQueue
+        batches = []
+
+        def writer(batch):
+            batches.append(batch)
+            return results.pop(0) if results else True
+
+        return WriteBehindQueue(writer=writer, retry_delay=0, **kwargs), batches
+
+    def test_mutations_are_group_committed(self):
+        """Test that changes to several rooms share one transaction and coalesce per task."""
+        queue, batches = self.make_queue(max_latency=0.5)
+        room = {"code": "AAA111", "owner": "Alice", "members": ["Alice"],
+                "created_at": "2025-01-01 00:00:00", "next_task_id": 1, "version": 1}
+        queue.mark_room(room)
+        queue.mark_task("AAA111", Task(1, "First"))
+        queue.mark_task("AAA111", Task(1, "Renamed"))
+        queue.mark_task("BBB222", Task(1, "Other room"))
+        queue.mark_deleted("BBB222", 2)
+
+        assert queue.has_pending("AAA111")
+        assert queue.flush(timeout=5)
+        assert not queue.has_pending("AAA111")
+        assert len(batches) == 1
+        changes = dict(batches[0])
+        assert changes["AAA111"]["room"]["members"] == ["Alice"]
+        assert changes["AAA111"]["upserts"][1]["title"] == "Renamed"
+        assert changes["BBB222"]["deletes"] == {2}
+
+    def test_failed_batch_is_retried(self):
+        """Test that a batch whose commit failed is written again."""
+        queue, batches = self.make_queue(results=[False, True], max_latency=0)
+        queue.mark_task("AAA111", Task(1, "Task"))
+
+        assert queue.flush(timeout=5)
+        assert len(batches) == 2
+        assert queue.stats()["failed_batches"] == 1
+        assert queue.stats()["rooms_flushed"] == 1
+
+    def test_unwritable_room_is_quarantined(self):
+        """Test that a change that can never commit is dropped without holding back other rooms."""
+        from app import WriteBehindQueue, PermanentWriteError
+        written, dropped = [], []
+
+        def writer(batch):
+            if any(room_code == "BAD000" for room_code, _ in batch):
+                raise PermanentWriteError("null value in column \"title\"")
+            written.extend(room_code for room_code, _ in batch)
+            return True
+
+        queue = WriteBehindQueue(writer=writer, retry_delay=0, max_latency=0.5,
+                                 on_quarantine=dropped.append)
+        for room_code in ("AAA111", "BAD000", "BBB222", "CCC333"):
+            queue.mark_task(room_code, Task(1, "Task"))
+
+        assert queue.flush(timeout=5)
+        assert sorted(written) == ["AAA111", "BBB222", "CCC333"]
+        assert dropped == ["BAD000"]
+        assert [room_code for room_code, _, _ in queue.quarantined] == ["BAD000"]
+        stats = queue.stats()
+        assert (stats['quarantined_rooms'], stats['failed_batches']) == (1, 0)
+
+    def test_timed_out_flush_keeps_group_commit(self):
+        """Test that a flush that gave up does not leave the flusher committing every change alone."""
+        import time
+        from app import WriteBehindQueue
+        available, batches = [False], []
+
+        def writer(batch):
+            if available[0]:
+                batches.append(batch)
+            return available[0]
+
+        queue = WriteBehindQueue(writer=writer, retry_delay=0.01, max_latency=0.5)
+        queue.mark_task("AAA111", Task(1, "Task"))
+        assert not queue.flush(timeout=0.1)
+        available[0] = True
+        while queue.has_pending("AAA111"):
+            time.sleep(0.01)
+
+        queue.mark_task("AAA111", Task(2, "Task"))
+        time.sleep(0.05)
+        queue.mark_task("BBB222", Task(1, "Task"))
+        assert queue.flush(timeout=5)
+        assert len(batches) == 2
+        assert [room_code for room_code, _ in batches[1]] == ["AAA111", "BBB222"]
+
+    def test_writer_errors_do_not_stop_the_flusher(self):
+        """Test that an unexpected writer exception is retried instead of killing the flusher."""
+        from app import WriteBehindQueue
+        calls = []
+
+        def writer(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            return True
+
+        queue = WriteBehindQueue(writer=writer, retry_delay=0, max_latency=0)
+        queue.mark_task("AAA111", Task(1, "Task"))
+
+        assert queue.flush(timeout=5)
+        assert len(calls) == 2
+        assert not queue.has_pending("AAA111")
+        assert queue.stats()["failed_batches"] == 1
+
+    def test_disabled_queue_drops_changes(self):
+        """Test that nothing is queued when the database is unavailable."""
+        queue, batches = self.make_queue(enabled=False)
+        queue.mark_task("AAA111", Task(1, "Task"))
+
+        assert not queue.has_pending("AAA111")
+        assert queue.close()
+        assert batches == []
+
+class TestRoomCache:
+    """Test the bounded room cache."""
+
+    @staticmethod
+    def room(code, tasks=0):
+        return {"code": code, "owner": "", "members": [], "task_bytes": 20 * tasks,
+                "tasks": [{"id": i} for i in range(tasks)]}
+
+    def test_least_recently_used_room_is_evicted(self):
+        """Test LRU eviction once the entry limit is reached."""
+        from app import RoomCache
+        cache = RoomCache(max_entries=2)
+        cache['A'] = self.room('A')
+        cache['B'] = self.room('B')
+        cache.get('A')
+        cache['C'] = self.room('C')
+
+        assert 'A' in cache and 'C' in cache
+        assert 'B' not in cache
+        assert cache.stats()['evictions'] == 1
+
+    def test_byte_budget_and_pinned_rooms(self):
+        """Test that the byte budget evicts rooms unless they have unflushed writes."""
+        from app import RoomCache
+        pinned = {'A'}
+        cache = RoomCache(max_bytes=200, is_pinned=lambda code: code in pinned)
+        cache['A'] = self.room('A', tasks=10)
+        cache['B'] = self.room('B', tasks=10)
+
+        assert 'A' in cache
+        assert 'B' not in cache
+
+    def test_held_room_stays_until_released(self):
+        """Test a room a request still holds is neither expired nor evicted."""
+        from app import RoomCache
+        now = [0.0]
+        dropped = []
+        cache = RoomCache(max_entries=1, ttl=10, clock=lambda: now[0], on_drop=lambda room: dropped.append(room['code']))
+        cache['A'] = self.room('A')
+        held = cache.get('A', hold=True)
+        cache['B'] = self.room('B')
+        now[0] = 20
+
+        assert cache.get('A') is held
+        assert 'B' not in cache
+        cache.release('A')
+        assert cache.get('A') is None
+        assert dropped == ['B', 'A']
+
+    def test_size_follows_mutations(self, client, test_room):
+        """Test a cached room's size is kept current as tasks change, without re-encoding it."""
+        import json
+        from app import rooms
+        def cached_bytes():
+            return rooms.stats()['bytes']
+        before = cached_bytes()
+
+        client.post(f'/tasks?room={test_room}', json={"title": "Task", "description": "x" * 5000})
+        grown = cached_bytes()
+        assert grown - before > 5000
+        client.put(f'/tasks/1?room={test_room}', json={"description": "short"})
+        assert cached_bytes() < grown - 4900
+        client.delete(f'/tasks/1?room={test_room}')
+        assert cached_bytes() == before
+
+        client.post(f'/tasks?room={test_room}', json={"title": "Task", "description": "ab"})
+        encoded = len(json.dumps(client.get(f'/rooms/{test_room}').json))
+        assert abs(cached_bytes() - encoded) < encoded / 2
+
+    def test_pin_check_never_waits_on_the_queue(self):
+        """Test a thread inside write_queue.atomic() and one evicting rooms cannot deadlock."""
+        import threading
+        from app import RoomCache, WriteBehindQueue
+        queue = WriteBehindQueue(writer=lambda batch: True)
+        cache = RoomCache(is_pinned=queue.has_pending)
+        cache['A'] = self.room('A')
+        cache['B'] = self.room('B')
+
+        with queue.atomic():
+            # Another thread holds the cache lock while checking pins
+            other = threading.Thread(target=cache.invalidate, args=('A',))
+            other.start()
+            other.join(timeout=5)
+            assert not other.is_alive()
+            cache.resize('B')
+        assert 'A' not in cache
+
+    def test_expired_rooms_miss(self):
+        """Test TTL expiry and hit/miss counters."""
+        from app import RoomCache
+        now = [0.0]
+        cache = RoomCache(ttl=10, clock=lambda: now[0])
+        cache['A'] = self.room('A')
+
+        assert cache.get('A') is not None
+        now[0] = 11
+        assert cache.get('A') is None
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+
+    def test_invalidation_from_other_workers(self):
+        """Test that notifications evict rooms unless this worker sent them."""
+        from app import RoomCache, InvalidationListener, INSTANCE_ID
+        cache = RoomCache()
+        listener = InvalidationListener(cache)
+        cache['A'] = self.room('A')
+        cache['B'] = self.room('B')
+
+        listener.handle(f'A:{INSTANCE_ID}')
+        listener.handle('B:another-worker')
+
+        assert 'A' in cache
+        assert 'B' not in cache
+
+class TestRoomCodeAllocator:
+    """Test collision-free room code allocation."""
+
+    def test_claims_codes_in_blocks(self):
+        """Test one claim serves a whole block of rooms."""
+        from app import RoomCodeAllocator
+        calls = []
+
+        def claim(codes):
+            calls.append(list(codes))
+            return codes
+
+        allocator = RoomCodeAllocator(claim=claim, block_size=5)
+        codes = [allocator.allocate() for _ in range(5)]
+        assert len(set(codes)) == 5
+        assert all(len(c) == 6 and c.isalnum() and c == c.upper() for c in codes)
+        assert len(calls) == 1
+        allocator.allocate()
+        assert len(calls) == 2
+
+    def test_skips_codes_claimed_elsewhere(self):
+        """Test candidates another worker already owns are never handed out."""
+        from app import RoomCodeAllocator
+        taken = set()
+
+        def claim(codes):
+            # Every first attempt collides
+            if not taken:
+                taken.update(codes)
+                return []
+            return [c for c in codes if c not in taken]
+
+        allocator = RoomCodeAllocator(claim=claim, block_size=1)
+        assert allocator.allocate() not in taken
+
+    def test_no_claim_without_a_block(self):
+        """Test a block size of 0 hands out codes without claiming them; the room insert checks them."""
+        from app import RoomCodeAllocator
+        allocator = RoomCodeAllocator(claim=lambda codes: pytest.fail("claimed"), block_size=0)
+        assert len(allocator.allocate()) == 6
+
+    def test_local_uniqueness_without_shared_storage(self):
+        """Test codes stay unique in this process when rooms are not shared."""
+        from app import RoomCodeAllocator
+        allocator = RoomCodeAllocator(length=1, is_taken=lambda code: code == 'A')
+        codes = {allocator.allocate() for _ in range(35)}
+        assert len(codes) == 35
+        assert 'A' not in codes
+
+    def test_failed_claim_hands_out_nothing(self):
+        """Test a claim that cannot reach storage yields no code rather than a process-local one."""
+        from app import RoomCodeAllocator
+        allocator = RoomCodeAllocator(claim=lambda codes: None, block_size=1)
+        assert allocator.allocate() is None
+
+    def test_create_room_without_a_block_retries_stored_codes(self, client, storage, monkeypatch):
+        """Test POST /rooms with no code block writes only the room and skips codes already stored."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage does not share codes")
+        existing = client.post('/rooms', json={"username": "alice"}).json['room_code']
+        codes = iter([existing, "NEW123"])
+        monkeypatch.setattr(app_module.room_codes, '_candidates', lambda n: [next(codes)])
+        monkeypatch.setattr(app_module.room_codes, 'claim', lambda candidates: pytest.fail("claimed"))
+        created = client.post('/rooms', json={"username": "bob"})
+        assert created.status_code == 201
+        assert created.json['room_code'] == "NEW123"
+
+    def test_create_room_needs_a_claimed_code(self, client, storage, monkeypatch):
+        """Test POST /rooms answers 503 when no code can be claimed and skips codes already stored."""
+        import app as app_module
+        if not storage.persistent:
+            pytest.skip("memory storage does not share codes")
+        existing = client.post('/rooms', json={"username": "alice"}).json['room_code']
+        codes = iter([existing, "NEW123"])
+        monkeypatch.setattr(app_module.room_codes, 'block_size', 1)
+        monkeypatch.setattr(app_module.room_codes, 'claim', lambda candidates: [next(codes)])
+        created = client.post('/rooms', json={"username": "bob"})
+        assert created.status_code == 201
+        assert created.json['room_code'] == "NEW123"
+
+        monkeypatch.setattr(app_module.room_codes, 'claim', lambda candidates: None)
+        response = client.post('/rooms', json={"username": "bob"})
+        assert response.status_code == 503
+        assert 'error' in response.json
+
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import pytest
+
+pytest.importorskip('asgiref')
+
+from asgi import application
+
+
+def http_scope(path, query='', headers=()):
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(k.lower().encode(), v.encode()) for k, v in headers],
+        'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+    }
+
+
+async def call(scope, while_open=None):
+    """Run one request; `while_open` runs once the response has started, then the client disconnects."""
+    sent = []
+    started = asyncio.Event()
+    done = asyncio.Event()
+
+    async def receive():
+        if not started.is_set() or while_open is None:
+            if not sent:
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await done.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if message['type'] == 'http.response.body':
+            started.set()
+
+    request = asyncio.create_task(application(scope, receive, send))
+    if while_open is not None:
+        await asyncio.wait_for(started.wait(), 5)
+        await while_open()
+        done.set()
+    await asyncio.wait_for(request, 5)
+    status = sent[0]['status']
+    body = b''.join(m.get('body', b'') for m in sent[1:]).decode()
+    return status, body
+
+
+class TestAsgiEntryPoint:
+    """Test the ASGI application in front of the Flask routes."""
+
+    @pytest.fixture(autouse=True)
+    def short_streams(self, monkeypatch):
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_MAX_STREAM_SECONDS', 0)
+
+    def test_flask_routes_are_served(self, client, test_room):
+        """Test ordinary routes go through to the Flask app."""
+        status, body = asyncio.run(call(http_scope(f'/rooms/{test_room}')))
+        assert status == 200
+        assert json.loads(body)['code'] == test_room
+
+    def test_flask_routes_run_concurrently(self, client, test_room, monkeypatch):
+        """Test Flask requests run on the thread pool rather than one shared thread."""
+        import threading
+        import app as app_module
+        load_room = app_module.load_room
+        both_running = threading.Barrier(2, timeout=5)
+
+        def slow_load_room(code, **kwargs):
+            both_running.wait()
+            return load_room(code, **kwargs)
+
+        monkeypatch.setattr(app_module, 'load_room', slow_load_room)
+
+        async def two_requests():
+            return await asyncio.gather(call(http_scope(f'/rooms/{test_room}')),
+                                        call(http_scope(f'/rooms/{test_room}')))
+
+        assert [status for status, _ in asyncio.run(two_requests())] == [200, 200]
+
+    def test_event_stream_replays_missed_changes(self, client, test_room):
+        """Test the event-loop stream sends the same messages as the WSGI one."""
+        client.post(f'/tasks?room={test_room}', json={"title": "Task"})
+        client.post(f'/tasks/1/complete?room={test_room}')
+
+        status, body = asyncio.run(call(http_scope(f'/rooms/{test_room}/events', headers=[('Last-Event-ID', '2')])))
+        wsgi_body = client.get(f'/rooms/{test_room}/events', headers={'Last-Event-ID': '2'}).get_data(as_text=True)
+        assert status == 200
+        assert body == wsgi_body
+        assert 'id: 3\nevent: task_completed\n' in body
+
+    def test_event_stream_errors(self, client, test_room):
+        """Test unknown rooms and malformed event ids."""
+        assert asyncio.run(call(http_scope('/rooms/NOPE99/events')))[0] == 404
+        status, body = asyncio.run(call(http_scope(f'/rooms/{test_room}/events', query='last_event_id=x')))
+        assert status == 400
+
+    def test_live_change_wakes_stream(self, client, test_room, monkeypatch):
+        """Test a change made on another thread is pushed to an open stream."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_MAX_STREAM_SECONDS', 30)
+
+        async def create_task():
+            # A client of its own: the fixture's client keeps its request context on this thread
+            other = app_module.app.test_client()
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: other.post(f'/tasks?room={test_room}', json={"title": "Live"}))
+            await asyncio.sleep(0.2)
+
+        status, body = asyncio.run(call(http_scope(f'/rooms/{test_room}/events'), while_open=create_task))
+        assert status == 200
+        assert 'event: task_created' in body
+        assert '"Live"' in body